@@ -1,26 +1,243 @@
 """
 AI Agent for evaluating user responses against ideal answers.
-Uses OpenAI GPT-4 for evaluation.
+Uses OpenAI GPT-4 for evaluation through a pluggable backend; a fake
+backend grades offline for load tests and benchmarks.
 """
+import json
 import os
-from typing import Tuple
+import random
+import re
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
 
 # OpenAI API key from environment (REQUIRED - no default value for security)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # Optional, e.g. the local fake server
 
+# Evaluator settings (override via environment)
+EVAL_BACKEND = os.getenv("EVAL_BACKEND", "openai")              # "openai" or "fake"
+EVAL_MODEL = os.getenv("EVAL_MODEL", "gpt-4o")
+EVAL_TEMPERATURE = float(os.getenv("EVAL_TEMPERATURE", "0.3"))  # Lower temperature for consistent grading
+EVAL_TIMEOUT = float(os.getenv("EVAL_TIMEOUT", "60"))           # Seconds per LLM request
+EVAL_MAX_CONNECTIONS = int(os.getenv("EVAL_MAX_CONNECTIONS", "20"))
+EVAL_MAX_KEEPALIVE = int(os.getenv("EVAL_MAX_KEEPALIVE", "10"))
+FAKE_EVAL_LATENCY = float(os.getenv("FAKE_EVAL_LATENCY", "0.5"))
+FAKE_EVAL_FAILURE_RATE = float(os.getenv("FAKE_EVAL_FAILURE_RATE", "0.0"))
+EVAL_PRICE_INPUT_PER_1M = os.getenv("EVAL_PRICE_INPUT_PER_1M")    # USD per 1M prompt tokens (overrides MODEL_PRICES)
+EVAL_PRICE_OUTPUT_PER_1M = os.getenv("EVAL_PRICE_OUTPUT_PER_1M")  # USD per 1M completion tokens
+
+# List prices in USD per 1M (prompt, completion) tokens; unknown models cost 0 unless overridden
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+}
+
+# Bump whenever the prompt or grading rules change (invalidates cached grades)
+PROMPT_VERSION = "v1"
+
+# Status vocabulary accepted for local pre-grading (anything else goes to the LLM)
+STATUS_SYNONYMS = {
+    "success": "success", "successful": "success", "pass": "success", "passed": "success",
+    "failure": "failure", "failed": "failure", "fail": "failure",
+}
+
+
+class EvaluationError(Exception):
+    """Raised when an answer could not be graded (the message is shown as feedback)."""
+
+
+class TransientEvaluationError(EvaluationError):
+    """Raised for failures worth retrying (timeouts, rate limits, 5xx)."""
+
+
+class Completion(NamedTuple):
+    """An LLM reply plus the usage it was billed for."""
+    text: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class Grade(NamedTuple):
+    score: int
+    feedback: str
+    completion: Optional[Completion] = None  # None when graded without the LLM
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD cost of a request at MODEL_PRICES (or the EVAL_PRICE_* overrides)."""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    if EVAL_PRICE_INPUT_PER_1M is not None:
+        input_price = float(EVAL_PRICE_INPUT_PER_1M)
+    if EVAL_PRICE_OUTPUT_PER_1M is not None:
+        output_price = float(EVAL_PRICE_OUTPUT_PER_1M)
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+# ============== BACKENDS ============== #
+
+class EvaluatorBackend:
+    """Sends a grading prompt to an LLM and returns the raw reply with its token usage."""
+    name = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def cache_namespace(self) -> str:
+        # Grades from different backends/models must never be shared
+        return f"{self.name}:{self.model}"
+
+    def complete(self, prompt: str, max_tokens: int, json_mode: bool = False) -> Completion:
+        raise NotImplementedError
+
+
+class OpenAIBackend(EvaluatorBackend):
+    """
+    OpenAI chat completions over one long-lived, pooled HTTP client.
+    The client is built on first use and shared by all threads of the process,
+    so connections are kept alive between requests. Retries are left to the
+    caller (evaluation.evaluate_with_retry), hence max_retries=0.
+    """
+    name = "openai"
+
+    def __init__(self, api_key: str = OPENAI_API_KEY, model: str = EVAL_MODEL, base_url: str = OPENAI_BASE_URL,
+                 timeout: float = EVAL_TIMEOUT, max_connections: int = EVAL_MAX_CONNECTIONS,
+                 max_keepalive: int = EVAL_MAX_KEEPALIVE, temperature: float = EVAL_TEMPERATURE):
+        super().__init__(model)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.temperature = temperature
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+                    import openai
+                    self._client = openai.OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=0,
+                        http_client=httpx.Client(
+                            timeout=self.timeout,
+                            limits=httpx.Limits(max_connections=self.max_connections,
+                                                max_keepalive_connections=self.max_keepalive),
+                        ),
+                    )
+        return self._client
+
+    def complete(self, prompt: str, max_tokens: int, json_mode: bool = False) -> Completion:
+        if not self.api_key:
+            raise EvaluationError("AI Evaluation unavailable: OPENAI_API_KEY not configured.")
+
+        import openai
+        extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+        try:
+            response = self._get_client().chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=self.temperature,
+                **extra
+            )
+        except (openai.APITimeoutError, openai.APIConnectionError,
+                openai.RateLimitError, openai.InternalServerError) as e:
+            raise TransientEvaluationError(str(e)) from e
+        usage = response.usage
+        return Completion(
+            response.choices[0].message.content,
+            response.model or self.model,
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+        )
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class FakeBackend(EvaluatorBackend):
+    """
+    Offline stand-in for the LLM (no network, no API key).
+    Sleeps for `latency` seconds per request and raises TransientEvaluationError
+    with probability `failure_rate`; replies come from fake_reply() and token
+    usage is estimated at ~4 characters per token.
+    """
+    name = "fake"
+
+    def __init__(self, latency: float = FAKE_EVAL_LATENCY, failure_rate: float = FAKE_EVAL_FAILURE_RATE,
+                 model: str = "fake-grader"):
+        super().__init__(model)
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def complete(self, prompt: str, max_tokens: int, json_mode: bool = False) -> Completion:
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise TransientEvaluationError("Simulated transient failure")
+        text = fake_reply(prompt)
+        return Completion(text, self.model, len(prompt) // 4, len(text) // 4)
+
+
+_backends: Dict[str, EvaluatorBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str = None) -> EvaluatorBackend:
+    """Return this process's shared backend instance (one pooled client per worker)."""
+    name = name or EVAL_BACKEND
+    with _backends_lock:
+        if name not in _backends:
+            if name == "fake":
+                _backends[name] = FakeBackend()
+            elif name == "openai":
+                _backends[name] = OpenAIBackend()
+            else:
+                raise ValueError(f"Unknown evaluator backend: {name}")
+        return _backends[name]
+
+
+# ============== GRADING ============== #
 
 def evaluate_single_answer(user_response, ideal_question) -> Tuple[int, str]:
     """
     Compares user response to ideal question data.
     Returns: (score, feedback)
     """
-    # Check if API key is configured
-    if not OPENAI_API_KEY:
-        return 0, "AI Evaluation unavailable: OPENAI_API_KEY not configured."
-    
-    # Fail-safe: If no ideal answer is provided by Admin, we cannot grade.
-    if not ideal_question.ideal_status:
-        return 0, "No Ideal Answer provided by Admin yet."
+    try:
+        grade = request_evaluation(user_response, ideal_question)
+        return grade.score, grade.feedback
+    except TransientEvaluationError as e:
+        return 0, f"AI Error: {str(e)}"
+    except EvaluationError as e:
+        return 0, str(e)
+    except Exception as e:
+        return 0, f"AI Error: {str(e)}"
+
+
+def request_evaluation(user_response, ideal_question, backend: EvaluatorBackend = None) -> Grade:
+    """
+    Same as evaluate_single_answer, but lets errors propagate and also
+    returns the LLM completion (model and token usage) behind the grade.
+    Retryable failures are raised as TransientEvaluationError so callers
+    can back off and try again.
+    """
+    # Cases decidable locally (missing ideal, status mismatch) never reach the API
+    pregraded = pregrade_answer(user_response, ideal_question)
+    if pregraded:
+        return Grade(*pregraded)
 
     prompt = f"""
     You are a QA Lead. Compare the Tester's answer to the Ground Truth.
@@ -45,32 +262,180 @@ def evaluate_single_answer(user_response, ideal_question) -> Tuple[int, str]:
     FEEDBACK: [text]
     """
 
+    completion = (backend or get_backend()).complete(prompt, max_tokens=500)
+    return Grade(*parse_evaluation(completion.text), completion)
+
+
+def request_batch_evaluation(ideal_question, user_responses: Sequence, backend: EvaluatorBackend = None
+                             ) -> Tuple[List[Optional[Tuple[int, str]]], Completion]:
+    """
+    Grade several answers to the same question in one request.
+    The instructions and ground truth are sent once; answers are numbered.
+    Returns one (score, feedback) per answer, or None where the reply could
+    not be parsed (callers fall back to single-answer grading for those),
+    together with the completion the whole batch was billed for.
+    """
+    answers_block = "\n".join(
+        f"""
+    --- ANSWER {i} ---
+    Status: {r.status}
+    Explanation: {r.explanation}
+    Critical Error: {r.critical_error}"""
+        for i, r in enumerate(user_responses, 1)
+    )
+
+    prompt = f"""
+    You are a QA Lead. Compare each Tester's answer to the Ground Truth.
+    Grade every answer independently of the others.
+
+    --- GROUND TRUTH (IDEAL) ---
+    Status: {ideal_question.ideal_status}
+    Explanation: {ideal_question.ideal_explanation}
+    Critical Error: {ideal_question.ideal_error}
+    {answers_block}
+
+    --- RULES ---
+    1. If the 'Status' does not match the Ground Truth, score is 0.
+    2. If Status matches, evaluate the Explanation quality (1-100).
+    3. Check if they caught the Critical Error (if one existed).
+
+    Return strictly a JSON object with one entry per answer:
+    {{"results": [{{"answer": 1, "score": 0, "feedback": "..."}}]}}
+    """
+
+    completion = (backend or get_backend()).complete(prompt, max_tokens=100 + 150 * len(user_responses),
+                                                     json_mode=True)
+    return parse_batch_evaluation(completion.text, len(user_responses)), completion
+
+
+def normalize_status(value) -> Optional[str]:
+    """Map a free-text status to 'success'/'failure', or None if unrecognised."""
+    return STATUS_SYNONYMS.get(" ".join(str(value or "").split()).casefold())
+
+
+def pregrade_answer(user_response, ideal_question) -> Optional[Tuple[int, str]]:
+    """
+    Rule-based short-circuit for cases the prompt already decides (RULES #1).
+    Returns (score, feedback) when no LLM call is needed, otherwise None.
+    """
+    if not ideal_question.ideal_status:
+        return 0, "No Ideal Answer provided by Admin yet."
+
+    if not (user_response.status or "").strip():
+        return 0, "No status was submitted."
+
+    expected = normalize_status(ideal_question.ideal_status)
+    given = normalize_status(user_response.status)
+    if expected and given and expected != given:
+        return 0, f"Status '{user_response.status}' does not match the expected status '{ideal_question.ideal_status}'."
+
+    return None
+
+
+def parse_evaluation(content: str) -> Tuple[int, str]:
+    """Parse the 'SCORE: / FEEDBACK:' reply format into (score, feedback)."""
+    score = 0
+    feedback = "Evaluated"
+
+    lines = (content or "").split('\n')
+    for line in lines:
+        if "SCORE:" in line.upper():
+            try:
+                score = int(line.split(":")[1].strip())
+            except:
+                pass
+        if "FEEDBACK:" in line.upper():
+            feedback = line.split(":", 1)[1].strip()
+
+    return score, feedback
+
+
+def _clamp_score(value) -> Optional[int]:
     try:
-        import openai
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.3  # Lower temperature for consistent grading
-        )
-        content = response.choices[0].message.content
-        
-        # Parse response
-        score = 0
-        feedback = "Evaluated"
-        
-        lines = content.split('\n')
-        for line in lines:
-            if "SCORE:" in line.upper():
-                try:
-                    score = int(line.split(":")[1].strip())
-                except:
-                    pass
-            if "FEEDBACK:" in line.upper():
-                feedback = line.split(":", 1)[1].strip()
-                
-        return score, feedback
+        return max(0, min(100, int(float(str(value).strip()))))
+    except (TypeError, ValueError):
+        return None
 
-    except Exception as e:
-        return 0, f"AI Error: {str(e)}"
+
+def _extract_json(content: str):
+    """Parse JSON from a reply that may be wrapped in code fences or prose."""
+    text = re.sub(r"^```(?:json)?|```$", "", (content or "").strip(), flags=re.MULTILINE).strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    for opener, closer in (("{", "}"), ("[", "]")):
+        start, end = text.find(opener), text.rfind(closer)
+        if start != -1 and end > start:
+            try:
+                return json.loads(text[start:end + 1])
+            except ValueError:
+                continue
+    return None
+
+
+def parse_batch_evaluation(content: str, expected: int) -> List[Optional[Tuple[int, str]]]:
+    """
+    Parse a batch reply into one (score, feedback) per answer (None if missing).
+    Accepts {"results": [...]}, a bare list, or 'ANSWER n ... SCORE: ... FEEDBACK: ...' text.
+    """
+    results: List[Optional[Tuple[int, str]]] = [None] * expected
+
+    data = _extract_json(content)
+    if isinstance(data, dict):
+        data = data.get("results") or data.get("answers") or data.get("grades")
+    if isinstance(data, list):
+        for position, item in enumerate(data, 1):
+            if not isinstance(item, dict):
+                continue
+            number = item.get("answer", item.get("id", item.get("index", position)))
+            score = _clamp_score(item.get("score"))
+            try:
+                number = int(number)
+            except (TypeError, ValueError):
+                continue
+            if score is None or not 1 <= number <= expected:
+                continue
+            results[number - 1] = (score, str(item.get("feedback") or "Evaluated").strip())
+        return results
+
+    # Plain-text fallback: split on "ANSWER n" headers and reuse the single parser
+    for block in re.split(r"(?im)^\W*answer\s+(?=\d+)", content or "")[1:]:
+        number = re.match(r"\d+", block)
+        if not number or "SCORE:" not in block.upper():
+            continue
+        index = int(number.group()) - 1
+        if 0 <= index < expected:
+            score, feedback = parse_evaluation(block)
+            results[index] = (max(0, min(100, score)), feedback)
+    return results
+
+
+def fake_reply(prompt: str) -> str:
+    """
+    Deterministic grader reply for a prompt built by this module.
+    Scores 0 on a status mismatch, otherwise 50-99 derived from the explanation,
+    in the single-answer text format or the batch JSON format as appropriate.
+    """
+    ideal = re.search(r"GROUND TRUTH \(IDEAL\) ---\s*Status: (.*)", prompt)
+    ideal_status = normalize_status(ideal.group(1)) if ideal else None
+
+    def grade(block: str) -> Tuple[int, str]:
+        status = re.search(r"Status: (.*)", block)
+        explanation = re.search(r"Explanation: (.*)", block)
+        if ideal_status and status and normalize_status(status.group(1)) not in (ideal_status, None):
+            return 0, "Status does not match the ground truth (fake grader)."
+        text = explanation.group(1) if explanation else ""
+        return 50 + sum(map(ord, text)) % 50, "Status matches (fake grader)."
+
+    answers = re.split(r"--- ANSWER (\d+) ---", prompt)
+    if len(answers) > 1:
+        results = []
+        for number, block in zip(answers[1::2], answers[2::2]):
+            score, feedback = grade(block.split("--- RULES ---")[0])
+            results.append({"answer": int(number), "score": score, "feedback": feedback})
+        return json.dumps({"results": results})
+
+    tester = prompt.split("--- TESTER ANSWER ---")[-1].split("--- RULES ---")[0]
+    score, feedback = grade(tester)
+    return f"SCORE: {score}\nFEEDBACK: {feedback}"
@@ -0,0 +1,91 @@
+"""
+Opt-in async database stack (ASYNC_DB=true).
+Builds an AsyncEngine on the same database as database.engine, using
+aiosqlite for SQLite and asyncpg for Postgres, plus an async get_db
+dependency. With it enabled the candidate hot-path endpoints in
+async_routes await the database on the event loop instead of holding one
+of Starlette's threadpool threads per request, so concurrency is bounded
+by the connection pool rather than the thread count.
+The engine is created on first use, so the async drivers are only needed
+when the mode is switched on.
+"""
+import os
+from typing import AsyncIterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Handle imports for both local development and deployment
+try:
+    from . import metrics
+    from .database import DATABASE_URL, SQLITE_TUNED, apply_sqlite_pragmas
+except ImportError:
+    import metrics
+    from database import DATABASE_URL, SQLITE_TUNED, apply_sqlite_pragmas
+
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB", "false").lower() in ("1", "true", "yes")
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))        # Postgres connections kept open
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "30"))  # Extra connections under bursts
+
+_engine = None
+_session_factory = None
+
+
+def async_url(url: str) -> str:
+    """Same database, async driver: sqlite -> aiosqlite, postgres -> asyncpg."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+def get_async_engine():
+    global _engine, _session_factory
+    if _engine is None:
+        url = async_url(DATABASE_URL)
+        if url.startswith("sqlite"):
+            _engine = create_async_engine(url, echo=False)
+            if SQLITE_TUNED:
+                event.listen(_engine.sync_engine, "connect", apply_sqlite_pragmas)
+        else:
+            # Mirrors the sync Postgres pool settings, sized for many in-flight awaits
+            _engine = create_async_engine(
+                url,
+                pool_size=ASYNC_DB_POOL_SIZE,
+                max_overflow=ASYNC_DB_MAX_OVERFLOW,
+                pool_pre_ping=True,
+                pool_recycle=1800,
+                pool_timeout=30,
+                echo=False,
+                connect_args={
+                    "timeout": 10,
+                    "server_settings": {
+                        "application_name": "ai_test_app",
+                        "statement_timeout": "30000",  # 30s query timeout
+                    },
+                }
+            )
+        metrics.instrument_engine(_engine.sync_engine, "async")
+        _session_factory = async_sessionmaker(
+            _engine,
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False  # Same as SessionLocal: no reload after commit
+        )
+    return _engine
+
+
+# Dependency to get an async DB session in routes
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    get_async_engine()
+    async with _session_factory() as db:
+        yield db
+
+
+async def dispose() -> None:
+    global _engine, _session_factory
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = _session_factory = None
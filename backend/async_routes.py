@@ -0,0 +1,110 @@
+"""
+Async versions of the candidate hot-path endpoints (ASYNC_DB=true).
+main.py registers this router before its own routes, so these handlers
+shadow the sync ones on the same paths with identical responses. Session
+rows and the token revocation list are read with native async queries;
+the shared logic in session_flow (question order, question cache, answer
+recording) runs through AsyncSession.run_sync on the same connection,
+which does no blocking I/O on the event loop.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+# Handle imports for both local development and deployment
+try:
+    from . import models, schemas, auth, resource_versions, session_flow, sqlite_writer, shared_cache
+    from .async_database import get_async_db
+except ImportError:
+    import models, schemas, auth, resource_versions, session_flow, sqlite_writer, shared_cache
+    from async_database import get_async_db
+
+# Same paths and schemas as the sync routes, which already document them
+router = APIRouter(include_in_schema=False)
+
+
+async def _session_row(db: AsyncSession, session_id: int, columns, user: auth.TokenClaims):
+    result = await db.execute(select(*columns).where(models.TestSession.id == session_id))
+    session = result.first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    auth.ensure_owner(user, session.user_id)
+    return session
+
+
+async def _cache_call(fn, *args, **kwargs):
+    # A network cache backend does blocking socket I/O: keep it off the event loop
+    if shared_cache.cache.backend.shared:
+        return await run_in_threadpool(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+async def _test_meta(db: AsyncSession, test_id: int):
+    """session_flow.test_meta with a native async query on a cache miss."""
+    cache, key, tags = shared_cache.cache, session_flow.test_meta_key(test_id), session_flow.TEST_META_TAGS
+    meta = await _cache_call(cache.get, key, tags)
+    if meta is not shared_cache.MISSING:
+        return meta
+    tokens = await _cache_call(cache.tokens, tags)  # Read before the query, so a racing invalidation wins
+    result = await db.execute(select(*session_flow.TEST_META_COLUMNS).where(models.Test.id == test_id))
+    meta = session_flow.test_meta_from_row(result.first())
+    if meta is not None and tokens is not None:
+        await _cache_call(cache.set, key, meta, tags, tokens=tokens)
+    return meta
+
+
+# --- SESSION INFO (For Timer Sync) ---
+@router.get("/session/{session_id}/info")
+async def get_session_info(session_id: int, request: Request, response: Response,
+                           user: auth.TokenClaims = Depends(auth.get_current_user_async),
+                           db: AsyncSession = Depends(get_async_db)):
+    session = await _session_row(db, session_id, session_flow.INFO_COLUMNS, user)
+
+    cached = resource_versions.check(request, response, session_flow.info_tag(session))
+    if cached:
+        return cached
+
+    test = await _test_meta(db, session.test_id)
+    return session_flow.session_info(session, test["duration_minutes"] if test else None)
+
+
+# --- 3. GET CURRENT QUESTION ---
+@router.get("/session/{session_id}/question", response_model=schemas.QuestionOut)
+async def get_current_question(session_id: int, request: Request, response: Response,
+                               user: auth.TokenClaims = Depends(auth.get_current_user_async),
+                               db: AsyncSession = Depends(get_async_db)):
+    session = await _session_row(db, session_id, session_flow.QUESTION_COLUMNS, user)
+    await db.run_sync(session_flow.ensure_open, session)
+    session = await db.run_sync(session_flow.skip_deleted, session)
+
+    cached = resource_versions.check(request, response, session_flow.question_tag(session))
+    if cached:
+        return cached
+
+    return await db.run_sync(session_flow.current_question, session)
+
+
+# --- 4. SUBMIT ANSWER ---
+@router.post("/session/{session_id}/submit")
+async def submit_answer(session_id: int, answer: schemas.AnswerSubmit,
+                        user: auth.TokenClaims = Depends(auth.get_current_user_async),
+                        db: AsyncSession = Depends(get_async_db)):
+    result = await sqlite_writer.execute_write_async(db, session_flow.submit, session_id, answer, user)
+    session_flow.publish_progress(result)
+    return {"message": "Answer saved", "next_index": result["next_index"]}
+
+
+# --- 5. SUBMIT AND FETCH NEXT ---
+@router.post("/session/{session_id}/submit-next", response_model=schemas.SubmitNextOut)
+async def submit_and_next(session_id: int, answer: schemas.AnswerSubmit,
+                          user: auth.TokenClaims = Depends(auth.get_current_user_async),
+                          db: AsyncSession = Depends(get_async_db)):
+    result = await sqlite_writer.execute_write_async(db, session_flow.submit, session_id, answer, user, True)
+    session_flow.publish_progress(result)
+    return {
+        "message": "Answer saved",
+        "next_index": result["next_index"],
+        "is_completed": result["is_completed"],
+        "question": result["question"]
+    }
@@ -0,0 +1,271 @@
+"""
+Stateless HMAC-signed access tokens and the FastAPI auth dependencies.
+A token is base64url(JSON claims) + "." + base64url(HMAC-SHA256 signature)
+and carries the user id, username, admin flag, expiry and a random token id
+(jti). Verification is done in-process with no DB lookup per request; the
+only shared state is a small revocation list of jtis, held in memory and
+refreshed from the database every AUTH_REVOCATION_REFRESH seconds (through
+the async session for the async routes).
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Handle imports for both local development and deployment
+try:
+    from . import models
+    from .async_database import get_async_db
+    from .database import SessionLocal
+except ImportError:
+    import models
+    from async_database import get_async_db
+    from database import SessionLocal
+
+AUTH_SECRET = os.getenv("AUTH_SECRET", "")
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", str(12 * 3600)))           # Seconds a token stays valid
+AUTH_REVOCATION_REFRESH = float(os.getenv("AUTH_REVOCATION_REFRESH", "30"))      # Seconds between revocation reloads
+AUTH_DEV_MODE = os.getenv("AUTH_DEV_MODE", "false").lower() in ("1", "true", "yes")  # Allow a random secret locally
+
+if not AUTH_SECRET:
+    if not AUTH_DEV_MODE:
+        # A per-process secret would log everyone out on restart and break tokens across workers
+        raise RuntimeError("AUTH_SECRET is not set (set AUTH_DEV_MODE=true to use a random secret in development)")
+    # Tokens then only verify in this process and die with it
+    AUTH_SECRET = secrets.token_urlsafe(32)
+    print("[AUTH] AUTH_SECRET not set - AUTH_DEV_MODE is on, using a random per-process secret")
+
+_SECRET = AUTH_SECRET.encode("utf-8")
+
+
+class AuthError(Exception):
+    """Token is malformed, forged, expired or revoked."""
+
+
+class TokenClaims(NamedTuple):
+    user_id: int
+    username: str
+    is_admin: bool
+    expires_at: int
+    jti: str
+
+
+# ============== TOKENS ============== #
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_SECRET, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def issue_token(user_id: int, username: str, is_admin: bool, ttl: int = ACCESS_TOKEN_TTL) -> str:
+    claims = {
+        "sub": user_id,
+        "usr": username,
+        "adm": bool(is_admin),
+        "exp": int(time.time()) + ttl,
+        "jti": secrets.token_hex(8),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+
+@lru_cache(maxsize=4096)
+def _parse(token: str) -> TokenClaims:
+    # Signature + JSON work is cached per token; expiry/revocation are checked on every call
+    payload, _, signature = token.partition(".")
+    if not payload or not hmac.compare_digest(signature, _sign(payload)):
+        raise AuthError("Invalid token")
+    try:
+        claims = json.loads(_b64decode(payload))
+        return TokenClaims(int(claims["sub"]), str(claims["usr"]), bool(claims["adm"]),
+                           int(claims["exp"]), str(claims["jti"]))
+    except (ValueError, KeyError, TypeError):
+        raise AuthError("Invalid token")
+
+
+def _verify(token: str) -> TokenClaims:
+    """Signature and expiry (revocation is checked by the caller)."""
+    try:
+        claims = _parse(token)
+    except AuthError:
+        raise
+    except Exception:
+        raise AuthError("Invalid token")
+    if claims.expires_at <= time.time():
+        raise AuthError("Token expired")
+    return claims
+
+
+def decode_token(token: str) -> TokenClaims:
+    claims = _verify(token)
+    if revocations.is_revoked(claims.jti):
+        raise AuthError("Token revoked")
+    return claims
+
+
+async def decode_token_async(token: str, db: AsyncSession) -> TokenClaims:
+    """decode_token with the revocation reload awaited on `db`."""
+    claims = _verify(token)
+    if await revocations.is_revoked_async(claims.jti, db):
+        raise AuthError("Token revoked")
+    return claims
+
+
+# ============== REVOCATION ============== #
+
+class RevocationList:
+    """jtis of revoked, not yet expired tokens; reloaded from the DB at most every `refresh` seconds."""
+
+    def __init__(self, session_factory=SessionLocal, refresh: float = AUTH_REVOCATION_REFRESH):
+        self.session_factory = session_factory
+        self.refresh = refresh
+        self._jtis = frozenset()
+        self._local = {}  # jti -> expiry (epoch seconds) of revocations made by this process
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()        # One reloader at a time
+        self._local_lock = threading.Lock()  # Guards _local and swaps of _jtis
+
+    def _query(self):
+        return select(models.RevokedToken.jti).where(models.RevokedToken.expires_at > datetime.now(timezone.utc))
+
+    def _replace(self, jtis) -> None:
+        # Keep this process's own revocations: the reload may have read
+        # the table before their transaction committed
+        with self._local_lock:
+            self._local = {jti: exp for jti, exp in self._local.items() if exp > time.time()}
+            self._jtis = frozenset(jtis) | frozenset(self._local)
+        self._loaded_at = time.monotonic()
+
+    def _reload(self) -> None:
+        db = self.session_factory()
+        try:
+            self._replace(db.execute(self._query()).scalars())
+        finally:
+            db.close()
+
+    def _due(self) -> bool:
+        return time.monotonic() - self._loaded_at > self.refresh
+
+    def is_revoked(self, jti: str) -> bool:
+        # One thread reloads; the others keep using the current set meanwhile
+        if self._due() and self._lock.acquire(blocking=False):
+            try:
+                self._reload()
+            finally:
+                self._lock.release()
+        return jti in self._jtis
+
+    async def is_revoked_async(self, jti: str, db: AsyncSession) -> bool:
+        """is_revoked for async routes: the reload is awaited on the request's AsyncSession."""
+        if self._due() and self._lock.acquire(blocking=False):
+            try:
+                self._replace((await db.execute(self._query())).scalars())
+            finally:
+                self._lock.release()
+        return jti in self._jtis
+
+    def revoke(self, db, claims: TokenClaims) -> None:
+        """Persist a revocation (caller commits) and apply it in this process immediately."""
+        if not db.get(models.RevokedToken, claims.jti):
+            db.add(models.RevokedToken(
+                jti=claims.jti,
+                user_id=claims.user_id,
+                expires_at=datetime.fromtimestamp(claims.expires_at, timezone.utc)
+            ))
+        with self._local_lock:
+            self._local[claims.jti] = claims.expires_at
+            self._jtis = self._jtis | {claims.jti}
+
+    def purge_expired(self, db) -> int:
+        """Drop revocations of tokens that have expired anyway (caller commits)."""
+        return db.query(models.RevokedToken).filter(
+            models.RevokedToken.expires_at <= datetime.now(timezone.utc)
+        ).delete(synchronize_session=False)
+
+
+revocations = RevocationList()
+
+
+# ============== DEPENDENCIES ============== #
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+def _authenticate(token: Optional[str]) -> TokenClaims:
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return decode_token(token)
+    except AuthError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+
+def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> TokenClaims:
+    """Claims of the caller's bearer token (Authorization header only)."""
+    return _authenticate(credentials.credentials if credentials else None)
+
+
+def get_current_user_from_query(request: Request,
+                                credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> TokenClaims:
+    """
+    get_current_user that also accepts ?access_token=, for the few routes a
+    browser opens without headers (EventSource, download links). URLs end up
+    in logs and history, so don't use it anywhere else.
+    """
+    return _authenticate(credentials.credentials if credentials else request.query_params.get("access_token"))
+
+
+async def get_current_user_async(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer),
+                                 db: AsyncSession = Depends(get_async_db)) -> TokenClaims:
+    """get_current_user for async routes: no threadpool hop, revocations reload on the async session."""
+    if not credentials:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return await decode_token_async(credentials.credentials, db)
+    except AuthError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+
+def require_admin(user: TokenClaims = Depends(get_current_user)) -> TokenClaims:
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+
+def require_admin_from_query(user: TokenClaims = Depends(get_current_user_from_query)) -> TokenClaims:
+    """require_admin for download links opened by the browser (?access_token= accepted)."""
+    return require_admin(user)
+
+
+def ensure_owner(user: TokenClaims, owner_id: Optional[int]) -> None:
+    """Candidates may only touch their own sessions; admins may touch any."""
+    if not user.is_admin and user.user_id != owner_id:
+        raise HTTPException(status_code=403, detail="Not your session")
+
+
+def require_admin_or_key(key: str):
+    """Dependency: an admin token, or `key` as the bearer token (for scrapers) when set."""
+    def dependency(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> None:
+        if key and credentials and hmac.compare_digest(credentials.credentials.encode(), key.encode()):
+            return
+        require_admin(get_current_user(credentials))
+    return dependency
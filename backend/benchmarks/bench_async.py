@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Side-by-side benchmark of the sync and async (ASYNC_DB=true) candidate path.
+Seeds one test and N candidates with started sessions, then for each mode
+starts the API under uvicorn and lets every candidate fetch its question
+and answer --rounds questions through /submit-next, all concurrently.
+Reports requests/second and p50/p99 latency per mode.
+Run: python backend/benchmarks/bench_async.py --candidates 500 --rounds 5
+     DATABASE_URL=postgresql://... python backend/benchmarks/bench_async.py
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+# Point the app at a throwaway database (unless given one) before importing it
+_db_dir = tempfile.mkdtemp(prefix="bench_async_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_db_dir, 'bench.db')}")
+os.environ.setdefault("AUTH_SECRET", "bench-secret")
+
+from backend.database import SessionLocal, engine
+from backend import models, question_order, session_events
+from backend.auth import issue_token
+from backend.migrations import upgrade_schema
+
+
+def seed(candidates: int, questions: int, label: str) -> list:
+    """One test plus `candidates` users with started sessions; returns (session_id, token) pairs."""
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        test = models.Test(title=f"Benchmark {label}", duration_minutes=600)
+        db.add(test)
+        db.flush()
+        db.add_all([
+            models.Question(test_id=test.id, link=f"https://example.com/{i}", description="bench",
+                            ideal_status="Pass", ideal_explanation="", ideal_error="")
+            for i in range(questions)
+        ])
+        users = [models.User(username=f"bench_{label}_{time.time_ns()}_{i}", is_active=True)
+                 for i in range(candidates)]
+        db.add_all(users)
+        db.flush()
+        snapshot = question_order.snapshot_for_test(db, test.id)
+        start_time, expires_at = session_events.session_window(test.duration_minutes)
+        sessions = [
+            models.TestSession(user_id=u.id, test_id=test.id, question_set_id=snapshot.id,
+                               order_seed=question_order.new_seed(), current_index=0,
+                               start_time=start_time, expires_at=expires_at)
+            for u in users
+        ]
+        db.add_all(sessions)
+        db.commit()
+        return [(s.id, issue_token(u.id, u.username, False)) for s, u in zip(sessions, users)]
+    finally:
+        db.close()
+
+
+def start_server(port: int, async_db: bool) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "ASYNC_DB": "true" if async_db else "false",
+        "EVAL_WORKER_MODE": "external",
+        "PASSWORD_WORKERS": "0",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL  # Failures are counted client-side
+    )
+
+
+async def wait_ready(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(base_url + "/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+async def candidate(client: httpx.AsyncClient, session_id: int, token: str, rounds: int,
+                    latencies: list, errors: list) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def timed(method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, headers=headers, **kwargs)
+        except httpx.TransportError as e:
+            errors.append(e.__class__.__name__)
+            return None
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+            return None
+        return response.json()
+
+    question = await timed("GET", f"/session/{session_id}/question")
+    for _ in range(rounds):
+        if not question:
+            return
+        result = await timed("POST", f"/session/{session_id}/submit-next", json={
+            "question_id": question["id"], "status": "Pass", "explanation": "bench", "critical_error": "None"
+        })
+        question = result and result["question"]
+
+
+async def run_load(base_url: str, sessions: list, rounds: int) -> dict:
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=len(sessions), max_keepalive_connections=len(sessions))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[candidate(client, sid, token, rounds, latencies, errors)
+                               for sid, token in sessions])
+        seconds = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": round(seconds, 2),
+        "requests_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": round(statistics.median(ordered) * 1000, 1),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=500, help="concurrent simulated candidates")
+    parser.add_argument("--rounds", type=int, default=5, help="answers submitted per candidate")
+    parser.add_argument("--questions", type=int, default=50, help="questions in the test")
+    parser.add_argument("--port", type=int, default=8701, help="first port (each mode uses its own)")
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    args = parser.parse_args()
+
+    print(f"--- {args.candidates} candidates x (1 + {args.rounds}) requests on {engine.url.get_backend_name()} ---")
+    results = {}
+    for offset, mode in enumerate(args.modes):
+        sessions = seed(args.candidates, args.questions, mode)
+        port = args.port + offset
+        server = start_server(port, async_db=(mode == "async"))
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            asyncio.run(wait_ready(base_url))
+            results[mode] = asyncio.run(run_load(base_url, sessions, args.rounds))
+        finally:
+            server.terminate()
+            server.wait()
+
+    keys = next(iter(results.values())).keys()
+    print(f"{'':22}" + "".join(f"{mode:>12}" for mode in results))
+    for key in keys:
+        print(f"{key:22}" + "".join(f"{results[mode][key]:>12}" for mode in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Offline throughput benchmark for the evaluation engine.
+Seeds a throwaway SQLite database with one session and grades it with the
+fake backend, first sequentially (old behaviour) and then at several
+concurrency levels. With --server the pooled OpenAI backend is used against
+fake_llm_server.py instead, so HTTP and connection reuse are included.
+Run: python backend/benchmarks/bench_evaluation.py --answers 100 --latency 0.2
+     python backend/benchmarks/bench_evaluation.py --server http://127.0.0.1:9100/v1
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# Point the app at a throwaway database before importing it
+_db_dir = tempfile.mkdtemp(prefix="bench_eval_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+from backend.database import SessionLocal, engine
+from backend import models
+from backend.ai_agent import FakeBackend, OpenAIBackend
+from backend.evaluation import EvaluationEngine
+
+
+def seed_session(answers: int) -> int:
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        test = models.Test(title="Benchmark", duration_minutes=60)
+        user = models.User(username=f"bench_{time.time_ns()}", is_active=True)
+        db.add_all([test, user])
+        db.flush()
+        questions = [
+            models.Question(test_id=test.id, link=f"https://example.com/{i}", description="bench",
+                            ideal_status="Pass", ideal_explanation=f"ideal {i}", ideal_error="")
+            for i in range(answers)
+        ]
+        db.add_all(questions)
+        db.flush()
+        session = models.TestSession(user_id=user.id, test_id=test.id,
+                                     question_order=[q.id for q in questions], current_index=answers,
+                                     is_completed=True)
+        db.add(session)
+        db.flush()
+        db.add_all([
+            models.UserResponse(session_id=session.id, question_id=q.id, status="Pass",
+                                explanation="bench", critical_error="")
+            for q in questions
+        ])
+        db.commit()
+        return session.id
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--answers", type=int, default=100, help="responses in the session")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fake transient failure rate")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--commit-every", type=int, default=10)
+    parser.add_argument("--server", help="base URL of fake_llm_server.py (uses the OpenAI backend)")
+    args = parser.parse_args()
+
+    session_id = seed_session(args.answers)
+    if args.server:
+        backend = OpenAIBackend(api_key="fake", model="fake-grader", base_url=args.server)
+        print(f"--- {args.answers} answers via {args.server} ---")
+    else:
+        backend = FakeBackend(latency=args.latency, failure_rate=args.failure_rate)
+        print(f"--- {args.answers} answers, {args.latency * 1000:.0f} ms latency, "
+              f"{args.failure_rate:.0%} transient failures ---")
+
+    for concurrency in args.concurrency:
+        # Cache disabled so every run pays for every answer
+        engine_ = EvaluationEngine(backend=backend, concurrency=concurrency, use_cache=False,
+                                   commit_every=args.commit_every, base_delay=0.05)
+        stats = engine_.evaluate_session(session_id)
+        rate = stats["evaluated"] / stats["seconds"] if stats["seconds"] else float("inf")
+        print(f"concurrency={concurrency:<4} {stats['seconds']:>8.2f}s  {rate:>8.1f} answers/s")
+
+
+if __name__ == "__main__":
+    main()
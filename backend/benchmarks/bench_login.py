@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Login hashing benchmark.
+Measures bcrypt verification throughput at a given cost factor: first a
+single-core baseline, then a burst of concurrent logins through the
+password process pool (the path /login uses), reporting logins/second,
+logins/second per worker core and how many were rejected with 503.
+Run: python backend/benchmarks/bench_login.py --logins 200 --workers 4 --rounds 12
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.password_utils import PasswordPool, PasswordPoolSaturated, hash_password, verify_password
+
+
+def bench_single_core(hashed: str, password: str, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        verify_password(password, hashed)
+    return count / (time.perf_counter() - started)
+
+
+async def bench_pool(pool: PasswordPool, hashed: str, password: str, logins: int) -> dict:
+    async def one_login():
+        try:
+            valid, _ = await pool.verify(password, hashed)
+            return "ok" if valid else "invalid"
+        except PasswordPoolSaturated:
+            return "rejected"
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[one_login() for _ in range(logins)])
+    seconds = time.perf_counter() - started
+    ok = results.count("ok")
+    return {
+        "logins": logins,
+        "ok": ok,
+        "rejected": results.count("rejected"),
+        "seconds": round(seconds, 3),
+        "logins_per_second": round(ok / seconds, 1),
+        # Workers beyond the machine's cores don't add throughput
+        "logins_per_second_per_core": round(ok / seconds / max(1, min(pool.workers, os.cpu_count() or 1)), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bcrypt login throughput")
+    parser.add_argument("--logins", type=int, default=200, help="concurrent logins in the burst")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="password pool processes")
+    parser.add_argument("--max-pending", type=int, default=None, help="in-flight cap (default: all logins)")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--baseline", type=int, default=10, help="single-core verifications")
+    args = parser.parse_args()
+
+    password = "correct horse battery staple"
+    hashed = hash_password(password, args.rounds)
+
+    print(f"--- bcrypt cost {args.rounds} ---")
+    per_core = bench_single_core(hashed, password, args.baseline)
+    print(f"Single core: {per_core:.1f} logins/s ({1000 / per_core:.0f} ms each)")
+
+    pool = PasswordPool(workers=args.workers, max_pending=args.max_pending or args.logins, rounds=args.rounds)
+    pool.start()
+    try:
+        result = asyncio.run(bench_pool(pool, hashed, password, args.logins))
+    finally:
+        pool.shutdown()
+
+    print(f"Pool ({args.workers} workers, max {pool.max_pending} in flight):")
+    for key, value in result.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
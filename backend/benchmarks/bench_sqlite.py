@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Concurrent answer-submit benchmark for the SQLite profiles.
+Each profile runs in its own process on a fresh database file: N candidates
+with started sessions submit --rounds answers each through the same code
+path as /submit-next, from a thread pool the size of Starlette's (40).
+  legacy      rollback journal, default pragmas, every request commits itself
+  wal         WAL + synchronous=NORMAL + busy_timeout/mmap/cache pragmas
+  wal+writer  WAL pragmas + single-writer queue with group commit
+Reports submits/second, p50/p99 latency and "database is locked" failures.
+Run: python backend/benchmarks/bench_sqlite.py --candidates 500 --rounds 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROFILES = {
+    "legacy": {"SQLITE_TUNED": "false", "SQLITE_WRITER": "false"},
+    "wal": {"SQLITE_TUNED": "true", "SQLITE_WRITER": "false"},
+    "wal+writer": {"SQLITE_TUNED": "true", "SQLITE_WRITER": "true"},
+}
+
+
+def run_profile(candidates: int, rounds: int, questions: int, threads: int) -> dict:
+    """Child process: seed, then hammer the submit path (settings come from the environment)."""
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from sqlalchemy.exc import OperationalError
+    from backend import auth, schemas, session_flow, sqlite_writer, question_order
+    from backend.database import SessionLocal
+    from backend import models
+    from bench_async import seed
+
+    sessions = seed(candidates, questions, "sqlite")
+    latencies, errors, locked = [], [], []
+
+    def first_question(session_id: int) -> int:
+        db = SessionLocal()
+        try:
+            session = db.query(models.TestSession).get(session_id)
+            return question_order.question_at(db, session, 0)
+        finally:
+            db.close()
+
+    def candidate(session_id: int, token: str) -> None:
+        user = auth.decode_token(token)
+        question_id = first_question(session_id)
+        for _ in range(rounds):
+            answer = schemas.AnswerSubmit(question_id=question_id, status="Pass",
+                                          explanation="bench", critical_error="None")
+            db = SessionLocal()
+            started = time.perf_counter()
+            try:
+                result = sqlite_writer.execute_write(db, session_flow.submit, session_id, answer, user, True)
+            except OperationalError as e:
+                db.rollback()
+                (locked if "locked" in str(e) else errors).append(e.__class__.__name__)
+                continue
+            except Exception as e:
+                db.rollback()
+                errors.append(e.__class__.__name__)
+                continue
+            finally:
+                db.close()
+            latencies.append(time.perf_counter() - started)
+            if not result["question"]:
+                return
+            question_id = result["question"]["id"]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda pair: candidate(*pair), sessions))
+    seconds = time.perf_counter() - started
+
+    ordered = sorted(latencies) or [0.0]
+    stats = {
+        "submits": len(latencies),
+        "locked": len(locked),
+        "other_errors": len(errors),
+        "seconds": round(seconds, 2),
+        "submits_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": round(statistics.median(ordered) * 1000, 1),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 1),
+    }
+    if sqlite_writer.ENABLED:
+        stats["avg_batch"] = sqlite_writer.get_writer().stats()["avg_batch"]
+        sqlite_writer.shutdown()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=500, help="concurrent simulated candidates")
+    parser.add_argument("--rounds", type=int, default=5, help="answers submitted per candidate")
+    parser.add_argument("--questions", type=int, default=50, help="questions in the test")
+    parser.add_argument("--threads", type=int, default=40, help="request threads (Starlette's default is 40)")
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--child", choices=list(PROFILES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_profile(args.candidates, args.rounds, args.questions, args.threads)))
+        return
+
+    print(f"--- {args.candidates} candidates x {args.rounds} submits, {args.threads} threads ---")
+    results = {}
+    for profile in args.profiles:
+        db_dir = tempfile.mkdtemp(prefix="bench_sqlite_")
+        env = {
+            **os.environ,
+            **PROFILES[profile],
+            "DATABASE_URL": f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+            "AUTH_SECRET": "bench-secret",
+        }
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", profile,
+             "--candidates", str(args.candidates), "--rounds", str(args.rounds),
+             "--questions", str(args.questions), "--threads", str(args.threads)],
+            env=env, cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        results[profile] = json.loads(output.strip().splitlines()[-1])
+
+    keys = list(dict.fromkeys(key for stats in results.values() for key in stats))
+    print(f"{'':20}" + "".join(f"{profile:>12}" for profile in results))
+    for key in keys:
+        print(f"{key:20}" + "".join(f"{str(results[profile].get(key, '-')):>12}" for profile in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Exam-day load test: a whole cohort starting at the same moment.
+Seeds one active test, its questions, N candidates and an admin into a
+throwaway database (SQLite by default, or DATABASE_URL for Postgres), starts
+the API under uvicorn and runs every virtual candidate at once through
+  /login -> /admin/active-test -> /start-test/{test_id}/{user_id}
+  -> (/session/{id}/question + /session/{id}/submit) x --rounds
+while admin pollers refresh the dashboard (test list, user list + summary,
+results) every --admin-interval seconds until the cohort is done.
+Reports per-endpoint throughput and p50/p95/p99 latency and writes them to
+a JSON file (tagged with the git commit) that --compare diffs against.
+Run: python backend/benchmarks/exam_day.py --candidates 300 --rounds 10
+     python backend/benchmarks/exam_day.py --compare backend/benchmarks/results/<earlier>.json
+     DATABASE_URL=postgresql://... python backend/benchmarks/exam_day.py --server-env ASYNC_DB=true
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+sys.path.insert(0, ROOT)
+
+# Point the app at a throwaway database (unless given one) before importing it
+_db_dir = tempfile.mkdtemp(prefix="exam_day_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_db_dir, 'exam_day.db')}")
+os.environ.setdefault("AUTH_SECRET", "bench-secret")
+
+from backend.database import SessionLocal, engine
+from backend import models
+from backend.password_utils import hash_password
+from backend.migrations import upgrade_schema
+
+PASSWORD = "exam-day-password"
+
+
+def seed(candidates: int, questions: int, bcrypt_rounds: int) -> dict:
+    """Active test + questions + candidates + one admin; returns the logins to use."""
+    upgrade_schema(engine)
+    run_id = time.time_ns()
+    # One hash shared by every account: seeding stays fast, verification cost is unchanged
+    password_hash = hash_password(PASSWORD, bcrypt_rounds)
+    db = SessionLocal()
+    try:
+        db.query(models.Test).filter(models.Test.is_active == True).update({"is_active": False})
+        test = models.Test(title=f"Exam day {run_id}", duration_minutes=180, is_active=True)
+        db.add(test)
+        db.flush()
+        db.add_all([
+            models.Question(test_id=test.id, task_id=str(i), link=f"https://example.com/task/{i}",
+                            description="exam day", ideal_status="Pass", ideal_explanation="", ideal_error="")
+            for i in range(questions)
+        ])
+        usernames = [f"candidate_{run_id}_{i}@exam.test" for i in range(candidates)]
+        admin = f"admin_{run_id}@exam.test"
+        db.add_all([models.User(username=u, password_hash=password_hash, is_active=True) for u in usernames])
+        db.add(models.User(username=admin, password_hash=password_hash, is_active=True, is_admin=True))
+        db.commit()
+        return {"test_id": test.id, "candidates": usernames, "admin": admin}
+    finally:
+        db.close()
+
+
+def start_server(port: int, workers: int, server_env: dict) -> subprocess.Popen:
+    env = {"EVAL_WORKER_MODE": "external", **os.environ, **server_env}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL  # Failures are counted client-side
+    )
+
+
+async def wait_ready(base_url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(base_url + "/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+class Recorder:
+    """Latency samples and failures per endpoint (route template, not concrete URL)."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.shed = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str,
+                   token: str = None, ok=(200,), headers: dict = None, **kwargs):
+        headers = dict(headers or {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, headers=headers, **kwargs)
+        except httpx.TransportError as e:
+            self.errors[endpoint][e.__class__.__name__] += 1
+            return None
+        if response.status_code == 503 and "retry-after" in response.headers:
+            # Load shedding: the caller retries, so it is neither a failure nor a latency sample
+            self.shed[endpoint] += 1
+            return response
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        if response.status_code not in ok:
+            self.errors[endpoint][str(response.status_code)] += 1
+            return None
+        return response
+
+    def report(self, seconds: float) -> dict:
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors) | set(self.shed)):
+            samples = sorted(self.latencies[endpoint])
+            errors = dict(self.errors[endpoint])
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": sum(errors.values()),
+                "error_kinds": errors,
+                "shed_503": self.shed[endpoint],
+                "requests_per_second": round(len(samples) / seconds, 1),
+                "p50_ms": percentile_ms(samples, 50),
+                "p95_ms": percentile_ms(samples, 95),
+                "p99_ms": percentile_ms(samples, 99),
+                "max_ms": round(samples[-1] * 1000, 1) if samples else None,
+            }
+        return endpoints
+
+
+def percentile_ms(ordered: list, pct: float):
+    """Nearest-rank percentile of sorted seconds, in milliseconds."""
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return round(ordered[rank - 1] * 1000, 1)
+
+
+async def login(rec: Recorder, client: httpx.AsyncClient, username: str, attempts: int = 60):
+    """Log in, backing off on 503 for Retry-After seconds like a patient candidate."""
+    for _ in range(attempts):
+        response = await rec.call(client, "POST /login", "POST", "/login",
+                                  json={"username": username, "password": PASSWORD})
+        if response is None or response.status_code != 503:
+            return response and response.json()
+        await asyncio.sleep(float(response.headers["retry-after"]))
+    return None
+
+
+async def candidate(rec: Recorder, client: httpx.AsyncClient, username: str, rounds: int) -> bool:
+    """One candidate's exam; True if every step succeeded."""
+    account = await login(rec, client, username)
+    if not account:
+        return False
+    token = account["access_token"]
+
+    active = await rec.call(client, "GET /admin/active-test", "GET", "/admin/active-test", token)
+    if not active or not active.json():
+        return False
+    test_id = active.json()["id"]
+
+    started = await rec.call(client, "POST /start-test/{test_id}/{user_id}", "POST",
+                             f"/start-test/{test_id}/{account['user_id']}", token)
+    if not started:
+        return False
+    session_id = started.json()["session_id"]
+
+    for _ in range(rounds):
+        question = await rec.call(client, "GET /session/{id}/question", "GET",
+                                  f"/session/{session_id}/question", token)
+        if not question:
+            return False
+        submitted = await rec.call(client, "POST /session/{id}/submit", "POST", f"/session/{session_id}/submit",
+                                   token, json={"question_id": question.json()["id"], "status": "Pass",
+                                                "explanation": "exam day", "critical_error": "None"})
+        if not submitted:
+            return False
+    return True
+
+
+async def admin_poller(rec: Recorder, client: httpx.AsyncClient, username: str, test_id: int,
+                       interval: float, done: asyncio.Event) -> None:
+    """Dashboard refresh loop, revalidating with ETags the way the frontend does."""
+    account = await login(rec, client, username)
+    if not account:
+        return
+    token = account["access_token"]
+    etags = {}
+
+    async def poll(endpoint: str, url: str):
+        headers = {"If-None-Match": etags[url]} if url in etags else {}
+        response = await rec.call(client, endpoint, "GET", url, token, ok=(200, 304), headers=headers)
+        if response is not None and response.headers.get("etag"):
+            etags[url] = response.headers["etag"]
+
+    while not done.is_set():
+        await asyncio.gather(
+            poll("GET /admin/tests", "/admin/tests"),
+            poll("GET /admin/users", "/admin/users?limit=100"),
+            poll("GET /admin/users/summary", f"/admin/users/summary?test_id={test_id}"),
+            poll("GET /admin/test/{id}/results", f"/admin/test/{test_id}/results?limit=100"),
+        )
+        try:
+            await asyncio.wait_for(done.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_exam(base_url: str, seeded: dict, args) -> dict:
+    rec = Recorder()
+    connections = len(seeded["candidates"]) + args.admins * 4
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        done = asyncio.Event()
+        pollers = [asyncio.create_task(admin_poller(rec, client, seeded["admin"], seeded["test_id"],
+                                                    args.admin_interval, done))
+                   for _ in range(args.admins)]
+        started = time.perf_counter()
+        finished = await asyncio.gather(*[candidate(rec, client, u, args.rounds) for u in seeded["candidates"]])
+        seconds = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*pollers)
+
+    endpoints = rec.report(seconds)
+    return {
+        "scenario": {
+            "candidates": len(finished),
+            "completed": sum(finished),
+            "seconds": round(seconds, 2),
+            "requests": sum(e["requests"] for e in endpoints.values()),
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "requests_per_second": round(sum(e["requests"] for e in endpoints.values()) / seconds, 1),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(result: dict) -> None:
+    scenario = result["scenario"]
+    print(f"{scenario['completed']}/{scenario['candidates']} candidates finished in {scenario['seconds']}s, "
+          f"{scenario['requests']} requests ({scenario['requests_per_second']}/s), {scenario['errors']} errors")
+    columns = ("requests", "errors", "shed_503", "requests_per_second", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    print(f"{'endpoint':38}" + "".join(f"{c.replace('requests_per_second', 'req/s'):>10}" for c in columns))
+    for endpoint, stats in result["endpoints"].items():
+        print(f"{endpoint:38}" + "".join(f"{str(stats[c]):>10}" for c in columns))
+
+
+def print_comparison(result: dict, baseline: dict) -> None:
+    """p95 and throughput change per endpoint against an earlier run."""
+    print(f"--- vs {baseline['meta']['commit']} ({baseline['meta']['timestamp']}) ---")
+    print(f"{'endpoint':38}{'p95 before':>12}{'p95 now':>10}{'change':>9}{'req/s before':>14}{'req/s now':>11}")
+    for endpoint, stats in result["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if not before:
+            continue
+        change = ""
+        if before["p95_ms"] and stats["p95_ms"] is not None:
+            change = f"{(stats['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}%"
+        print(f"{endpoint:38}{str(before['p95_ms']):>12}{str(stats['p95_ms']):>10}{change:>9}"
+              f"{before['requests_per_second']:>14}{stats['requests_per_second']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=300, help="virtual candidates starting at once")
+    parser.add_argument("--rounds", type=int, default=10, help="question + submit pairs per candidate")
+    parser.add_argument("--questions", type=int, default=50, help="questions in the test")
+    parser.add_argument("--admins", type=int, default=2, help="concurrent admin dashboard pollers")
+    parser.add_argument("--admin-interval", type=float, default=2.0, help="seconds between dashboard refreshes")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="cost of the seeded password hashes")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--server-env", nargs="*", default=[], metavar="KEY=VALUE",
+                        help="extra settings for the server, e.g. ASYNC_DB=true PASSWORD_WORKERS=4")
+    parser.add_argument("--port", type=int, default=8711)
+    parser.add_argument("--timeout", type=float, default=120, help="client timeout per request (seconds)")
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/exam_day-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="earlier result JSON to diff against")
+    args = parser.parse_args()
+
+    # Same cost as the seeded hashes, or every first login would also re-hash at the server's cost
+    server_env = {"BCRYPT_ROUNDS": str(args.bcrypt_rounds), **dict(item.split("=", 1) for item in args.server_env)}
+    print(f"--- exam day: {args.candidates} candidates x {args.rounds} rounds, {args.admins} admins, "
+          f"{engine.url.get_backend_name()}, {args.workers} worker(s) ---")
+    seeded = seed(args.candidates, args.questions, args.bcrypt_rounds)
+
+    server = start_server(args.port, args.workers, server_env)
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        asyncio.run(wait_ready(base_url))
+        result = asyncio.run(run_exam(base_url, seeded, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    now = datetime.now(timezone.utc)
+    commit = git_commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "timestamp": now.isoformat(),
+            "database": engine.url.get_backend_name(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "server_env")},
+            "server_env": server_env,
+        },
+        **result,
+    }
+    print_report(result)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"exam_day-{commit}-{now:%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
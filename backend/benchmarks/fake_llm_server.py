@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stand-in for load-testing the grading pipeline offline.
+Serves POST /v1/chat/completions with replies from ai_agent.fake_reply, after
+a configurable latency, and fails a configurable fraction of requests with
+429/500 so retry paths get exercised.
+Run: python backend/benchmarks/fake_llm_server.py --port 9100 --latency 0.3 --failure-rate 0.05
+Then point the app at it:
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=fake
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.ai_agent import fake_reply
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    disable_nagle_algorithm = True
+    latency = 0.3
+    failure_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            status = random.choice([429, 500])
+            self._send_json(status, {"error": {"message": "Simulated failure", "type": "server_error"}})
+            return
+
+        prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+        content = fake_reply(prompt)
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+        self._send_json(200, {
+            "id": f"chatcmpl-fake-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake-grader"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction answered with 429/500")
+    args = parser.parse_args()
+
+    FakeLLMHandler.latency = args.latency
+    FakeLLMHandler.failure_rate = args.failure_rate
+    server = ThreadingHTTPServer((args.host, args.port), FakeLLMHandler)
+    server.daemon_threads = True
+    print(f"--- Fake LLM listening on http://{args.host}:{args.port}/v1 ---")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Local Redis-protocol stand-in for trying CACHE_BACKEND=redis without a
+Redis install. Speaks RESP over TCP and implements the commands the shared
+cache uses (GET, MGET, SET with EX/PX/NX/XX, DEL) plus PING, AUTH, SELECT,
+INCR, DBSIZE and FLUSHDB, with key expiry. One keyspace, held in memory;
+an optional per-command latency emulates a network hop.
+Run: python backend/benchmarks/fake_redis_server.py --port 6390 --latency 0.001
+Then point the app at it:
+    CACHE_BACKEND=redis CACHE_URL=redis://127.0.0.1:6390/0
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+
+
+class Keyspace:
+    def __init__(self):
+        self.data = {}  # key -> (value bytes, expires_at monotonic or None)
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self.lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None, nx=False, xx=False) -> bool:
+        with self.lock:
+            exists = self._live(key) is not None
+            if (nx and exists) or (xx and not exists):
+                return False
+            self.data[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+            return True
+
+    def delete(self, keys) -> int:
+        with self.lock:
+            return sum(1 for key in keys if self._live(key) is not None and self.data.pop(key, None))
+
+    def incr(self, key) -> int:
+        with self.lock:
+            entry = self._live(key)
+            value = int(entry[0]) + 1 if entry else 1
+            self.data[key] = (str(value).encode(), entry[1] if entry else None)
+            return value
+
+    def size(self) -> int:
+        with self.lock:
+            return sum(1 for key in list(self.data) if self._live(key) is not None)
+
+    def flush(self) -> None:
+        with self.lock:
+            self.data.clear()
+
+
+class CommandError(Exception):
+    pass
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+    keyspace = Keyspace()
+    latency = 0.0
+    password = None
+
+    def setup(self):
+        super().setup()
+        self.authenticated = self.password is None
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()  # Inline command (e.g. typed into telnet)
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _write(self, reply):
+        self.wfile.write(self._encode(reply))
+
+    def _encode(self, reply) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, CommandError):
+            return b"-ERR " + str(reply).encode() + b"\r\n"
+        if isinstance(reply, str):
+            return b"+" + reply.encode() + b"\r\n"
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, bytes):
+            return b"$%d\r\n%s\r\n" % (len(reply), reply)
+        return b"*%d\r\n" % len(reply) + b"".join(self._encode(item) for item in reply)
+
+    def handle(self):
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            if not args:
+                continue
+            if self.latency:
+                time.sleep(self.latency)
+            try:
+                reply = self.execute(args[0].decode().upper(), args[1:])
+            except CommandError as e:
+                reply = e
+            except (ValueError, IndexError):
+                reply = CommandError("syntax error")
+            self._write(reply)
+
+    def execute(self, command: str, args):
+        ks = self.keyspace
+        if command == "AUTH":
+            if self.password is not None and args[-1].decode() != self.password:
+                raise CommandError("invalid password")
+            self.authenticated = True
+            return "OK"
+        if not self.authenticated:
+            raise CommandError("NOAUTH Authentication required.")
+        if command == "PING":
+            return args[0] if args else "PONG"
+        if command == "SELECT":
+            int(args[0])
+            return "OK"
+        if command == "GET":
+            return ks.get(args[0])
+        if command == "MGET":
+            return [ks.get(key) for key in args]
+        if command == "SET":
+            key, value, options = args[0], args[1], [a.decode().upper() for a in args[2:]]
+            ttl, nx, xx = None, "NX" in options, "XX" in options
+            for unit, scale in (("EX", 1.0), ("PX", 0.001)):
+                if unit in options:
+                    ttl = int(options[options.index(unit) + 1]) * scale
+            return "OK" if ks.set(key, value, ttl, nx, xx) else None
+        if command == "DEL":
+            return ks.delete(args)
+        if command == "INCR":
+            return ks.incr(args[0])
+        if command == "DBSIZE":
+            return ks.size()
+        if command == "FLUSHDB":
+            ks.flush()
+            return "OK"
+        raise CommandError(f"unknown command '{command}'")
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Redis-protocol server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per command")
+    parser.add_argument("--password", default=None, help="require AUTH with this password")
+    args = parser.parse_args()
+
+    FakeRedisHandler.latency = args.latency
+    FakeRedisHandler.password = args.password
+    server = FakeRedisServer((args.host, args.port), FakeRedisHandler)
+    print(f"--- Fake Redis listening on redis://{args.host}:{args.port}/0 ---")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,24 @@
 import os
+import threading
+import time
+from contextlib import asynccontextmanager, nullcontext
 from pathlib import Path
-from sqlalchemy import create_engine, event
+from typing import Optional, Tuple
+
+import anyio
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool, NullPool
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 
+# Handle imports for both local development and deployment
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
 # Load environment variables from backend/.env
 env_path = Path(__file__).parent / '.env'
 load_dotenv(env_path)
@@ -16,30 +29,90 @@ DATABASE_URL = os.getenv(
     "sqlite:///./ai_test.db"
 )
 
-# Check if using SQLite
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        echo=False,  # Disable SQL logging for performance
-    )
-else:
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Production SQLite profile (applied to every new connection)
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "true").lower() in ("1", "true", "yes")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))   # Wait for the write lock instead of failing
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # Bytes of the file memory-mapped
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))     # Page cache per connection
+
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),          # Readers never block the writer (and vice versa)
+    ("synchronous", "NORMAL"),        # fsync at checkpoints, not every commit (safe with WAL)
+    ("busy_timeout", SQLITE_BUSY_TIMEOUT_MS),
+    ("mmap_size", SQLITE_MMAP_SIZE),
+    ("cache_size", -SQLITE_CACHE_SIZE_KB),  # Negative = KiB rather than pages
+    ("temp_store", "MEMORY"),
+)
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    """Connect-event hook: tune a new SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL", "")  # Optional read replica for reporting endpoints
+READ_DB_POOL_SIZE = int(os.getenv("READ_DB_POOL_SIZE", "5"))        # Replica connections kept open
+READ_DB_MAX_OVERFLOW = int(os.getenv("READ_DB_MAX_OVERFLOW", "10"))  # Extra replica connections under bursts
+READ_DB_MAX_LAG_SECONDS = float(os.getenv("READ_DB_MAX_LAG_SECONDS", "10"))    # Staleness tolerated before reads go to the primary
+READ_DB_LAG_CHECK_SECONDS = float(os.getenv("READ_DB_LAG_CHECK_SECONDS", "5"))  # Seconds between replica lag checks
+
+# Postgres pool sizes of the primary engine
+DB_POOL_SIZE = 10           # Increased from 5 for more concurrent connections
+DB_MAX_OVERFLOW = 20        # Increased from 10 for burst handling
+
+
+# engine -> most connections its pool hands out, from the sizes it was created with
+_pool_capacities = {}
+
+
+def _create_engine(url: str, pool_size: int, max_overflow: int, application_name: str, options: str = ""):
+    # Check if using SQLite
+    if url.startswith("sqlite"):
+        sqlite_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            echo=False,  # Disable SQL logging for performance
+        )
+        if SQLITE_TUNED:
+            event.listen(sqlite_engine, "connect", apply_sqlite_pragmas)
+        return sqlite_engine
+
     # PostgreSQL with optimized connection pooling
-    engine = create_engine(
-        DATABASE_URL,
+    pooled_engine = create_engine(
+        url,
         poolclass=QueuePool,
-        pool_size=10,           # Increased from 5 for more concurrent connections
-        max_overflow=20,        # Increased from 10 for burst handling
+        pool_size=pool_size,
+        max_overflow=max_overflow,
         pool_pre_ping=True,     # Check connection health before use
         pool_recycle=1800,      # Recycle connections every 30 min (was 1 hour)
         pool_timeout=30,        # Connection timeout
         echo=False,             # Disable SQL logging for performance
         connect_args={
             "connect_timeout": 10,           # Connection timeout
-            "application_name": "ai_test_app",
-            "options": "-c statement_timeout=30000",  # 30s query timeout
+            "application_name": application_name,
+            "options": "-c statement_timeout=30000" + options,  # 30s query timeout
         }
     )
+    _pool_capacities[pooled_engine] = pool_size + max_overflow
+    return pooled_engine
+
+
+engine = _create_engine(DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, "ai_test_app")
+metrics.instrument_engine(engine, "primary")
+
+# Read replica (reporting only); None = every read goes to the primary
+read_engine = None
+if READ_DATABASE_URL:
+    read_engine = _create_engine(READ_DATABASE_URL, READ_DB_POOL_SIZE, READ_DB_MAX_OVERFLOW, "ai_test_app_reports",
+                                 options=" -c default_transaction_read_only=on")
+    metrics.instrument_engine(read_engine, "replica")
 
 # Optimized session factory
 SessionLocal = sessionmaker(
@@ -51,10 +124,160 @@ SessionLocal = sessionmaker(
 
 Base = declarative_base()
 
-# Dependency to get DB session in routes
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def pool_capacity(pool_engine) -> Optional[int]:
+    """Most connections the engine's pool hands out (None = unbounded pool)."""
+    return _pool_capacities.get(pool_engine)
+
+
+# One slot per pooled connection, awaited on the event loop. Without it,
+# every threadpool thread can end up blocked in pool checkout while the
+# requests that hold the connections wait for a free thread to serialize
+# their response and run their teardown - nothing moves until pool_timeout.
+_session_slots = {}
+
+
+@asynccontextmanager
+async def _slot(pool_engine):
+    if pool_engine not in _session_slots:
+        capacity = pool_capacity(pool_engine)
+        _session_slots[pool_engine] = anyio.Semaphore(capacity) if capacity else nullcontext()
+    started = time.perf_counter()
+    async with _session_slots[pool_engine]:
+        metrics.record_pool_wait(time.perf_counter() - started)
+        yield
+
+
+# Dependency to get DB session in routes. Closing returns the connection to
+# the pool (a rollback round trip), so it runs on the threadpool, not the loop.
+async def get_db():
+    async with _slot(engine):
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+
+# Seconds behind the primary; 0 when fully replayed (or not a standby)
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReadRouter:
+    """Picks the engine for reporting reads: the replica while it is within
+    `max_lag` seconds of the primary, otherwise (or if unreachable) the primary.
+    Lag is measured by a background thread, never on the request path."""
+
+    def __init__(self, primary, replica=None, max_lag: float = READ_DB_MAX_LAG_SECONDS,
+                 check_every: float = READ_DB_LAG_CHECK_SECONDS):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_every = check_every
+        self.lag: Optional[float] = None  # None = not measured yet / replica down
+        self.last_error: Optional[str] = None
+        self.replica_reads = 0
+        self.fallback_reads = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.replica is not None and self.lag is not None and self.lag <= self.max_lag
+
+    def engine(self):
+        if self.healthy:
+            self.replica_reads += 1
+            return self.replica
+        if self.replica is not None:
+            self.fallback_reads += 1
+        return self.primary
+
+    def check(self) -> Optional[float]:
+        """Measure replica lag (Postgres standby; other databases count as current)."""
+        try:
+            with self.replica.connect() as conn:
+                if self.replica.dialect.name == "postgresql":
+                    self.lag = float(conn.execute(REPLICA_LAG_SQL).scalar())
+                else:
+                    conn.exec_driver_sql("SELECT 1")
+                    self.lag = 0.0
+            self.last_error = None
+        except Exception as e:
+            self.lag = None
+            self.last_error = str(e)
+        return self.lag
+
+    def monitor(self, stop_event: threading.Event) -> None:
+        while not stop_event.is_set():
+            self.check()
+            stop_event.wait(self.check_every)
+
+    def start(self) -> Tuple[Optional[threading.Thread], threading.Event]:
+        """Run the lag monitor in a daemon thread (no-op without a replica)."""
+        stop_event = threading.Event()
+        if self.replica is None:
+            return None, stop_event
+        thread = threading.Thread(target=self.monitor, kwargs={"stop_event": stop_event},
+                                  name="replica-monitor", daemon=True)
+        thread.start()
+        return thread, stop_event
+
+    def stats(self) -> dict:
+        return {
+            "configured": self.replica is not None,
+            "serving": "replica" if self.healthy else "primary",
+            "lag_seconds": None if self.lag is None else round(self.lag, 3),
+            "max_lag_seconds": self.max_lag,
+            "last_error": self.last_error,
+            "replica_reads": self.replica_reads,
+            "fallback_reads": self.fallback_reads,
+        }
+
+
+read_router = ReadRouter(engine, read_engine)
+
+
+def ReadSessionLocal():
+    """Session for reporting reads, bound to whichever engine the router picks."""
+    return SessionLocal(bind=read_router.engine())
+
+
+# Dependency for reporting endpoints (results, users, reports); may lag the
+# primary by up to READ_DB_MAX_LAG_SECONDS when a replica is configured
+async def get_read_db():
+    bind = read_router.engine()
+    async with _slot(bind):
+        db = SessionLocal(bind=bind)
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+
+def _pool_stats(pool_engine) -> dict:
+    pool = pool_engine.pool
+    capacity = pool_capacity(pool_engine)
+    if capacity is None:
+        return {"pool": type(pool).__name__}
+    checked_out = pool.checkedout()
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": checked_out,
+        "overflow": max(pool.overflow(), 0),
+        "capacity": capacity,
+        "utilization": round(checked_out / capacity, 3) if capacity else 0,
+    }
+
+
+def pool_stats() -> dict:
+    """Connection pool utilization of the primary and replica engines."""
+    return {
+        "primary": _pool_stats(engine),
+        "replica": _pool_stats(read_engine) if read_engine is not None else None,
+        "routing": read_router.stats(),
+    }
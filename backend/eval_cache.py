@@ -0,0 +1,113 @@
+"""
+Content-addressed cache of LLM evaluations.
+Keys are a sha256 over the question's ideal fields plus the normalized
+answer, so an identical (question, answer) pair is only ever sent once.
+"""
+import hashlib
+import json
+import threading
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Handle imports for both local development and deployment
+try:
+    from . import models
+    from .ai_agent import PROMPT_VERSION
+except ImportError:
+    import models
+    from ai_agent import PROMPT_VERSION
+
+
+def _normalize(text) -> str:
+    # Whitespace and case differences don't change the grade
+    return " ".join(str(text or "").split()).casefold()
+
+
+def cache_key(answer, question, namespace: str = "") -> str:
+    """Hash of everything the grade depends on (prompt version and backend included)."""
+    payload = [
+        namespace,
+        PROMPT_VERSION,
+        question.ideal_status or "",
+        question.ideal_explanation or "",
+        question.ideal_error or "",
+        _normalize(answer.status),
+        _normalize(answer.explanation),
+        _normalize(answer.critical_error),
+    ]
+    return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.pregraded = 0
+        self.stored = 0
+
+    def add(self, hits: int = 0, misses: int = 0, pregraded: int = 0, stored: int = 0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.pregraded += pregraded
+            self.stored += stored
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "pregraded": self.pregraded,
+                "stored": self.stored,
+            }
+
+
+stats = CacheStats()
+
+
+def lookup_many(db, keys: Iterable[str]) -> Dict[str, Tuple[int, str]]:
+    """Fetch cached grades for the given keys (one query) and bump their hit counts."""
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    rows = db.query(
+        models.EvaluationCacheEntry.key,
+        models.EvaluationCacheEntry.score,
+        models.EvaluationCacheEntry.feedback
+    ).filter(models.EvaluationCacheEntry.key.in_(keys)).all()
+    found = {r.key: (r.score, r.feedback) for r in rows}
+    if found:
+        db.query(models.EvaluationCacheEntry).filter(
+            models.EvaluationCacheEntry.key.in_(list(found))
+        ).update({"hit_count": models.EvaluationCacheEntry.hit_count + 1}, synchronize_session=False)
+    stats.add(hits=len(found), misses=len(keys) - len(found))
+    return found
+
+
+def store_many(db, entries: Dict[str, Tuple[int, str]]) -> None:
+    """Insert new grades; keys written concurrently by another worker are left as-is."""
+    if not entries:
+        return
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    db.execute(
+        insert(models.EvaluationCacheEntry.__table__).on_conflict_do_nothing(index_elements=["key"]),
+        [{"key": k, "score": score, "feedback": feedback, "hit_count": 0} for k, (score, feedback) in entries.items()]
+    )
+    stats.add(stored=len(entries))
+
+
+def summary(db) -> dict:
+    """Process counters plus persistent totals across all workers."""
+    entries, total_hits = db.query(
+        func.count(models.EvaluationCacheEntry.key),
+        func.coalesce(func.sum(models.EvaluationCacheEntry.hit_count), 0)
+    ).one()
+    return {"process": stats.snapshot(), "entries": entries, "total_hits": int(total_hits)}
@@ -0,0 +1,168 @@
+"""
+Aggregates over the per-response evaluation records written by the
+evaluation engine: outcome mix and error rate, token usage and spend,
+LLM latency percentiles, and throughput per evaluation job, for a test,
+a session or a time window. Used to budget grading runs and to size
+EVAL_CONCURRENCY / EVAL_BATCH_SIZE against the provider's rate limits.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import case, func
+
+# Handle imports for both local development and deployment
+try:
+    from . import models
+    from .session_events import iso_utc
+except ImportError:
+    import models
+    from session_events import iso_utc
+
+# Outcomes that needed the LLM (the error rate is taken over these)
+LLM_OUTCOMES = ("graded", "error")
+RECENT_RUNS = 20
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands back naive datetimes (stored as UTC)
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _percentile(query, column, count: int, fraction: float) -> Optional[float]:
+    if not count:
+        return None
+    value = query.with_entities(column).order_by(column).offset(min(count - 1, int(count * fraction))).limit(1).scalar()
+    return round(value, 1) if value is not None else None
+
+
+def summary(db, test_id: int = None, session_id: int = None, since: datetime = None) -> dict:
+    """Telemetry for the matching evaluation records (all filters optional)."""
+    Record = models.EvaluationRecord
+    records = db.query(Record)
+    if test_id is not None:
+        records = records.filter(Record.test_id == test_id)
+    if session_id is not None:
+        records = records.filter(Record.session_id == session_id)
+    if since is not None:
+        records = records.filter(Record.created_at >= since)
+
+    # 1. Totals per outcome class
+    by_outcome = records.with_entities(
+        Record.outcome,
+        func.count(Record.id),
+        func.coalesce(func.sum(Record.prompt_tokens), 0),
+        func.coalesce(func.sum(Record.completion_tokens), 0),
+        func.coalesce(func.sum(Record.cost_usd), 0.0),
+        # Batched answers share one request, so its latency is counted once
+        func.coalesce(func.sum(Record.latency_ms / Record.batch_size), 0.0),
+        func.sum(case((Record.attempts > 1, 1), else_=0)),
+        func.min(Record.created_at),
+        func.max(Record.created_at)
+    ).group_by(Record.outcome).all()
+
+    outcomes = {}
+    prompt_tokens = completion_tokens = retried = 0
+    cost = llm_ms = 0.0
+    first = last = None
+    for outcome, count, p_tokens, c_tokens, spend, latency, retries, started, finished in by_outcome:
+        outcomes[outcome] = count
+        prompt_tokens += int(p_tokens)
+        completion_tokens += int(c_tokens)
+        cost += float(spend)
+        llm_ms += float(latency)
+        retried += int(retries or 0)
+        if started and (first is None or _aware(started) < first):
+            first = _aware(started)
+        if finished and (last is None or _aware(finished) > last):
+            last = _aware(finished)
+
+    total = sum(outcomes.values())
+    llm_answers = sum(outcomes.get(o, 0) for o in LLM_OUTCOMES)
+    window = (last - first).total_seconds() if first and last else 0
+
+    # 2. LLM latency per answer (full request latency for batched answers)
+    timed = records.filter(Record.outcome.in_(LLM_OUTCOMES), Record.attempts > 0)
+    latency_count, latency_avg, latency_max = timed.with_entities(
+        func.count(Record.id), func.avg(Record.latency_ms), func.max(Record.latency_ms)
+    ).one()
+
+    # 3. Errors by class, spend by model
+    errors = records.filter(Record.outcome == "error").with_entities(
+        Record.error_type, func.count(Record.id)
+    ).group_by(Record.error_type).all()
+    by_model = records.filter(Record.model.isnot(None)).with_entities(
+        Record.model,
+        func.count(Record.id),
+        func.sum(Record.prompt_tokens),
+        func.sum(Record.completion_tokens),
+        func.sum(Record.cost_usd)
+    ).group_by(Record.model).all()
+
+    # 4. Throughput of the most recent queue jobs
+    runs = records.filter(Record.job_id.isnot(None)).join(
+        models.EvaluationJob, Record.job_id == models.EvaluationJob.id
+    ).with_entities(
+        models.EvaluationJob.id,
+        models.EvaluationJob.status,
+        models.EvaluationJob.started_at,
+        models.EvaluationJob.finished_at,
+        func.count(Record.id),
+        func.sum(Record.cost_usd)
+    ).group_by(
+        models.EvaluationJob.id, models.EvaluationJob.status,
+        models.EvaluationJob.started_at, models.EvaluationJob.finished_at
+    ).order_by(models.EvaluationJob.id.desc()).limit(RECENT_RUNS).all()
+
+    return {
+        "responses": total,
+        "outcomes": outcomes,
+        "llm_answers": llm_answers,
+        "error_rate": round(outcomes.get("error", 0) / llm_answers, 4) if llm_answers else 0.0,
+        "errors": {error_type or "unknown": count for error_type, count in errors},
+        "retried": retried,
+        "tokens": {
+            "prompt": prompt_tokens,
+            "completion": completion_tokens,
+            "total": prompt_tokens + completion_tokens,
+            "per_llm_answer": round((prompt_tokens + completion_tokens) / llm_answers, 1) if llm_answers else 0.0,
+        },
+        "cost_usd": round(cost, 6),
+        "cost_per_response_usd": round(cost / total, 6) if total else 0.0,
+        "latency_ms": {
+            "avg": round(latency_avg, 1) if latency_avg is not None else None,
+            "p50": _percentile(timed, Record.latency_ms, latency_count, 0.50),
+            "p95": _percentile(timed, Record.latency_ms, latency_count, 0.95),
+            "max": round(latency_max, 1) if latency_max is not None else None,
+        },
+        "llm_seconds": round(llm_ms / 1000, 3),
+        "first_at": iso_utc(first),
+        "last_at": iso_utc(last),
+        "responses_per_minute": round(total / window * 60, 1) if window > 0 else None,
+        "models": [
+            {
+                "model": model,
+                "responses": count,
+                "prompt_tokens": int(p_tokens or 0),
+                "completion_tokens": int(c_tokens or 0),
+                "cost_usd": round(float(spend or 0), 6),
+            }
+            for model, count, p_tokens, c_tokens, spend in by_model
+        ],
+        "runs": [_run_to_dict(*run) for run in runs],
+    }
+
+
+def _run_to_dict(job_id, status, started_at, finished_at, responses, spend) -> dict:
+    seconds = (_aware(finished_at) - _aware(started_at)).total_seconds() if started_at and finished_at else None
+    return {
+        "job_id": job_id,
+        "status": status,
+        "started_at": iso_utc(started_at),
+        "finished_at": iso_utc(finished_at),
+        "seconds": round(seconds, 3) if seconds is not None else None,
+        "responses": responses,
+        "responses_per_second": round(responses / seconds, 2) if seconds else None,
+        "cost_usd": round(float(spend or 0), 6),
+    }
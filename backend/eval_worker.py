@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Standalone AI evaluation worker.
+Claims jobs from the evaluation_jobs table and grades them. Run as many
+processes as needed (set EVAL_WORKER_MODE=external on the API so it stops
+grading inline).
+Run: python backend/eval_worker.py [--once]
+"""
+
+import argparse
+import signal
+import sys
+import os
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from backend.database import engine
+    from backend import models, job_queue
+    from backend.migrations import upgrade_schema
+except ImportError:
+    # Running from inside backend/ (e.g. Procfile worker)
+    from database import engine
+    import models, job_queue
+    from migrations import upgrade_schema
+
+# Create tables if not exist
+upgrade_schema(engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI evaluation worker")
+    parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    parser.add_argument("--poll-interval", type=float, default=job_queue.EVAL_POLL_INTERVAL)
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    worker_id = job_queue.default_worker_id()
+    print(f"--- Evaluation worker {worker_id} started ---")
+    job_queue.work(worker_id=worker_id, poll_interval=args.poll_interval, stop_event=stop_event, once=args.once)
+    print("--- Worker stopped ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+Concurrent evaluation engine for grading a session's (or a whole test's) responses.
+Answers decidable by rule are pre-graded locally and previously seen
+(question, answer) pairs come from the evaluation cache; the rest go to
+the AI evaluator over a bounded thread pool, with transient failures
+retried using exponential backoff. Test-wide runs pack several answers to
+the same question into one LLM request. Results are committed in micro-batches,
+each graded response with an evaluation record (outcome, model, tokens,
+latency, attempts, cost) for the telemetry in eval_telemetry.
+"""
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import insert
+
+# Handle imports for both local development and deployment
+try:
+    from . import models, eval_cache, score_stats
+    from .database import SessionLocal
+    from .ai_agent import (request_evaluation, request_batch_evaluation, pregrade_answer, get_backend,
+                           estimate_cost, Completion, EvaluatorBackend, EvaluationError, Grade,
+                           TransientEvaluationError)
+except ImportError:
+    import models, eval_cache, score_stats
+    from database import SessionLocal
+    from ai_agent import (request_evaluation, request_batch_evaluation, pregrade_answer, get_backend,
+                          estimate_cost, Completion, EvaluatorBackend, EvaluationError, Grade,
+                          TransientEvaluationError)
+
+# Engine settings (override via environment)
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))       # Parallel LLM calls per run
+EVAL_COMMIT_EVERY = int(os.getenv("EVAL_COMMIT_EVERY", "10"))    # Results per commit
+EVAL_MAX_RETRIES = int(os.getenv("EVAL_MAX_RETRIES", "3"))       # Retries per answer on transient errors
+EVAL_RETRY_BASE_DELAY = float(os.getenv("EVAL_RETRY_BASE_DELAY", "1.0"))
+EVAL_RETRY_MAX_DELAY = float(os.getenv("EVAL_RETRY_MAX_DELAY", "30.0"))
+EVAL_BATCH_SIZE = int(os.getenv("EVAL_BATCH_SIZE", "10"))        # Answers per LLM request (test-wide runs)
+EVAL_CACHE_ENABLED = os.getenv("EVAL_CACHE_ENABLED", "true").lower() == "true"
+EVAL_RECORDS_ENABLED = os.getenv("EVAL_RECORDS_ENABLED", "true").lower() == "true"  # Per-response telemetry rows
+
+Evaluator = Callable[[object, object], Grade]
+BatchEvaluator = Callable[[object, Sequence], Tuple[List[Optional[Tuple[int, str]]], Completion]]
+
+# Outcome classes (UNPARSED is internal: a batch reply missing an answer, graded singly next)
+GRADED, PREGRADED, CACHED, ERROR, UNPARSED = "graded", "pregraded", "cached", "error", "unparsed"
+
+
+class EvaluationOutcome(NamedTuple):
+    score: int
+    feedback: str
+    outcome: str
+    model: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: float = 0.0       # Time in LLM requests, backoff sleeps excluded
+    attempts: int = 0             # LLM requests made
+    error_type: Optional[str] = None
+    batch_size: int = 1
+
+
+def _usage_share(completion: Optional[Completion], index: int, count: int) -> dict:
+    """Answer `index`'s share of a request's tokens (remainders go to the first answers)."""
+    if completion is None:
+        return {}
+    return {
+        "model": completion.model,
+        "prompt_tokens": completion.prompt_tokens // count + (index < completion.prompt_tokens % count),
+        "completion_tokens": completion.completion_tokens // count + (index < completion.completion_tokens % count),
+    }
+
+
+def _combine(first: EvaluationOutcome, second: EvaluationOutcome) -> EvaluationOutcome:
+    """`second`'s result, charged with the LLM work already spent in `first`."""
+    return second._replace(
+        model=second.model or first.model,
+        prompt_tokens=first.prompt_tokens + second.prompt_tokens,
+        completion_tokens=first.completion_tokens + second.completion_tokens,
+        latency_ms=first.latency_ms + second.latency_ms,
+        attempts=first.attempts + second.attempts,
+    )
+
+
+# Plain snapshots handed to worker threads (ORM objects stay on the caller's thread)
+class AnswerSnapshot(NamedTuple):
+    id: int
+    status: Optional[str]
+    explanation: Optional[str]
+    critical_error: Optional[str]
+
+
+class QuestionSnapshot(NamedTuple):
+    id: int
+    ideal_status: Optional[str]
+    ideal_explanation: Optional[str]
+    ideal_error: Optional[str]
+
+
+def get_evaluator(backend: EvaluatorBackend) -> Evaluator:
+    """Single-answer evaluator bound to a backend."""
+    return partial(request_evaluation, backend=backend)
+
+
+def get_batch_evaluator(backend: EvaluatorBackend) -> BatchEvaluator:
+    """Multi-answer evaluator bound to a backend."""
+    return partial(request_batch_evaluation, backend=backend)
+
+
+def evaluate_with_retry(evaluator: Evaluator, answer, question,
+                        max_retries: int = EVAL_MAX_RETRIES,
+                        base_delay: float = EVAL_RETRY_BASE_DELAY) -> EvaluationOutcome:
+    """
+    Call the evaluator, backing off exponentially (with jitter) on transient errors.
+    Never raises: a final failure is reported with outcome ERROR, the message
+    as feedback and the exception class as error_type (no score is stored).
+    """
+    attempt = 0
+    llm_seconds = 0.0
+    while True:
+        started = time.perf_counter()
+        try:
+            grade = evaluator(answer, question)
+        except TransientEvaluationError as e:
+            llm_seconds += time.perf_counter() - started
+            if attempt >= max_retries:
+                return EvaluationOutcome(0, f"AI Error: {str(e)}", ERROR, latency_ms=llm_seconds * 1000,
+                                         attempts=attempt + 1, error_type=e.__class__.__name__)
+            delay = min(EVAL_RETRY_MAX_DELAY, base_delay * (2 ** attempt))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            attempt += 1
+            continue
+        except EvaluationError as e:
+            return EvaluationOutcome(0, str(e), ERROR, latency_ms=(llm_seconds + time.perf_counter() - started) * 1000,
+                                     attempts=attempt + 1, error_type=e.__class__.__name__)
+        except Exception as e:
+            return EvaluationOutcome(0, f"AI Error: {str(e)}", ERROR,
+                                     latency_ms=(llm_seconds + time.perf_counter() - started) * 1000,
+                                     attempts=attempt + 1, error_type=e.__class__.__name__)
+        llm_seconds += time.perf_counter() - started
+        return EvaluationOutcome(grade.score, grade.feedback, GRADED, latency_ms=llm_seconds * 1000,
+                                 attempts=attempt + 1, **_usage_share(grade.completion, 0, 1))
+
+
+def evaluate_batch_with_retry(batch_evaluator: BatchEvaluator, question, answers: Sequence,
+                              max_retries: int = EVAL_MAX_RETRIES,
+                              base_delay: float = EVAL_RETRY_BASE_DELAY) -> List[EvaluationOutcome]:
+    """
+    Grade several answers in one request, with the same backoff as evaluate_with_retry.
+    Each answer carries its share of the request's tokens and the full request latency.
+    Entries are UNPARSED where the reply could not be parsed (callers grade those singly).
+    """
+    count = len(answers)
+    attempt = 0
+    llm_seconds = 0.0
+
+    def failed(score: int, feedback: str, outcome: str, e: Exception) -> List[EvaluationOutcome]:
+        return [EvaluationOutcome(score, feedback, outcome, latency_ms=llm_seconds * 1000, attempts=attempt + 1,
+                                  error_type=e.__class__.__name__, batch_size=count)] * count
+
+    while True:
+        started = time.perf_counter()
+        try:
+            results, completion = batch_evaluator(question, answers)
+        except TransientEvaluationError as e:
+            llm_seconds += time.perf_counter() - started
+            if attempt >= max_retries:
+                return failed(0, f"AI Error: {str(e)}", ERROR, e)
+            delay = min(EVAL_RETRY_MAX_DELAY, base_delay * (2 ** attempt))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            attempt += 1
+            continue
+        except EvaluationError as e:
+            llm_seconds += time.perf_counter() - started
+            return failed(0, str(e), ERROR, e)
+        except Exception as e:
+            # Unexpected client/programming error: grading each answer singly would fail the same way
+            llm_seconds += time.perf_counter() - started
+            return failed(0, f"AI Error: {str(e)}", ERROR, e)
+        llm_seconds += time.perf_counter() - started
+        return [
+            EvaluationOutcome(r[0] if r else 0, r[1] if r else "", GRADED if r else UNPARSED,
+                              latency_ms=llm_seconds * 1000, attempts=attempt + 1, batch_size=count,
+                              **_usage_share(completion, i, count))
+            for i, r in enumerate(results)
+        ]
+
+
+class EvaluationEngine:
+    """Grades all responses of a session (or test) with bounded parallelism."""
+
+    def __init__(self, backend: EvaluatorBackend = None, concurrency: int = EVAL_CONCURRENCY,
+                 commit_every: int = EVAL_COMMIT_EVERY, max_retries: int = EVAL_MAX_RETRIES,
+                 base_delay: float = EVAL_RETRY_BASE_DELAY, session_factory=SessionLocal,
+                 use_cache: bool = EVAL_CACHE_ENABLED, batch_size: int = EVAL_BATCH_SIZE):
+        # Shared per-process backend unless one is injected (e.g. a FakeBackend in benchmarks)
+        self.backend = backend or get_backend()
+        self.evaluator = get_evaluator(self.backend)
+        self.batch_evaluator = get_batch_evaluator(self.backend)
+        self.concurrency = max(1, concurrency)
+        self.commit_every = max(1, commit_every)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.session_factory = session_factory
+        self.use_cache = use_cache
+        self.batch_size = max(1, batch_size)
+        self.cache_namespace = self.backend.cache_namespace
+
+    def evaluate_session(self, session_id: int, progress: Callable[[int, int], None] = None,
+                         job_id: int = None) -> dict:
+        """
+        Evaluate every response of a session.
+        Results are committed every `commit_every` answers, so a crash only
+        loses the uncommitted tail. `progress(done, total)` is called after each commit.
+        `job_id` tags the evaluation records with the queue job that ran them.
+        """
+        db = self.session_factory()
+        try:
+            # Single query with JOIN (no N+1)
+            rows = db.query(
+                models.UserResponse,
+                models.Question
+            ).join(
+                models.Question, models.UserResponse.question_id == models.Question.id
+            ).filter(
+                models.UserResponse.session_id == session_id,
+                models.Question.deleted_at.is_(None)  # Answers being purged aren't worth grading
+            ).all()
+            return self._evaluate(db, rows, progress, job_id=job_id)
+        finally:
+            db.close()
+
+    def evaluate_test(self, test_id: int, progress: Callable[[int, int], None] = None,
+                      only_pending: bool = True, job_id: int = None) -> dict:
+        """
+        Evaluate responses across every session of a test.
+        Answers are grouped by question and sent `batch_size` at a time, so the
+        shared instructions and ground truth are paid for once per request.
+        """
+        db = self.session_factory()
+        try:
+            query = db.query(
+                models.UserResponse,
+                models.Question
+            ).join(
+                models.Question, models.UserResponse.question_id == models.Question.id
+            ).join(
+                models.TestSession, models.UserResponse.session_id == models.TestSession.id
+            ).filter(
+                models.TestSession.test_id == test_id,
+                models.Question.deleted_at.is_(None)
+            )
+            if only_pending:
+                query = query.filter(models.UserResponse.ai_score.is_(None))
+            rows = query.order_by(models.UserResponse.question_id).all()
+            return self._evaluate(db, rows, progress, batch_size=self.batch_size, job_id=job_id)
+        finally:
+            db.close()
+
+    def _grade_chunk(self, question, answers: Sequence) -> List[EvaluationOutcome]:
+        """Grade answers to one question: batched request, then single-answer fallback."""
+        if len(answers) == 1:
+            return [evaluate_with_retry(self.evaluator, a, question, self.max_retries, self.base_delay)
+                    for a in answers]
+        results = evaluate_batch_with_retry(self.batch_evaluator, question, answers,
+                                            self.max_retries, self.base_delay)
+        return [
+            _combine(result, evaluate_with_retry(self.evaluator, answer, question, self.max_retries, self.base_delay))
+            if result.outcome == UNPARSED else result
+            for answer, result in zip(answers, results)
+        ]
+
+    def _record(self, resp, question, result: EvaluationOutcome, job_id: Optional[int]) -> dict:
+        return {
+            "response_id": resp.id,
+            "session_id": resp.session_id,
+            "test_id": question.test_id,
+            "question_id": question.id,
+            "job_id": job_id,
+            "outcome": result.outcome,
+            "error_type": result.error_type,
+            "error_message": result.feedback[:1000] if result.outcome == ERROR else None,
+            "backend": self.backend.name,
+            "model": result.model,
+            "attempts": result.attempts,
+            "latency_ms": round(result.latency_ms, 1),
+            "batch_size": result.batch_size,
+            "prompt_tokens": result.prompt_tokens,
+            "completion_tokens": result.completion_tokens,
+            "cost_usd": estimate_cost(result.model, result.prompt_tokens, result.completion_tokens),
+        }
+
+    def _evaluate(self, db, rows: list, progress=None, batch_size: int = 1, job_id: int = None) -> dict:
+        responses = {resp.id: (resp, q) for resp, q in rows}
+        jobs = [
+            (
+                AnswerSnapshot(resp.id, resp.status, resp.explanation, resp.critical_error),
+                QuestionSnapshot(q.id, q.ideal_status, q.ideal_explanation, q.ideal_error),
+            )
+            for resp, q in rows
+        ]
+        total = len(jobs)
+        counts = {GRADED: 0, PREGRADED: 0, CACHED: 0, ERROR: 0}
+        state = {"done": 0, "pending_commit": 0, "to_store": {}, "records": [], "grades": []}
+        deltas = score_stats.ScoreDeltas()
+        started = time.perf_counter()
+
+        def flush():
+            if self.use_cache and state["to_store"]:
+                eval_cache.store_many(db, state["to_store"])
+                state["to_store"] = {}
+            for resp, question, score, feedback in state["grades"]:
+                # Guarded on the ai_score read at load time: a concurrent run that wrote first wins
+                current = (models.UserResponse.ai_score.is_(None) if resp.ai_score is None
+                           else models.UserResponse.ai_score == resp.ai_score)
+                values = {"ai_feedback": feedback} if score is None else {"ai_score": score, "ai_feedback": feedback}
+                updated = db.query(models.UserResponse).filter(
+                    models.UserResponse.id == resp.id, current
+                ).update(values, synchronize_session=False)
+                if updated:
+                    deltas.record(resp, question, score)
+            state["grades"] = []
+            if state["records"]:
+                db.execute(insert(models.EvaluationRecord), state["records"])
+                state["records"] = []
+            # Aggregates commit atomically with the scores they summarize
+            deltas.apply(db)
+            db.commit()
+            state["pending_commit"] = 0
+            if progress:
+                progress(state["done"], total)
+
+        def apply(response_id: int, result: EvaluationOutcome):
+            resp, question = responses[response_id]
+            if result.outcome == ERROR:
+                # Not a grade: ai_score stays as it was (NULL = retried by the next pending run)
+                if resp.ai_score is None:
+                    state["grades"].append((resp, question, None, result.feedback))
+            else:
+                state["grades"].append((resp, question, result.score, result.feedback))
+            if EVAL_RECORDS_ENABLED:
+                state["records"].append(self._record(resp, question, result, job_id))
+            counts[result.outcome] += 1
+            state["done"] += 1
+            state["pending_commit"] += 1
+            if state["pending_commit"] >= self.commit_every:
+                flush()
+
+        # 1. Rule-based short-circuit (no LLM needed)
+        remaining = {}
+        for answer, question in jobs:
+            pregraded = pregrade_answer(answer, question)
+            if pregraded:
+                apply(answer.id, EvaluationOutcome(pregraded[0], pregraded[1], PREGRADED))
+                continue
+            key = eval_cache.cache_key(answer, question, self.cache_namespace)
+            remaining.setdefault(key, []).append((answer, question))
+        eval_cache.stats.add(pregraded=counts[PREGRADED])
+
+        # 2. Content-addressed cache lookup (one query for the whole session)
+        if self.use_cache:
+            for key, (score, feedback) in eval_cache.lookup_many(db, remaining).items():
+                for answer, _ in remaining.pop(key):
+                    apply(answer.id, EvaluationOutcome(score, feedback, CACHED))
+
+        # 3. LLM for the rest; identical pairs within the run are graded once
+        by_question = {}
+        for key, group in remaining.items():
+            by_question.setdefault(group[0][1].id, []).append(key)
+        chunks = [
+            keys[i:i + batch_size]
+            for keys in by_question.values()
+            for i in range(0, len(keys), batch_size)
+        ]
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="eval") as pool:
+            futures = {
+                pool.submit(self._grade_chunk, remaining[keys[0]][0][1],
+                            [remaining[key][0][0] for key in keys]): keys
+                for keys in chunks
+            }
+            for future in as_completed(futures):
+                for key, result in zip(futures[future], future.result()):
+                    if result.outcome == GRADED:
+                        state["to_store"][key] = (result.score, result.feedback)
+                    for i, (answer, _) in enumerate(remaining[key]):
+                        # Duplicates within the run share one grade; only the first carries its cost
+                        apply(answer.id, result if i == 0 else result._replace(
+                            prompt_tokens=0, completion_tokens=0, latency_ms=0.0, attempts=0))
+
+        if state["pending_commit"] or state["to_store"] or state["grades"]:
+            flush()
+
+        return {
+            "evaluated": state["done"],
+            "total": total,
+            "seconds": round(time.perf_counter() - started, 3),
+            **counts,
+        }
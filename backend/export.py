@@ -0,0 +1,134 @@
+"""
+Streaming export of a test's results (one row per answer) as CSV, NDJSON or XLSX.
+Rows are read with yield_per (a server-side cursor on Postgres) and encoded
+batch by batch inside a generator, so memory stays flat however many
+answers a test has. CSV and NDJSON start sending bytes after the first
+batch; XLSX is a zip archive, so it is written in openpyxl's write-only
+mode to a spooled temp file and streamed once complete.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from typing import Iterator
+
+# Handle imports for both local development and deployment
+try:
+    from . import models
+    from .database import SessionLocal
+except ImportError:
+    import models
+    from database import SessionLocal
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))  # Rows fetched/encoded per batch
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+COLUMNS = (
+    "session_id", "username", "is_completed",
+    "question_id", "task_id", "link",
+    "user_status", "user_explanation", "user_error",
+    "ideal_status", "ideal_explanation", "ideal_error",
+    "ai_score", "ai_feedback",
+)
+
+# Spreadsheet apps evaluate cells starting with these as formulas
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _rows(db, test_id: int, batch_rows: int):
+    return db.query(
+        models.TestSession.id.label("session_id"),
+        models.User.username,
+        models.TestSession.is_completed,
+        models.Question.id.label("question_id"),
+        models.Question.task_id,
+        models.Question.link,
+        models.UserResponse.status.label("user_status"),
+        models.UserResponse.explanation.label("user_explanation"),
+        models.UserResponse.critical_error.label("user_error"),
+        models.Question.ideal_status,
+        models.Question.ideal_explanation,
+        models.Question.ideal_error,
+        models.UserResponse.ai_score,
+        models.UserResponse.ai_feedback
+    ).join(
+        models.TestSession, models.UserResponse.session_id == models.TestSession.id
+    ).join(
+        models.User, models.TestSession.user_id == models.User.id
+    ).join(
+        models.Question, models.UserResponse.question_id == models.Question.id
+    ).filter(
+        models.TestSession.test_id == test_id,
+        models.Question.deleted_at.is_(None)
+    ).order_by(models.TestSession.id, models.UserResponse.id).yield_per(batch_rows)
+
+
+def _cell(value):
+    """Neutralize text that a spreadsheet would run as a formula."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _iter_csv(rows, batch_rows: int) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_cell(v) for v in row])
+        if count % batch_rows == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _iter_ndjson(rows, batch_rows: int) -> Iterator[bytes]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False))
+        if len(lines) >= batch_rows:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _iter_xlsx(rows, batch_rows: int) -> Iterator[bytes]:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Results")
+    sheet.append(COLUMNS)
+    for row in rows:
+        sheet.append([_cell(v) for v in row])
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(EXPORT_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def iter_export(test_id: int, fmt: str, session_factory=SessionLocal,
+                batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[bytes]:
+    """
+    Encoded export of every answer in a test.
+    Opens its own session: the generator runs while the response is being sent.
+    """
+    encoders = {"csv": _iter_csv, "ndjson": _iter_ndjson, "xlsx": _iter_xlsx}
+    db = session_factory()
+    try:
+        yield from encoders[fmt](_rows(db, test_id, batch_rows), batch_rows)
+    finally:
+        db.close()
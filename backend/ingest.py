@@ -0,0 +1,381 @@
+"""
+Streaming question ingest for Excel (.xlsx), CSV and Parquet uploads.
+The upload is spooled to disk and processed by a background job: the file
+is read in fixed-size chunks, each chunk is normalized with vectorized
+pandas operations and inserted through Core executemany, with per-chunk parse/insert timings
+recorded on the job. Every chunk is committed together with the job's counters, so an interrupted job resumes
+from the last committed row and a partial upload can be rolled back by
+deleting the questions tagged with its job id.
+"""
+import csv
+import io
+import os
+import shutil
+import tempfile
+import time
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import func, insert
+
+# Handle imports for both local development and deployment
+try:
+    from . import models, question_cache, resource_versions
+    from .database import SessionLocal
+except ImportError:
+    import models, question_cache, resource_versions
+    from database import SessionLocal
+
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "5000"))     # Rows parsed per chunk
+INGEST_INSERT_BATCH = int(os.getenv("INGEST_INSERT_BATCH", "1000"))  # Rows per executemany
+INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "question_uploads"))
+INGEST_STALE_SECONDS = int(os.getenv("INGEST_STALE_SECONDS", "120"))  # Running job with no heartbeat = interrupted
+
+RESUMABLE_STATUSES = ("queued", "failed")
+
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm")
+IDEAL_COLUMNS = ("ideal_status", "ideal_explanation", "ideal_error")
+
+
+class IngestError(Exception):
+    """Raised when an upload can't be ingested at all (bad format, missing columns)."""
+
+
+def file_format(filename: str) -> str:
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith(".parquet"):
+        return "parquet"
+    if name.endswith(EXCEL_EXTENSIONS):
+        return "xlsx"
+    raise IngestError("Unsupported file type. Upload .xlsx, .csv or .parquet")
+
+
+# ============== READERS ============== #
+
+def _read_xlsx(fileobj: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    # read_only streams rows from the zip instead of loading the whole sheet
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f"column_{i}" for i, c in enumerate(header)]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns, dtype=object)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns, dtype=object)
+    finally:
+        workbook.close()
+
+
+def _read_csv(fileobj: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    yield from pd.read_csv(fileobj, chunksize=chunk_rows, dtype=str, skip_blank_lines=True)
+
+
+def _read_parquet(fileobj: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise IngestError("Parquet uploads require the 'pyarrow' package")
+
+    for batch in pq.ParquetFile(fileobj).iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+def read_chunks(fileobj: BinaryIO, filename: str, chunk_rows: int = INGEST_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Yield the upload as DataFrames of at most `chunk_rows` rows."""
+    readers = {"xlsx": _read_xlsx, "csv": _read_csv, "parquet": _read_parquet}
+    yield from readers[file_format(filename)](fileobj, chunk_rows)
+
+
+# ============== NORMALIZATION ============== #
+
+def _text(series: pd.Series) -> pd.Series:
+    """Vectorized: stringify, strip, and turn NaN/blank into <NA>."""
+    text = series.astype("string").str.strip()
+    return text.mask(text == "")
+
+
+def normalize_chunk(df: pd.DataFrame, test_id: int, description: str,
+                    first_row: int = 2) -> Tuple[List[dict], List[dict]]:
+    """
+    Map an upload chunk onto question rows.
+    Returns (records, rejected); rejected rows carry their spreadsheet row
+    number (header is row 1) and a reason.
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    if "link" not in df.columns:
+        raise IngestError("File must have a 'link' column")
+
+    link = _text(df["link"])
+    valid = link.notna()
+
+    frame = pd.DataFrame({
+        "test_id": test_id,
+        "task_id": _text(df["task_id"]) if "task_id" in df.columns else pd.NA,
+        "link": link,
+        "description": description,
+    }, index=df.index)
+    for column in IDEAL_COLUMNS:
+        frame[column] = _text(df[column]).fillna("") if column in df.columns else ""
+
+    # Plain Python values (None instead of <NA>) for the DB driver
+    good = frame[valid].astype(object)
+    records = good.where(good.notna(), None).to_dict("records")
+
+    row_numbers = pd.RangeIndex(first_row, first_row + len(df))
+    rejected = [
+        {"row": int(row), "reason": "Missing 'link'"}
+        for row in row_numbers[~valid.to_numpy()]
+    ]
+    return records, rejected
+
+
+# ============== INSERT ============== #
+
+def insert_records(db, records: List[dict], batch_size: int = INGEST_INSERT_BATCH) -> int:
+    """Core executemany inserts in batches (no ORM object construction)."""
+    table = models.Question.__table__
+    for start in range(0, len(records), batch_size):
+        db.execute(insert(table), records[start:start + batch_size])
+    return len(records)
+
+
+# ============== JOBS ============== #
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands back naive datetimes
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def job_to_dict(job: models.IngestJob) -> dict:
+    started, finished = _aware(job.started_at), _aware(job.finished_at)
+    elapsed = ((finished or _now()) - started).total_seconds() if started else 0.0
+    return {
+        "job_id": job.id,
+        "test_id": job.test_id,
+        "filename": job.filename,
+        "status": job.status,
+        "rows_parsed": job.rows_parsed or 0,
+        "rows_inserted": job.rows_inserted or 0,
+        "rows_rejected": job.rows_rejected or 0,
+        "elapsed_seconds": round(elapsed, 1),
+        "rows_per_second": round((job.rows_parsed or 0) / elapsed, 1) if elapsed > 0 else 0.0,
+        "chunks": job.chunks or [],
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def is_stale(job: models.IngestJob) -> bool:
+    """A 'running' job whose worker stopped heartbeating (process restart, crash)."""
+    last = _aware(job.heartbeat_at or job.started_at)
+    return job.status == "running" and (last is None or _now() - last > timedelta(seconds=INGEST_STALE_SECONDS))
+
+
+def create_job(db, test_id: int, fileobj: BinaryIO, filename: str) -> models.IngestJob:
+    """Spool the upload to disk and record a queued job (committed)."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    file_format(filename)  # Reject unsupported types before spooling
+
+    job = models.IngestJob(test_id=test_id, filename=filename, status="queued")
+    db.add(job)
+    db.flush()
+
+    os.makedirs(INGEST_SPOOL_DIR, exist_ok=True)
+    job.spool_path = os.path.join(INGEST_SPOOL_DIR, f"ingest_{job.id}{extension}")
+    try:
+        with open(job.spool_path, "wb") as spool:
+            shutil.copyfileobj(fileobj, spool, length=1024 * 1024)
+        db.commit()
+    except Exception:
+        db.rollback()
+        _remove_spool(job.spool_path)
+        raise
+    db.refresh(job)
+    return job
+
+
+def _remove_spool(path: Optional[str]) -> None:
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def _claim(db, job_id: int) -> bool:
+    """queued/failed -> running, so a job never has two runners."""
+    claimed = db.query(models.IngestJob).filter(
+        models.IngestJob.id == job_id,
+        models.IngestJob.status.in_(RESUMABLE_STATUSES)
+    ).update({
+        "status": "running",
+        "error": None,
+        "started_at": func.coalesce(models.IngestJob.started_at, _now()),  # Elapsed spans resumes
+        "heartbeat_at": _now(),
+        "finished_at": None,
+    }, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def mark_resumable(db, job: models.IngestJob) -> None:
+    """Put an interrupted or failed job back in the queue (its committed rows stay)."""
+    if job.status == "running" and not is_stale(job):
+        raise IngestError("Upload is still running")
+    if job.status not in RESUMABLE_STATUSES + ("running",):
+        raise IngestError(f"Upload is {job.status} and can't be resumed")
+    if not job.spool_path or not os.path.exists(job.spool_path):
+        raise IngestError("Uploaded file is no longer available; upload it again")
+    job.status = "queued"
+    db.commit()
+
+
+def run_job(job_id: int, description: str, session_factory=SessionLocal,
+            chunk_rows: int = INGEST_CHUNK_ROWS) -> None:
+    """Ingest a queued job, resuming after rows_parsed. Safe to call from a background task."""
+    db = session_factory()
+    try:
+        if not _claim(db, job_id):
+            return
+        job = db.get(models.IngestJob, job_id)
+        resume_from = job.rows_parsed or 0
+        position = 0
+
+        try:
+            # The reader is closed before the file, also when a chunk fails
+            with open(job.spool_path, "rb") as fileobj, closing(read_chunks(fileobj, job.filename, chunk_rows)) as reader:
+                while True:
+                    t0 = time.perf_counter()
+                    df = next(reader, None)
+                    if df is None:
+                        break
+                    start, position = position, position + len(df)
+                    if position <= resume_from:
+                        continue
+                    if start < resume_from:
+                        df, start = df.iloc[resume_from - start:], resume_from
+
+                    records, bad = normalize_chunk(df, job.test_id, description, first_row=start + 2)
+                    for record in records:
+                        record["ingest_job_id"] = job.id
+                    t1 = time.perf_counter()
+                    insert_records(db, records)
+                    t2 = time.perf_counter()
+                    if bad:
+                        db.execute(insert(models.IngestRejectedRow.__table__),
+                                   [{"job_id": job.id, **row} for row in bad])
+
+                    # Rows and counters commit together: rows_parsed is the resume point
+                    job.rows_parsed = position
+                    job.rows_inserted = (job.rows_inserted or 0) + len(records)
+                    job.rows_rejected = (job.rows_rejected or 0) + len(bad)
+                    job.chunks = (job.chunks or []) + [{
+                        "chunk": len(job.chunks or []) + 1,
+                        "first_row": start + 2,
+                        "rows": len(df),
+                        "inserted": len(records),
+                        "rejected": len(bad),
+                        "parse_ms": round((t1 - t0) * 1000, 1),
+                        "insert_ms": round((t2 - t1) * 1000, 1),
+                    }]
+                    job.heartbeat_at = _now()
+                    resource_versions.bump(db, resource_versions.TESTS)  # Question counts changed
+                    db.commit()
+                    question_cache.invalidate_test(job.test_id)
+        except Exception as e:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e) or e.__class__.__name__
+            job.finished_at = _now()
+            db.commit()
+            print(f"[INGEST] Job {job_id} failed at row {job.rows_parsed}: {job.error}")
+            return
+
+        job.status = "done"
+        job.finished_at = _now()
+        db.commit()
+        _remove_spool(job.spool_path)
+    finally:
+        db.close()
+
+
+def rollback_job(db, job: models.IngestJob) -> int:
+    """
+    Delete every question the upload inserted. Returns the number removed.
+    Refused once any of them has been answered or frozen into a session's
+    question set: those sessions would point at rows that no longer exist.
+    """
+    if job.status == "running" and not is_stale(job):
+        raise IngestError("Upload is still running")
+    if job.status == "rolled_back":
+        return 0
+
+    question_ids = db.query(models.Question.id).filter(models.Question.ingest_job_id == job.id)
+    answered = db.query(models.UserResponse.id).filter(
+        models.UserResponse.question_id.in_(question_ids)
+    ).first()
+    if answered:
+        raise IngestError("Questions from this upload already have answers; delete them individually")
+
+    uploaded = {row.id for row in question_ids}
+    snapshots = db.query(models.QuestionSet.question_ids).filter(models.QuestionSet.test_id == job.test_id)
+    legacy_orders = db.query(models.TestSession.question_order).filter(
+        models.TestSession.test_id == job.test_id,
+        models.TestSession.question_order.isnot(None)
+    )
+    if any(uploaded.intersection(ids or ()) for (ids,) in chain(snapshots, legacy_orders)):
+        raise IngestError("Questions from this upload are already in started sessions; delete them individually")
+
+    removed = db.query(models.Question).filter(
+        models.Question.ingest_job_id == job.id
+    ).delete(synchronize_session=False)
+    job.status = "rolled_back"
+    job.finished_at = _now()
+    resource_versions.bump(db, resource_versions.TESTS)
+    db.commit()
+    _remove_spool(job.spool_path)
+    question_cache.invalidate_test(job.test_id)
+    return removed
+
+
+def iter_error_report(job_id: int, session_factory=SessionLocal, batch_size: int = 1000) -> Iterator[str]:
+    """
+    CSV chunks (row, reason) of every rejected row, streamed in batches.
+    Opens its own session: it runs while the response is being sent.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["row", "reason"])
+    db = session_factory()
+    try:
+        rows = db.query(models.IngestRejectedRow.row, models.IngestRejectedRow.reason).filter(
+            models.IngestRejectedRow.job_id == job_id
+        ).order_by(models.IngestRejectedRow.row).yield_per(batch_size)
+        for count, rejected in enumerate(rows, 1):
+            writer.writerow([rejected.row, rejected.reason])
+            if count % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        db.close()
+    yield buffer.getvalue()
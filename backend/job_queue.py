@@ -0,0 +1,224 @@
+"""
+Durable, database-backed queue for AI evaluation jobs.
+Jobs survive restarts and can be claimed by any number of worker processes:
+Postgres uses SELECT ... FOR UPDATE SKIP LOCKED, SQLite falls back to a
+compare-and-swap UPDATE (SQLite serializes writers, so only one claim wins).
+"""
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+# Handle imports for both local development and deployment
+try:
+    from . import models
+    from .database import SessionLocal, engine
+    from .evaluation import EvaluationEngine
+except ImportError:
+    import models
+    from database import SessionLocal, engine
+    from evaluation import EvaluationEngine
+
+# Queue settings (override via environment)
+EVAL_WORKER_MODE = os.getenv("EVAL_WORKER_MODE", "inline")            # "inline" or "external"
+EVAL_POLL_INTERVAL = float(os.getenv("EVAL_POLL_INTERVAL", "2.0"))    # Seconds between polls when idle
+EVAL_JOB_LEASE_SECONDS = int(os.getenv("EVAL_JOB_LEASE_SECONDS", "600"))  # Heartbeat age before reclaim
+EVAL_JOB_MAX_ATTEMPTS = int(os.getenv("EVAL_JOB_MAX_ATTEMPTS", "3"))
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+OPEN_STATUSES = (PENDING, RUNNING)
+
+IS_POSTGRES = engine.dialect.name == "postgresql"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def job_to_dict(job: models.EvaluationJob) -> dict:
+    return {
+        "job_id": job.id,
+        "session_id": job.session_id,
+        "test_id": job.test_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "total": job.total,
+        "completed": job.completed,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# ============== PRODUCER ============== #
+
+def _open_job(db, session_id: int = None, test_id: int = None) -> Optional[models.EvaluationJob]:
+    query = db.query(models.EvaluationJob).filter(models.EvaluationJob.status.in_(OPEN_STATUSES))
+    if test_id is not None:
+        return query.filter(models.EvaluationJob.test_id == test_id).first()
+    return query.filter(models.EvaluationJob.session_id == session_id).first()
+
+
+def _enqueue(db, session_id: int = None, test_id: int = None) -> Tuple[models.EvaluationJob, bool]:
+    existing = _open_job(db, session_id, test_id)
+    if existing:
+        return existing, False
+
+    job = models.EvaluationJob(session_id=session_id, test_id=test_id, status=PENDING,
+                               attempts=0, total=0, completed=0)
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Lost the race against a concurrent click (partial unique index)
+        db.rollback()
+        return _open_job(db, session_id, test_id), False
+    return job, True
+
+
+def enqueue_evaluation(db, session_id: int) -> Tuple[models.EvaluationJob, bool]:
+    """
+    Queue an evaluation for a session.
+    Returns (job, created). If a pending/running job already exists it is
+    returned instead, so duplicate clicks never start duplicate runs.
+    """
+    return _enqueue(db, session_id=session_id)
+
+
+def enqueue_test_evaluation(db, test_id: int) -> Tuple[models.EvaluationJob, bool]:
+    """Queue a batched evaluation of every ungraded response in a test (deduplicated like above)."""
+    return _enqueue(db, test_id=test_id)
+
+
+# ============== CONSUMER ============== #
+
+def requeue_stale_jobs(db) -> int:
+    """Return jobs whose worker stopped heartbeating to the queue (or fail them)."""
+    cutoff = _now() - timedelta(seconds=EVAL_JOB_LEASE_SECONDS)
+    stale = db.query(models.EvaluationJob).filter(
+        models.EvaluationJob.status == RUNNING,
+        models.EvaluationJob.heartbeat_at < cutoff
+    )
+    requeued = stale.filter(models.EvaluationJob.attempts < EVAL_JOB_MAX_ATTEMPTS).update(
+        {"status": PENDING, "worker_id": None}, synchronize_session=False
+    )
+    stale.filter(models.EvaluationJob.attempts >= EVAL_JOB_MAX_ATTEMPTS).update(
+        {"status": FAILED, "error": "Worker lease expired", "finished_at": _now()}, synchronize_session=False
+    )
+    db.commit()
+    return requeued
+
+
+def claim_next_job(db, worker_id: str) -> Optional[models.EvaluationJob]:
+    """Atomically move the oldest pending job to 'running' for this worker."""
+    if IS_POSTGRES:
+        job = db.query(models.EvaluationJob).filter(
+            models.EvaluationJob.status == PENDING
+        ).order_by(models.EvaluationJob.id).with_for_update(skip_locked=True).first()
+        if not job:
+            db.rollback()
+            return None
+        now = _now()
+        job.status = RUNNING
+        job.worker_id = worker_id
+        job.attempts = (job.attempts or 0) + 1
+        job.started_at = now
+        job.heartbeat_at = now
+        job.error = None
+        db.commit()
+        return job
+
+    # SQLite: compare-and-swap on status; whoever updates the row owns it
+    candidates = db.query(models.EvaluationJob.id).filter(
+        models.EvaluationJob.status == PENDING
+    ).order_by(models.EvaluationJob.id).limit(5).all()
+    for (job_id,) in candidates:
+        now = _now()
+        claimed = db.query(models.EvaluationJob).filter(
+            models.EvaluationJob.id == job_id,
+            models.EvaluationJob.status == PENDING
+        ).update({
+            "status": RUNNING,
+            "worker_id": worker_id,
+            "attempts": models.EvaluationJob.attempts + 1,
+            "started_at": now,
+            "heartbeat_at": now,
+            "error": None,
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return db.query(models.EvaluationJob).filter(models.EvaluationJob.id == job_id).first()
+    return None
+
+
+def _update_job(job_id: int, worker_id: str, values: dict) -> None:
+    # Short-lived session; guarded by worker_id so a reclaimed job isn't clobbered
+    db = SessionLocal()
+    try:
+        db.query(models.EvaluationJob).filter(
+            models.EvaluationJob.id == job_id,
+            models.EvaluationJob.worker_id == worker_id
+        ).update(values, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_job(job: models.EvaluationJob, worker_id: str, evaluation_engine: EvaluationEngine = None) -> None:
+    """Execute a claimed job, reporting progress and final state on the job row."""
+    def progress(done: int, total: int):
+        _update_job(job.id, worker_id, {"completed": done, "total": total, "heartbeat_at": _now()})
+
+    try:
+        evaluation_engine = evaluation_engine or EvaluationEngine()
+        if job.test_id is not None:
+            stats = evaluation_engine.evaluate_test(job.test_id, progress=progress, job_id=job.id)
+        else:
+            stats = evaluation_engine.evaluate_session(job.session_id, progress=progress, job_id=job.id)
+        _update_job(job.id, worker_id, {"status": DONE, "completed": stats["evaluated"],
+                                        "total": stats["total"], "finished_at": _now()})
+    except Exception as e:
+        if job.attempts >= EVAL_JOB_MAX_ATTEMPTS:
+            _update_job(job.id, worker_id, {"status": FAILED, "error": str(e), "finished_at": _now()})
+        else:
+            _update_job(job.id, worker_id, {"status": PENDING, "error": str(e), "worker_id": None})
+
+
+def work(worker_id: str = None, poll_interval: float = EVAL_POLL_INTERVAL,
+         stop_event: threading.Event = None, once: bool = False) -> None:
+    """Claim and run jobs until stop_event is set (or the queue is empty, with once=True)."""
+    worker_id = worker_id or default_worker_id()
+    stop_event = stop_event or threading.Event()
+    evaluation_engine = EvaluationEngine()
+
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            requeue_stale_jobs(db)
+            job = claim_next_job(db, worker_id)
+        finally:
+            db.close()
+
+        if job:
+            run_job(job, worker_id, evaluation_engine)
+            continue
+        if once:
+            return
+        stop_event.wait(poll_interval)
+
+
+def start_inline_worker() -> Tuple[threading.Thread, threading.Event]:
+    """Run a queue worker in a daemon thread of the API process."""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=work, kwargs={"stop_event": stop_event},
+                              name="eval-worker", daemon=True)
+    thread.start()
+    return thread, stop_event
@@ -1,28 +1,70 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, BackgroundTasks, Request, Response
+from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, case, select, and_
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
-import random
-import pandas as pd
+from datetime import datetime, timedelta, timezone
+import asyncio
 import os
-import shutil
 
 # Handle imports for both local development and deployment
 try:
     from . import models, schemas
-    from .database import engine, get_db, SessionLocal
-    from .password_utils import verify_password
+    from .database import engine, get_db, get_read_db, SessionLocal, ReadSessionLocal, read_router, pool_stats
+    from . import password_utils, auth
+    from . import job_queue, eval_cache, question_cache, question_order, ingest, pagination, score_stats, export
+    from . import session_events, resource_versions, session_flow, async_database, async_routes, sqlite_writer
+    from . import metrics, eval_telemetry, purge, shared_cache
+    from .migrations import upgrade_schema
 except ImportError:
     import models, schemas
-    from database import engine, get_db, SessionLocal
-    from password_utils import verify_password
-
-
-# Create Tables
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
+    from database import engine, get_db, get_read_db, SessionLocal, ReadSessionLocal, read_router, pool_stats
+    import password_utils, auth
+    import job_queue, eval_cache, question_cache, question_order, ingest, pagination, score_stats, export
+    import session_events, resource_versions, session_flow, async_database, async_routes, sqlite_writer
+    import metrics, eval_telemetry, purge, shared_cache
+    from migrations import upgrade_schema
+
+
+# Create Tables (and apply additive column/index upgrades)
+upgrade_schema(engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Grade queued evaluations inside the API process unless dedicated workers run them
+    stop_event = None
+    if job_queue.EVAL_WORKER_MODE == "inline":
+        _, stop_event = job_queue.start_inline_worker()
+    # Warm the bcrypt process pool before the first login storm
+    await run_in_threadpool(password_utils.pool.start)
+    # Session events are pushed from request threads onto this loop; expiry is swept in the background
+    session_events.hub.bind(asyncio.get_running_loop())
+    _, sweeper_stop = session_events.start_sweeper()
+    # Reporting reads use the replica only while its measured lag is tolerable
+    _, replica_stop = read_router.start()
+    # Rows of soft-deleted tests/questions are removed in small chunks in the background
+    purge_stop = purge.start_purger()[1] if purge.PURGE_WORKER else None
+    yield
+    if purge_stop:
+        purge_stop.set()
+    replica_stop.set()
+    if stop_event:
+        stop_event.set()
+    sweeper_stop.set()
+    password_utils.pool.shutdown()
+    await run_in_threadpool(sqlite_writer.shutdown)
+    await async_database.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Opt-in async DB path: registered first, so its handlers shadow the sync candidate routes below
+if async_database.ASYNC_DB_ENABLED:
+    app.include_router(async_routes.router)
 
 # CORS Configuration
 # Set FRONTEND_URL in Railway (can be comma-separated for multiple origins)
@@ -48,8 +90,12 @@ app.add_middleware(
     allow_credentials=allow_credentials,
     allow_methods=["*"],  # Allow all methods including OPTIONS
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER, "ETag"],  # Let the dashboard read the page cursor / version
 )
 
+# Per-route latency, in-flight and SQL/pool-wait attribution (served at /metrics)
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Health check endpoint
 @app.get("/")
 def health_check():
@@ -63,12 +109,16 @@ def health_check():
 # ============== CONSTANTS ============== #
 GENERAL_INSTRUCTION = "Solve the task and write the task status, task explanation, and critical error if task is failure."
 
+# Every /admin route verifies a signed admin token in-process (no DB lookup)
+ADMIN_ONLY = [Depends(auth.require_admin)]
+# Download links opened by the browser, which can't send the Authorization header
+ADMIN_DOWNLOAD = [Depends(auth.require_admin_from_query)]
+
 
 # ============== ADMIN ENDPOINTS ============== #
 
 # --- ADMIN: 1. DASHBOARD DATA ---
-@app.get("/admin/tests")
-def get_all_tests(db: Session = Depends(get_db)):
+def _load_tests(db: Session) -> list:
     # Single optimized query with question count (no N+1)
     results = db.query(
         models.Test.id,
@@ -77,8 +127,8 @@ def get_all_tests(db: Session = Depends(get_db)):
         models.Test.is_active,
         func.count(models.Question.id).label('question_count')
     ).outerjoin(
-        models.Question, models.Test.id == models.Question.test_id
-    ).group_by(models.Test.id).all()
+        models.Question, and_(models.Test.id == models.Question.test_id, models.Question.deleted_at.is_(None))
+    ).filter(models.Test.deleted_at.is_(None)).group_by(models.Test.id).all()
     
     return [
         {
@@ -91,26 +141,54 @@ def get_all_tests(db: Session = Depends(get_db)):
         for r in results
     ]
 
+@app.get("/admin/tests", dependencies=ADMIN_ONLY)
+def get_all_tests(request: Request, response: Response, db: Session = Depends(get_db)):
+    # Unchanged since the client's copy: 304 without running the query
+    version = resource_versions.current(db, resource_versions.TESTS)
+    tag = resource_versions.etag("tests", version)
+    cached = resource_versions.check(request, response, tag)
+    if cached:
+        return cached
+    
+    # One query per version across workers (shared backend), even when many dashboards miss at once
+    return shared_cache.cache.get_or_set(
+        f"tests:list:{version}", lambda: _load_tests(db), tags=(resource_versions.TESTS,)
+    )
+
 # --- ADMIN: 1.1 GET ACTIVE TEST ---
-@app.get("/admin/active-test")
-def get_active_test(db: Session = Depends(get_db)):
+def _load_active_test(db: Session) -> dict:
     # Single query with COUNT (was 2 queries)
     result = db.query(
         models.Test.id,
         models.Test.title,
         func.count(models.Question.id).label('question_count')
     ).outerjoin(
-        models.Question, models.Test.id == models.Question.test_id
+        models.Question, and_(models.Test.id == models.Question.test_id, models.Question.deleted_at.is_(None))
     ).filter(
-        models.Test.is_active == True
+        models.Test.is_active == True,
+        models.Test.deleted_at.is_(None)
     ).group_by(models.Test.id).first()
     
+    # Wrapped so that "no active test" is cached too
     if not result:
-        return None
-    return {"id": result.id, "title": result.title, "question_count": result.question_count}
+        return {"active": None}
+    return {"active": {"id": result.id, "title": result.title, "question_count": result.question_count}}
+
+@app.get("/admin/active-test", dependencies=[Depends(auth.get_current_user)])
+def get_active_test(request: Request, response: Response, db: Session = Depends(get_db)):
+    version = resource_versions.current(db, resource_versions.TESTS)
+    tag = resource_versions.etag("active", version)
+    cached = resource_versions.check(request, response, tag)
+    if cached:
+        return cached
+    
+    # Every candidate polls this when the active test changes: computed once, the rest wait for it
+    return shared_cache.cache.get_or_set(
+        f"tests:active:{version}", lambda: _load_active_test(db), tags=(resource_versions.TESTS,)
+    )["active"]
 
 # --- ADMIN: 2. CREATE TEST ---
-@app.post("/admin/create-test")
+@app.post("/admin/create-test", dependencies=ADMIN_ONLY)
 def create_test(test: schemas.TestCreate, db: Session = Depends(get_db)):
     new_test = models.Test(
         title=test.title,
@@ -118,125 +196,164 @@ def create_test(test: schemas.TestCreate, db: Session = Depends(get_db)):
         is_active=False
     )
     db.add(new_test)
+    resource_versions.bump(db, resource_versions.TESTS)
     db.commit()
     return {"message": "Test Created", "id": new_test.id}
 
 # --- ADMIN: 2.1 ACTIVATE TEST ---
-@app.post("/admin/test/{test_id}/activate")
+@app.post("/admin/test/{test_id}/activate", dependencies=ADMIN_ONLY)
 def activate_test(test_id: int, db: Session = Depends(get_db)):
     # Single UPDATE for deactivation + activate specific one
     db.query(models.Test).filter(models.Test.id != test_id).update({"is_active": False})
-    result = db.query(models.Test).filter(models.Test.id == test_id).update({"is_active": True})
+    result = db.query(models.Test).filter(
+        models.Test.id == test_id, models.Test.deleted_at.is_(None)
+    ).update({"is_active": True})
     
     if result == 0:
         raise HTTPException(status_code=404, detail="Test not found")
     
+    resource_versions.bump(db, resource_versions.TESTS)
     db.commit()
     return {"message": "Test activated"}
 
 # --- ADMIN: 2.2 DEACTIVATE TEST ---
-@app.post("/admin/test/{test_id}/deactivate")
+@app.post("/admin/test/{test_id}/deactivate", dependencies=ADMIN_ONLY)
 def deactivate_test(test_id: int, db: Session = Depends(get_db)):
     result = db.query(models.Test).filter(models.Test.id == test_id).update({"is_active": False})
     if result == 0:
         raise HTTPException(status_code=404, detail="Test not found")
+    resource_versions.bump(db, resource_versions.TESTS)
     db.commit()
     return {"message": "Test deactivated"}
 
-# --- ADMIN: 2.3 DELETE TEST ---
-@app.delete("/admin/test/{test_id}")
+# --- ADMIN: 2.3 DELETE TEST (soft delete; rows purged in the background) ---
+@app.delete("/admin/test/{test_id}", dependencies=ADMIN_ONLY)
 def delete_test(test_id: int, db: Session = Depends(get_db)):
-    # Check existence
-    test = db.query(models.Test).filter(models.Test.id == test_id).first()
+    test = db.query(models.Test).filter(models.Test.id == test_id, models.Test.deleted_at.is_(None)).first()
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
-    
-    title = test.title
-    
-    # Get all sessions for this test
-    session_ids = [s.id for s in db.query(models.TestSession.id).filter(models.TestSession.test_id == test_id).all()]
-    
-    # Delete user responses for these sessions
-    if session_ids:
-        db.query(models.UserResponse).filter(models.UserResponse.session_id.in_(session_ids)).delete(synchronize_session=False)
-    
-    # Delete test sessions
-    db.query(models.TestSession).filter(models.TestSession.test_id == test_id).delete(synchronize_session=False)
-    
-    # Delete questions
-    db.query(models.Question).filter(models.Question.test_id == test_id).delete(synchronize_session=False)
-    
-    # Delete test
-    db.delete(test)
-    db.commit()
-    
-    return {"message": f"Test '{title}' deleted"}
 
+    # Hidden at once; sessions, responses, questions etc. go in small chunks (see purge.py)
+    job = purge.delete_test(db, test)
+    db.commit()
+    question_cache.invalidate_test(test_id)
+    return {"message": f"Test '{test.title}' deleted", **purge.job_to_dict(job)}
 
 # --- ADMIN: 2.4 GET TEST QUESTIONS ---
-@app.get("/admin/test/{test_id}/questions")
-def get_test_questions(test_id: int, db: Session = Depends(get_db)):
-    # Only select needed columns
-    questions = db.query(
-        models.Question.id,
-        models.Question.task_id,
-        models.Question.link
-    ).filter(models.Question.test_id == test_id).all()
-    
-    return [{"id": q.id, "task_id": q.task_id, "link": q.link} for q in questions]
+@app.get("/admin/test/{test_id}/questions", dependencies=ADMIN_ONLY)
+def get_test_questions(test_id: int, response: Response, cursor: Optional[str] = None, limit: Optional[int] = None,
+                       fields: Optional[str] = None, ingest_job_id: Optional[int] = None,
+                       db: Session = Depends(get_db)):
+    columns = {
+        "id": models.Question.id,
+        "task_id": models.Question.task_id,
+        "link": models.Question.link,
+        "ideal_status": models.Question.ideal_status,
+        "ingest_job_id": models.Question.ingest_job_id,
+    }
+    try:
+        names = pagination.parse_fields(fields, columns, default=["id", "task_id", "link"])
+        # Only the requested columns; keyset on (test_id, id)
+        query = db.query(*[columns[n].label(n) for n in names]).filter(
+            models.Question.test_id == test_id, models.Question.deleted_at.is_(None)
+        )
+        if ingest_job_id is not None:
+            query = query.filter(models.Question.ingest_job_id == ingest_job_id)
+        questions, next_cursor = pagination.keyset_page(query, models.Question.id, cursor, limit)
+    except pagination.PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-# --- ADMIN: 2.5 DELETE QUESTION ---
-@app.delete("/admin/question/{question_id}")
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return [q._asdict() for q in questions]
+
+# --- ADMIN: 2.5 DELETE QUESTION (soft delete; its answers purged in the background) ---
+@app.delete("/admin/question/{question_id}", dependencies=ADMIN_ONLY)
 def delete_question(question_id: int, db: Session = Depends(get_db)):
-    result = db.query(models.Question).filter(models.Question.id == question_id).delete()
-    if result == 0:
+    question = db.query(models.Question).filter(
+        models.Question.id == question_id, models.Question.deleted_at.is_(None)
+    ).first()
+    if not question:
         raise HTTPException(status_code=404, detail="Question not found")
+
+    # Answers to it leave the session scores chunk by chunk, then the row goes
+    job = purge.delete_question(db, question)
     db.commit()
-    return {"message": "Question deleted"}
+    question_cache.invalidate_question(question_id, question.test_id)
+    return {"message": "Question deleted", **purge.job_to_dict(job)}
+
+# --- ADMIN: 2.6 PURGE JOB PROGRESS ---
+@app.get("/admin/purge/{job_id}", dependencies=ADMIN_ONLY)
+def get_purge_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(models.PurgeJob).filter(models.PurgeJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return purge.job_to_dict(job)
+
+# --- ADMIN: 3. UPLOAD QUESTIONS (EXCEL / CSV / PARQUET) ---
+@app.post("/admin/test/{test_id}/upload", dependencies=ADMIN_ONLY)
+def upload_questions(test_id: int, background_tasks: BackgroundTasks, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    exists = db.query(func.count(models.Test.id)).filter(
+        models.Test.id == test_id, models.Test.deleted_at.is_(None)
+    ).scalar()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Test not found")
 
-# --- ADMIN: 3. UPLOAD QUESTIONS (EXCEL) ---
-@app.post("/admin/test/{test_id}/upload")
-async def upload_questions(test_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    temp_file = f"temp_{file.filename}"
     try:
-        # Save temp file
-        with open(temp_file, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Issue #5 fix: Read file ONCE (was reading twice before)
-        df = pd.read_excel(temp_file)
-        
-        # Determine which columns exist
-        has_link = 'link' in df.columns
-        has_task_id = 'task_id' in df.columns
-        
-        if not has_link:
-            raise HTTPException(status_code=400, detail="Excel file must have a 'link' column")
-        
-        # Bulk insert for performance
-        questions = [
-            models.Question(
-                test_id=test_id,
-                task_id=str(row['task_id']) if has_task_id and pd.notna(row.get('task_id')) else None,
-                link=str(row['link']),
-                description=GENERAL_INSTRUCTION,
-                ideal_status=str(row.get('ideal_status', '')) if pd.notna(row.get('ideal_status')) else '',
-                ideal_explanation=str(row.get('ideal_explanation', '')) if pd.notna(row.get('ideal_explanation')) else '',
-                ideal_error=str(row.get('ideal_error', '')) if pd.notna(row.get('ideal_error')) else ''
-            )
-            for _, row in df.iterrows()
-        ]
-        
-        db.bulk_save_objects(questions)
-        db.commit()
-        return {"message": f"Uploaded {len(questions)} questions"}
-    except HTTPException:
-        raise
-    except Exception as e:
+        # Spool and return right away; rows are parsed/inserted in the background
+        job = ingest.create_job(db, test_id, file.file, file.filename)
+    except ingest.IngestError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+
+    background_tasks.add_task(ingest.run_job, job.id, GENERAL_INSTRUCTION)
+    return {"message": "Upload queued", **ingest.job_to_dict(job)}
+
+# --- ADMIN: 3.2 UPLOAD JOB PROGRESS ---
+@app.get("/admin/ingest/{job_id}", dependencies=ADMIN_ONLY)
+def get_ingest_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(models.IngestJob).filter(models.IngestJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return {**ingest.job_to_dict(job), "stale": ingest.is_stale(job)}
+
+# --- ADMIN: 3.3 UPLOAD ERROR REPORT (CSV) ---
+@app.get("/admin/ingest/{job_id}/errors", dependencies=ADMIN_DOWNLOAD)
+def get_ingest_errors(job_id: int, db: Session = Depends(get_db)):
+    exists = db.query(func.count(models.IngestJob.id)).filter(models.IngestJob.id == job_id).scalar()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return StreamingResponse(
+        ingest.iter_error_report(job_id),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="upload_{job_id}_errors.csv"'}
+    )
+
+# --- ADMIN: 3.4 RESUME AN INTERRUPTED UPLOAD ---
+@app.post("/admin/ingest/{job_id}/resume", dependencies=ADMIN_ONLY)
+def resume_ingest_job(job_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    job = db.query(models.IngestJob).filter(models.IngestJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    try:
+        ingest.mark_resumable(db, job)
+    except ingest.IngestError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    # Continues after the last committed row
+    background_tasks.add_task(ingest.run_job, job.id, GENERAL_INSTRUCTION)
+    return {"message": "Upload resumed", **ingest.job_to_dict(job)}
+
+# --- ADMIN: 3.5 ROLL BACK AN UPLOAD ---
+@app.post("/admin/ingest/{job_id}/rollback", dependencies=ADMIN_ONLY)
+def rollback_ingest_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(models.IngestJob).filter(models.IngestJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    try:
+        removed = ingest.rollback_job(db, job)
+    except ingest.IngestError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"message": f"Removed {removed} questions", **ingest.job_to_dict(job)}
 
 # --- ADMIN: 3.1 ADD SINGLE QUESTION ---
 from pydantic import BaseModel
@@ -245,10 +362,12 @@ class SingleQuestionAdd(BaseModel):
     task_id: Optional[str] = None
     link: str
 
-@app.post("/admin/test/{test_id}/add-question")
+@app.post("/admin/test/{test_id}/add-question", dependencies=ADMIN_ONLY)
 def add_single_question(test_id: int, question_data: SingleQuestionAdd, db: Session = Depends(get_db)):
     # Check test exists with COUNT (faster than fetching object)
-    exists = db.query(func.count(models.Test.id)).filter(models.Test.id == test_id).scalar()
+    exists = db.query(func.count(models.Test.id)).filter(
+        models.Test.id == test_id, models.Test.deleted_at.is_(None)
+    ).scalar()
     if not exists:
         raise HTTPException(status_code=404, detail="Test not found")
     
@@ -262,77 +381,152 @@ def add_single_question(test_id: int, question_data: SingleQuestionAdd, db: Sess
         ideal_error=""
     )
     db.add(new_question)
+    resource_versions.bump(db, resource_versions.TESTS)
     db.commit()
+    question_cache.invalidate_test(test_id)
     return {"message": "Question added", "question_id": new_question.id}
 
 # --- ADMIN: 4. VIEW RESULTS ---
-@app.get("/admin/test/{test_id}/results")
-def get_test_results(test_id: int, db: Session = Depends(get_db)):
-    # Optimized JOIN query
-    results = db.query(
-        models.TestSession.id,
-        models.TestSession.is_completed,
-        models.TestSession.current_index,
-        models.User.username
-    ).join(
-        models.User, models.TestSession.user_id == models.User.id
-    ).filter(models.TestSession.test_id == test_id).all()
-    
-    return [
-        {
-            "id": r.id,
-            "username": r.username,
-            "is_completed": r.is_completed,
-            "current_index": r.current_index
-        }
-        for r in results
-    ]
+@app.get("/admin/test/{test_id}/results", dependencies=ADMIN_ONLY)
+def get_test_results(test_id: int, response: Response, cursor: Optional[str] = None, limit: Optional[int] = None,
+                     fields: Optional[str] = None, status: Optional[str] = None,
+                     username_prefix: Optional[str] = None, db: Session = Depends(get_read_db)):
+    columns = {
+        "id": models.TestSession.id,
+        "username": models.User.username,
+        "is_completed": models.TestSession.is_completed,
+        "current_index": models.TestSession.current_index,
+        "user_id": models.TestSession.user_id,
+        "score": models.SessionScore.avg_score,
+    }
+    try:
+        names = pagination.parse_fields(fields, columns, default=["id", "username", "is_completed", "current_index"])
+        query = db.query(*[columns[n].label(n) for n in names]).join(
+            models.User, models.TestSession.user_id == models.User.id
+        ).filter(models.TestSession.test_id == test_id)
+        if "score" in names:
+            query = query.outerjoin(models.SessionScore, models.SessionScore.session_id == models.TestSession.id)
+        if status:
+            if status not in ("completed", "in_progress"):
+                raise pagination.PaginationError("status must be 'completed' or 'in_progress'")
+            query = query.filter(models.TestSession.is_completed == (status == "completed"))
+        if username_prefix:
+            query = query.filter(models.User.username.like(pagination.prefix_pattern(username_prefix), escape="\\"))
+        results, next_cursor = pagination.keyset_page(query, models.TestSession.id, cursor, limit)
+    except pagination.PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return [r._asdict() for r in results]
 
 # --- ADMIN: CHECK IF USER IS ADMIN ---
 @app.get("/admin/check/{user_id}")
-def check_admin_status(user_id: int, db: Session = Depends(get_db)):
+def check_admin_status(user_id: int, user: auth.TokenClaims = Depends(auth.get_current_user),
+                       db: Session = Depends(get_db)):
+    # Own account: answered from the signed token claims, no DB query
+    if user.user_id == user_id:
+        return {"is_admin": user.is_admin, "username": user.username}
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Not your account")
     # Only select needed columns
-    user = db.query(models.User.is_admin, models.User.username).filter(models.User.id == user_id).first()
-    if not user:
+    target = db.query(models.User.is_admin, models.User.username).filter(models.User.id == user_id).first()
+    if not target:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"is_admin": user.is_admin, "username": user.username}
+    return {"is_admin": target.is_admin, "username": target.username}
 
 # --- ADMIN: 5. LIST ALL USERS ---
-@app.get("/admin/users")
-def get_all_users(db: Session = Depends(get_db)):
-    # Single optimized query with LEFT JOIN - now includes test info
-    results = db.query(
-        models.User.id,
-        models.User.username,
-        models.TestSession.id.label('session_id'),
-        models.TestSession.is_completed,
-        models.TestSession.test_id,
-        models.Test.title.label('test_title')
-    ).outerjoin(
-        models.TestSession, models.User.id == models.TestSession.user_id
-    ).outerjoin(
-        models.Test, models.TestSession.test_id == models.Test.id
-    ).filter(
-        models.User.is_active == True,
-        models.User.is_admin == False
-    ).all()
-    
-    return [
-        {
-            "id": r.id,
-            "username": r.username,
-            "status": "Completed" if r.is_completed else ("In Progress" if r.session_id else "Not Started"),
-            "session_id": r.session_id,
-            "test_id": r.test_id,
-            "test_title": r.test_title
-        }
-        for r in results
-    ]
+USER_STATUSES = {"completed": "Completed", "in_progress": "In Progress", "not_started": "Not Started"}
+
+def _user_list_filters(test_id: Optional[int], status: Optional[str], username_prefix: Optional[str]):
+    """(user filters, session join condition) shared by the user list and its summary."""
+    if status and status not in USER_STATUSES:
+        raise pagination.PaginationError(f"status must be one of: {', '.join(USER_STATUSES)}")
+
+    session_match = [models.TestSession.user_id == models.User.id]
+    if test_id is not None:
+        session_match.append(models.TestSession.test_id == test_id)
+    if status in ("completed", "in_progress"):
+        session_match.append(models.TestSession.is_completed == (status == "completed"))
+    # Correlate on users only: the outer query may also join test_sessions
+    has_session = select(models.TestSession.id).where(*session_match).correlate(models.User).exists()
+
+    user_filters = [models.User.is_active == True, models.User.is_admin == False]
+    if username_prefix:
+        user_filters.append(models.User.username.like(pagination.prefix_pattern(username_prefix), escape="\\"))
+    if status == "not_started":
+        user_filters.append(~has_session)
+    elif status or test_id is not None:
+        user_filters.append(has_session)
+    return user_filters, and_(*session_match)
+
+@app.get("/admin/users", dependencies=ADMIN_ONLY)
+def get_all_users(response: Response, cursor: Optional[str] = None, limit: Optional[int] = None,
+                  fields: Optional[str] = None, test_id: Optional[int] = None, status: Optional[str] = None,
+                  username_prefix: Optional[str] = None, db: Session = Depends(get_read_db)):
+    columns = {
+        "id": models.User.id,
+        "username": models.User.username,
+        "status": case(
+            (models.TestSession.is_completed == True, "Completed"),
+            (models.TestSession.id.isnot(None), "In Progress"),
+            else_="Not Started"
+        ),
+        "session_id": models.TestSession.id,
+        "test_id": models.TestSession.test_id,
+        "test_title": models.Test.title,
+    }
+    try:
+        names = pagination.parse_fields(fields, columns, default=list(columns))
+        user_filters, session_join = _user_list_filters(test_id, status, username_prefix)
+        # Page over users (keyset on the PK), then fan out only that page's sessions
+        users, next_cursor = pagination.keyset_page(
+            db.query(models.User.id).filter(*user_filters), models.User.id, cursor, limit
+        )
+    except pagination.PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    if not users:
+        return []
+
+    query = db.query(*[columns[n].label(n) for n in names]).select_from(models.User).outerjoin(
+        models.TestSession, session_join
+    )
+    if "test_title" in names:
+        query = query.outerjoin(models.Test, models.TestSession.test_id == models.Test.id)
+    results = query.filter(
+        models.User.id.in_([u.id for u in users])
+    ).order_by(models.User.id, models.TestSession.id).all()
+    return [r._asdict() for r in results]
+
+# --- ADMIN: 5.1 USER STATUS COUNTS (same filters as the list) ---
+@app.get("/admin/users/summary", dependencies=ADMIN_ONLY)
+def get_users_summary(test_id: Optional[int] = None, username_prefix: Optional[str] = None,
+                      db: Session = Depends(get_read_db)):
+    try:
+        user_filters, session_join = _user_list_filters(test_id, None, username_prefix)
+    except pagination.PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # One aggregate over the same user x session rows the list returns
+    completed, in_progress, not_started = db.query(
+        func.count(case((models.TestSession.is_completed == True, 1))),
+        func.count(case((and_(models.TestSession.id.isnot(None), models.TestSession.is_completed == False), 1))),
+        func.count(case((models.TestSession.id.is_(None), 1))),
+    ).select_from(models.User).outerjoin(models.TestSession, session_join).filter(*user_filters).one()
+    return {
+        "total": completed + in_progress + not_started,
+        "completed": completed,
+        "in_progress": in_progress,
+        "not_started": not_started,
+    }
 
 
 # --- ADMIN: 6. GET SPECIFIC USER REPORT ---
-@app.get("/admin/report/{session_id}")
-def get_user_report(session_id: int, db: Session = Depends(get_db)):
+@app.get("/admin/report/{session_id}", dependencies=ADMIN_ONLY)
+def get_user_report(session_id: int, db: Session = Depends(get_read_db)):
     # Single query with JOIN to get session + user + responses + questions
     session_data = db.query(
         models.TestSession.id,
@@ -379,107 +573,325 @@ def get_user_report(session_id: int, db: Session = Depends(get_db)):
         ]
     }
 
-# --- ADMIN: 7. TRIGGER AI EVALUATION (BACKGROUND TASK) ---
+# --- ADMIN: 7. TRIGGER AI EVALUATION (DURABLE JOB QUEUE) ---
 try:
-    from .ai_agent import evaluate_single_answer
+    from .evaluation import EvaluationEngine
 except ImportError:
-    from ai_agent import evaluate_single_answer
+    from evaluation import EvaluationEngine
 
 def run_evaluation_loop(session_id: int):
+    # Bounded-parallel grading with micro-batched commits (see evaluation.py)
+    EvaluationEngine().evaluate_session(session_id)
+
+@app.post("/admin/evaluate/{session_id}", dependencies=ADMIN_ONLY)
+def start_evaluation(session_id: int, db: Session = Depends(get_db)):
+    exists = db.query(func.count(models.TestSession.id)).filter(models.TestSession.id == session_id).scalar()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # Durable job picked up by a worker; duplicate clicks return the open job
+    job, created = job_queue.enqueue_evaluation(db, session_id)
+    return {
+        "message": "Evaluation queued" if created else "Evaluation already in progress",
+        **job_queue.job_to_dict(job)
+    }
+
+# --- ADMIN: 7.1 EVALUATION JOB PROGRESS ---
+@app.get("/admin/evaluate/{job_id}", dependencies=ADMIN_ONLY)
+def get_evaluation_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(models.EvaluationJob).filter(models.EvaluationJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Evaluation job not found")
+    return job_queue.job_to_dict(job)
+
+# --- ADMIN: 7.2 BATCH-EVALUATE A WHOLE TEST ---
+@app.post("/admin/test/{test_id}/evaluate", dependencies=ADMIN_ONLY)
+def start_test_evaluation(test_id: int, db: Session = Depends(get_db)):
+    exists = db.query(func.count(models.Test.id)).filter(
+        models.Test.id == test_id, models.Test.deleted_at.is_(None)
+    ).scalar()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    # Grades every ungraded response, several answers per LLM request
+    job, created = job_queue.enqueue_test_evaluation(db, test_id)
+    return {
+        "message": "Evaluation queued" if created else "Evaluation already in progress",
+        **job_queue.job_to_dict(job)
+    }
+
+# --- ADMIN: 7.3 EVALUATION CACHE STATS ---
+@app.get("/admin/evaluation/cache-stats", dependencies=ADMIN_ONLY)
+def get_evaluation_cache_stats(db: Session = Depends(get_read_db)):
+    return eval_cache.summary(db)
+
+# --- ADMIN: 7.4 LEADERBOARD (incrementally maintained session scores) ---
+@app.get("/admin/test/{test_id}/leaderboard", dependencies=ADMIN_ONLY)
+def get_leaderboard(test_id: int, response: Response, cursor: Optional[str] = None, limit: Optional[int] = None,
+                    db: Session = Depends(get_read_db)):
+    query = db.query(
+        models.SessionScore.session_id,
+        models.SessionScore.avg_score,
+        models.SessionScore.total_score,
+        models.SessionScore.graded_count,
+        models.SessionScore.status_match_count,
+        models.TestSession.user_id,
+        models.TestSession.current_index,
+        models.TestSession.is_completed,
+        models.User.username
+    ).join(
+        models.TestSession, models.SessionScore.session_id == models.TestSession.id
+    ).join(
+        models.User, models.TestSession.user_id == models.User.id
+    ).filter(models.SessionScore.test_id == test_id)
     try:
-        from .database import SessionLocal
-    except ImportError:
-        from database import SessionLocal
-    db = SessionLocal()
+        # Best average first; keyset on (avg_score DESC, session_id)
+        rows, next_cursor = pagination.ranked_page(
+            query, models.SessionScore.avg_score, models.SessionScore.session_id, cursor, limit
+        )
+    except pagination.PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return [score_stats.session_score_to_dict(r) for r in rows]
+
+# --- ADMIN: 7.5 QUESTION DIFFICULTY ---
+@app.get("/admin/test/{test_id}/question-stats", dependencies=ADMIN_ONLY)
+def get_question_stats(test_id: int, response: Response, cursor: Optional[str] = None, limit: Optional[int] = None,
+                       order: str = "hardest", db: Session = Depends(get_read_db)):
+    if order not in ("hardest", "easiest"):
+        raise HTTPException(status_code=400, detail="order must be 'hardest' or 'easiest'")
+
+    query = db.query(
+        models.QuestionStat.question_id,
+        models.QuestionStat.avg_score,
+        models.QuestionStat.total_score,
+        models.QuestionStat.graded_count,
+        models.QuestionStat.status_match_count,
+        models.Question.task_id,
+        models.Question.link
+    ).join(
+        models.Question, models.QuestionStat.question_id == models.Question.id
+    ).filter(models.QuestionStat.test_id == test_id)
     try:
-        # Optimized: Single query with JOIN (fixed N+1)
-        responses = db.query(
-            models.UserResponse,
-            models.Question
-        ).join(
-            models.Question, models.UserResponse.question_id == models.Question.id
-        ).filter(models.UserResponse.session_id == session_id).all()
-        
-        for resp, question in responses:
-            score, feedback = evaluate_single_answer(resp, question)
-            resp.ai_score = score
-            resp.ai_feedback = feedback
-        
-        db.commit()
-    finally:
-        db.close()
+        # Lowest average first for "hardest"; keyset on (avg_score, question_id)
+        rows, next_cursor = pagination.ranked_page(
+            query, models.QuestionStat.avg_score, models.QuestionStat.question_id, cursor, limit,
+            descending=(order == "easiest")
+        )
+    except pagination.PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return [score_stats.question_stat_to_dict(r) for r in rows]
+
+# --- ADMIN: 7.6 REBUILD SCORE STATS (repair) ---
+@app.post("/admin/test/{test_id}/stats/rebuild", dependencies=ADMIN_ONLY)
+def rebuild_score_stats(test_id: int, db: Session = Depends(get_db)):
+    exists = db.query(func.count(models.Test.id)).filter(
+        models.Test.id == test_id, models.Test.deleted_at.is_(None)
+    ).scalar()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Test not found")
+    counts = score_stats.rebuild_test(db, test_id)
+    db.commit()
+    return {"message": "Score stats rebuilt", **counts}
+
+# --- ADMIN: 7.7 EXPORT RESULTS (streamed) ---
+@app.get("/admin/test/{test_id}/export", dependencies=ADMIN_DOWNLOAD)
+def export_test_results(test_id: int, format: str = "csv", db: Session = Depends(get_read_db)):
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(export.FORMATS)}")
+    exists = db.query(func.count(models.Test.id)).filter(
+        models.Test.id == test_id, models.Test.deleted_at.is_(None)
+    ).scalar()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    media_type, extension = export.FORMATS[format]
+    return StreamingResponse(
+        export.iter_export(test_id, format, session_factory=ReadSessionLocal),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="test_{test_id}_results.{extension}"'}
+    )
 
-@app.post("/admin/evaluate/{session_id}")
-def start_evaluation(session_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    background_tasks.add_task(run_evaluation_loop, session_id)
-    return {"message": "Evaluation started. Refresh page in a few moments."}
+# --- ADMIN: 7.8 EVALUATION TELEMETRY (latency, tokens, cost, error rate) ---
+@app.get("/admin/test/{test_id}/evaluation-stats", dependencies=ADMIN_ONLY)
+def get_test_evaluation_stats(test_id: int, db: Session = Depends(get_read_db)):
+    exists = db.query(func.count(models.Test.id)).filter(
+        models.Test.id == test_id, models.Test.deleted_at.is_(None)
+    ).scalar()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Test not found")
+    return {"test_id": test_id, **eval_telemetry.summary(db, test_id=test_id)}
+
+# --- ADMIN: 7.9 SESSION EVALUATION TELEMETRY ---
+@app.get("/admin/session/{session_id}/evaluation-stats", dependencies=ADMIN_ONLY)
+def get_session_evaluation_stats(session_id: int, db: Session = Depends(get_read_db)):
+    exists = db.query(func.count(models.TestSession.id)).filter(models.TestSession.id == session_id).scalar()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"session_id": session_id, **eval_telemetry.summary(db, session_id=session_id)}
+
+# --- ADMIN: 7.10 EVALUATION TELEMETRY ACROSS TESTS (recent window) ---
+@app.get("/admin/evaluation/stats", dependencies=ADMIN_ONLY)
+def get_evaluation_stats(since_hours: float = 24, db: Session = Depends(get_read_db)):
+    if since_hours <= 0:
+        raise HTTPException(status_code=400, detail="since_hours must be positive")
+    since = datetime.now(timezone.utc) - timedelta(hours=since_hours)
+    return {"since_hours": since_hours, **eval_telemetry.summary(db, since=since)}
+
+# --- ADMIN: 8. QUESTION CACHE / SHARED CACHE STATS ---
+@app.get("/admin/cache/stats", dependencies=ADMIN_ONLY)
+def get_cache_stats():
+    return {**question_cache.stats(), "shared": shared_cache.cache.stats()}
+
+# --- ADMIN: 9. DATABASE POOL / REPLICA STATS ---
+@app.get("/admin/db/stats", dependencies=ADMIN_ONLY)
+def get_db_stats():
+    return pool_stats()
+
+# --- ADMIN: 10. PROMETHEUS METRICS (admin login or METRICS_TOKEN) ---
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False,
+         dependencies=[Depends(auth.require_admin_or_key(metrics.METRICS_TOKEN))])
+def get_metrics():
+    return PlainTextResponse(metrics.render(pool_stats()), media_type=metrics.CONTENT_TYPE)
 
 # ============== SESSION/TIMER ENDPOINTS ============== #
 
 # --- SESSION INFO (For Timer Sync) ---
 @app.get("/session/{session_id}/info")
-def get_session_info(session_id: int, db: Session = Depends(get_db)):
-    # Single query with JOIN (was 2 queries)
-    result = db.query(
+def get_session_info(session_id: int, request: Request, response: Response,
+                     user: auth.TokenClaims = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    # Session row only (needed for the owner check); it is also the version
+    result = db.query(*session_flow.INFO_COLUMNS).filter(models.TestSession.id == session_id).first()
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="Session not found")
+    auth.ensure_owner(user, result.user_id)
+    
+    cached = resource_versions.check(request, response, session_flow.info_tag(result))
+    if cached:
+        return cached
+    
+    test = session_flow.test_meta(db, result.test_id)
+    return session_flow.session_info(result, test["duration_minutes"] if test else None)
+
+# --- SESSION EVENTS (Server-Sent Events: deadline + progress pushes, replaces timer polling) ---
+def _session_snapshot(db: Session, session_id: int, user: auth.TokenClaims) -> dict:
+    session = db.query(
         models.TestSession.id,
+        models.TestSession.user_id,
         models.TestSession.start_time,
+        models.TestSession.expires_at,
+        models.TestSession.current_index,
         models.TestSession.is_completed,
-        models.Test.duration_minutes
-    ).join(
-        models.Test, models.TestSession.test_id == models.Test.id
+        models.TestSession.question_set_id,
+        models.TestSession.question_order
     ).filter(models.TestSession.id == session_id).first()
-    
-    if not result:
+    if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    return {
-        "session_id": result.id,
-        "start_time": result.start_time.isoformat() if result.start_time else None,
-        "duration_minutes": result.duration_minutes or 360,
-        "is_completed": result.is_completed
-    }
+    auth.ensure_owner(user, session.user_id)
+    return session_events.session_event(
+        session.id, session.start_time, session.expires_at, session.current_index,
+        question_order.total_questions(db, session),
+        session.is_completed or session_events.is_expired(session.expires_at)
+    )
+
+def _session_snapshot_once(session_id: int, user: auth.TokenClaims) -> dict:
+    db = SessionLocal()
+    try:
+        return _session_snapshot(db, session_id, user)
+    finally:
+        db.close()
+
+@app.get("/session/{session_id}/events")
+async def session_event_stream(session_id: int,
+                               user: auth.TokenClaims = Depends(auth.get_current_user_from_query)):  # EventSource: no headers
+    # Own short-lived session: the stream itself never queries, so no connection is held while it runs
+    snapshot = await run_in_threadpool(_session_snapshot_once, session_id, user)
+    return StreamingResponse(
+        session_events.stream(snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ============== USER ENDPOINTS ============== #
 
 # --- 1. AUTHENTICATION (Email + Password) ---
-@app.post("/login", response_model=schemas.Token)
-def login(request: schemas.LoginRequest, db: Session = Depends(get_db)):
+def _find_login_user(db: Session, username: str):
     # Only select needed columns
-    user = db.query(
+    return db.query(
         models.User.id,
         models.User.username,
         models.User.password_hash,
         models.User.is_active,
         models.User.is_admin
-    ).filter(models.User.username == request.username).first()
+    ).filter(models.User.username == username).first()
+
+def _store_password_hash(db: Session, user_id: int, password_hash: str):
+    db.query(models.User).filter(models.User.id == user_id).update({"password_hash": password_hash})
+    db.commit()
+
+@app.post("/login", response_model=schemas.Token)
+async def login(request: schemas.LoginRequest, db: Session = Depends(get_db)):
+    # DB work runs in the threadpool; bcrypt runs in the password process pool
+    user = await run_in_threadpool(_find_login_user, db, request.username)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Secure password verification with bcrypt
-    if not verify_password(request.password, user.password_hash):
+    # Secure password verification with bcrypt (fast 503 when the pool is saturated)
+    try:
+        valid, new_hash = await password_utils.pool.verify(request.password, user.password_hash)
+    except password_utils.PasswordPoolSaturated:
+        raise HTTPException(status_code=503, detail="Too many logins in progress, please retry",
+                            headers={"Retry-After": "1"})
+    if not valid:
         raise HTTPException(status_code=401, detail="Incorrect password")
     
     if not user.is_active:
         raise HTTPException(status_code=400, detail="User is inactive")
+
+    # Transparent upgrade to the configured cost factor
+    if new_hash:
+        await run_in_threadpool(_store_password_hash, db, user.id, new_hash)
     
     return {
-        "access_token": str(user.id),
+        "access_token": auth.issue_token(user.id, user.username, user.is_admin),
         "token_type": "bearer",
         "user_id": user.id,
         "username": user.username,
         "is_admin": user.is_admin  # Issue #12 fix: Return is_admin
     }
 
+# --- 1.1 LOGOUT (revoke the presented token) ---
+@app.post("/logout")
+def logout(user: auth.TokenClaims = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    auth.revocations.revoke(db, user)
+    auth.revocations.purge_expired(db)
+    db.commit()
+    return {"message": "Logged out"}
+
 # --- 2. START TEST (Shuffling Logic) ---
 @app.post("/start-test/{test_id}/{user_id}", response_model=schemas.SessionInfo)
-def start_test(test_id: int, user_id: int, db: Session = Depends(get_db)):
+def start_test(test_id: int, user_id: int, user: auth.TokenClaims = Depends(auth.get_current_user),
+               db: Session = Depends(get_db)):
+    auth.ensure_owner(user, user_id)
+    # Deleted tests are gone for candidates too (their rows are purged in the background).
+    # Read from the DB, not the cache: another worker's cached flag may predate the delete
+    test = session_flow.load_test_meta(db, test_id)
+    if not test or test["deleted"]:
+        raise HTTPException(status_code=404, detail="Test not found")
+
     # Check for existing session first
     session = db.query(
         models.TestSession.id,
         models.TestSession.current_index,
         models.TestSession.is_completed,
+        models.TestSession.question_set_id,
         models.TestSession.question_order
     ).filter(
         models.TestSession.user_id == user_id,
@@ -490,93 +902,73 @@ def start_test(test_id: int, user_id: int, db: Session = Depends(get_db)):
         return {
             "session_id": session.id,
             "current_index": session.current_index,
-            "total_questions": len(session.question_order) if session.question_order else 0,
+            "total_questions": question_order.total_questions(db, session),
             "is_completed": session.is_completed
         }
 
-    # Get question IDs only (faster)
-    q_ids = db.query(models.Question.id).filter(models.Question.test_id == test_id).all()
-    if not q_ids:
+    # Shared snapshot of the question bank + a per-session seed (no per-session id list)
+    snapshot = question_order.snapshot_for_test(db, test_id)
+    if not snapshot:
         raise HTTPException(status_code=404, detail="Test has no questions")
     
-    q_ids = [q.id for q in q_ids]
-    random.shuffle(q_ids)
-    
+    # Deadline stored once so expiry is a plain indexed comparison
+    start_time, expires_at = session_events.session_window(test["duration_minutes"])
     new_session = models.TestSession(
         user_id=user_id,
         test_id=test_id,
-        question_order=q_ids,
-        current_index=0
+        question_set_id=snapshot.id,
+        order_seed=question_order.new_seed(),
+        current_index=0,
+        start_time=start_time,
+        expires_at=expires_at
     )
     db.add(new_session)
     db.commit()
-    db.refresh(new_session)
 
     return {
         "session_id": new_session.id,
         "current_index": 0,
-        "total_questions": len(q_ids),
+        "total_questions": snapshot.size,
         "is_completed": False
     }
 
 # --- 3. GET CURRENT QUESTION (Blocking Logic) ---
 @app.get("/session/{session_id}/question", response_model=schemas.QuestionOut)
-def get_current_question(session_id: int, db: Session = Depends(get_db)):
+def get_current_question(session_id: int, request: Request, response: Response,
+                         user: auth.TokenClaims = Depends(auth.get_current_user), db: Session = Depends(get_db)):
     # Get session with minimal data
-    session = db.query(
-        models.TestSession.id,
-        models.TestSession.is_completed,
-        models.TestSession.current_index,
-        models.TestSession.question_order
-    ).filter(models.TestSession.id == session_id).first()
+    session = db.query(*session_flow.QUESTION_COLUMNS).filter(models.TestSession.id == session_id).first()
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    auth.ensure_owner(user, session.user_id)
+    session_flow.ensure_open(db, session)
+    session = session_flow.skip_deleted(db, session)
     
-    if session.is_completed:
-        raise HTTPException(status_code=400, detail="Test is already completed")
+    # Client already shows this question: 304 before resolving it
+    cached = resource_versions.check(request, response, session_flow.question_tag(session))
+    if cached:
+        return cached
     
-    try:
-        current_q_id = session.question_order[session.current_index]
-    except (IndexError, TypeError):
-        # Mark as completed
-        db.query(models.TestSession).filter(models.TestSession.id == session_id).update({"is_completed": True})
-        db.commit()
-        raise HTTPException(status_code=200, detail="Test Completed")
-
-    # Get question with only needed fields
-    question = db.query(models.Question).filter(models.Question.id == current_q_id).first()
-    return question
+    return session_flow.current_question(db, session)
 
 # --- 4. SUBMIT ANSWER (State Update) ---
 @app.post("/session/{session_id}/submit")
-def submit_answer(session_id: int, answer: schemas.AnswerSubmit, db: Session = Depends(get_db)):
-    # Get session
-    session = db.query(models.TestSession).filter(models.TestSession.id == session_id).first()
-    
-    if not session or session.is_completed:
-        raise HTTPException(status_code=400, detail="Invalid session")
-
-    expected_q_id = session.question_order[session.current_index]
-    
-    if answer.question_id != expected_q_id:
-        raise HTTPException(status_code=400, detail="Sync Error. You are answering the wrong question.")
-
-    # Save answer
-    new_response = models.UserResponse(
-        session_id=session.id,
-        question_id=answer.question_id,
-        status=answer.status,
-        explanation=answer.explanation,
-        critical_error=answer.critical_error
-    )
-    db.add(new_response)
-    
-    # Move forward
-    session.current_index += 1
-    
-    if session.current_index >= len(session.question_order):
-        session.is_completed = True
-    
-    db.commit()
-    return {"message": "Answer saved", "next_index": session.current_index}
+def submit_answer(session_id: int, answer: schemas.AnswerSubmit,
+                  user: auth.TokenClaims = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    result = sqlite_writer.execute_write(db, session_flow.submit, session_id, answer, user)
+    session_flow.publish_progress(result)
+    return {"message": "Answer saved", "next_index": result["next_index"]}
+
+# --- 5. SUBMIT AND FETCH NEXT (one round trip per question) ---
+@app.post("/session/{session_id}/submit-next", response_model=schemas.SubmitNextOut)
+def submit_and_next(session_id: int, answer: schemas.AnswerSubmit,
+                    user: auth.TokenClaims = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    result = sqlite_writer.execute_write(db, session_flow.submit, session_id, answer, user, True)
+    session_flow.publish_progress(result)
+    return {
+        "message": "Answer saved",
+        "next_index": result["next_index"],
+        "is_completed": result["is_completed"],
+        "question": result["question"]
+    }
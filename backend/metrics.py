@@ -0,0 +1,297 @@
+"""
+Per-request instrumentation exposed in Prometheus text format at /metrics.
+A pure-ASGI middleware times every request per route template (histogram,
+counter by status, in-flight gauge). SQLAlchemy cursor hooks attribute
+query count and DB time to the request that ran them through a context
+variable (it follows the request into threadpool threads and async-engine
+greenlets), and pool checkouts plus waits for a DB session slot are timed
+as pool wait. Requests slower than METRICS_SLOW_REQUEST_MS are logged with
+the SQL they ran. Counters live in this process; with several workers each
+one is scraped (or summed) separately.
+"""
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")                                # Scraper bearer token (else admin login)
+METRICS_SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_REQUEST_MS", "0"))     # 0 = slow-request log off
+METRICS_SLOW_SQL_LIMIT = int(os.getenv("METRICS_SLOW_SQL_LIMIT", "20"))        # Statements kept per slow request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels) -> None:
+        self.inc(*labels, amount=-1)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float) -> None:
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # Per-bucket counts (made cumulative on render), then sum and count
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self.header()
+        for labels, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {round(counts[-1], 6)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+# --- Registry ---
+REQUESTS = Counter("http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled.", ("method", "route"))
+REQUEST_QUERIES = Histogram("http_request_db_queries", "SQL statements per HTTP request.", ("method", "route"),
+                            buckets=QUERY_COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent executing SQL per HTTP request.",
+                               ("method", "route"))
+REQUEST_POOL_WAIT = Histogram("http_request_db_pool_wait_seconds",
+                              "Time waiting for a DB session slot or pool connection per HTTP request.",
+                              ("method", "route"))
+QUERIES = Counter("db_queries_total", "SQL statements executed (all callers).", ("engine",))
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQL statement latency (all callers).", ("engine",))
+POOL_CHECKOUT = Histogram("db_pool_checkout_seconds", "Time to get a connection from the pool.", ("engine",))
+SLOW_REQUESTS = Counter("http_slow_requests_total", "Requests over METRICS_SLOW_REQUEST_MS.", ("method", "route"))
+
+REGISTRY = (REQUESTS, REQUEST_SECONDS, IN_FLIGHT, REQUEST_QUERIES, REQUEST_DB_SECONDS, REQUEST_POOL_WAIT,
+            QUERIES, QUERY_SECONDS, POOL_CHECKOUT, SLOW_REQUESTS)
+
+
+class RequestStats:
+    """DB work attributed to one request."""
+    __slots__ = ("queries", "db_seconds", "pool_wait", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait = 0.0
+        self.statements: Optional[List[Tuple[float, str]]] = [] if METRICS_SLOW_REQUEST_MS else None
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_metrics", default=None)
+
+
+def record_pool_wait(seconds: float) -> None:
+    """Add waiting time for a DB connection to the current request."""
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait += seconds
+
+
+# --- SQLAlchemy hooks ---
+def instrument_engine(engine, name: str) -> None:
+    """Time every statement and pool checkout of `engine` (a sync Engine or AsyncEngine.sync_engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        QUERIES.inc(name)
+        QUERY_SECONDS.observe(name, value=elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+            if stats.statements is not None and len(stats.statements) < METRICS_SLOW_SQL_LIMIT:
+                stats.statements.append((elapsed, statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        # Keep the timing stack balanced when a statement fails
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("metrics_started"):
+            conn.info["metrics_started"].pop()
+
+    _time_pool(engine, name)
+    # engine.dispose() swaps in a fresh pool
+    event.listen(engine, "engine_disposed", lambda e: _time_pool(e, name))
+
+
+def _time_pool(engine, name: str) -> None:
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            elapsed = time.perf_counter() - started
+            POOL_CHECKOUT.observe(name, value=elapsed)
+            record_pool_wait(elapsed)
+
+    pool.connect = timed_connect
+
+
+# --- ASGI middleware ---
+def route_template(routes, scope) -> Optional[str]:
+    """Path template of the route that will handle `scope` (e.g. /session/{session_id}/question)."""
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            included = getattr(route, "original_router", None)
+            if included is not None:
+                return route_template(included.routes, scope)
+            return getattr(route, "path", None)
+    return None
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        # Unknown paths share one label so scanners can't blow up the series count
+        route = route_template(scope["app"].router.routes, scope) or "unmatched"
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        IN_FLIGHT.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            IN_FLIGHT.dec(method, route)
+            REQUESTS.inc(method, route, str(status))
+            REQUEST_SECONDS.observe(method, route, value=elapsed)
+            REQUEST_QUERIES.observe(method, route, value=stats.queries)
+            REQUEST_DB_SECONDS.observe(method, route, value=stats.db_seconds)
+            REQUEST_POOL_WAIT.observe(method, route, value=stats.pool_wait)
+            if METRICS_SLOW_REQUEST_MS and elapsed * 1000 >= METRICS_SLOW_REQUEST_MS:
+                SLOW_REQUESTS.inc(method, route)
+                log_slow_request(method, scope["path"], status, elapsed, stats)
+
+
+def log_slow_request(method: str, path: str, status: int, elapsed: float, stats: RequestStats) -> None:
+    lines = [f"[SLOW] {method} {path} -> {status} in {elapsed * 1000:.0f} ms "
+             f"({stats.queries} queries, {stats.db_seconds * 1000:.0f} ms SQL, "
+             f"{stats.pool_wait * 1000:.0f} ms pool wait)"]
+    for seconds, statement in stats.statements or ():
+        lines.append(f"    {seconds * 1000:7.1f} ms  {' '.join(statement.split())[:500]}")
+    if stats.queries > len(stats.statements or ()):
+        lines.append(f"    ... {stats.queries - len(stats.statements)} more")
+    print("\n".join(lines))
+
+
+# --- Exposition ---
+def render(pool_stats: dict = None) -> str:
+    """All metrics in Prometheus text format, plus pool gauges from database.pool_stats()."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    if pool_stats:
+        lines.extend(_pool_lines(pool_stats))
+    return "\n".join(lines) + "\n"
+
+
+def _pool_lines(pool_stats: dict) -> List[str]:
+    gauges = {
+        "checked_out": "db_pool_checked_out",
+        "checked_in": "db_pool_checked_in",
+        "overflow": "db_pool_overflow",
+        "capacity": "db_pool_capacity",
+    }
+    lines = []
+    for key, name in gauges.items():
+        lines += [f"# HELP {name} Connection pool {key.replace('_', ' ')}.", f"# TYPE {name} gauge"]
+        for engine_name in ("primary", "replica"):
+            stats = pool_stats.get(engine_name)
+            if stats and key in stats:
+                lines.append(f'{name}{{engine="{engine_name}"}} {stats[key]}')
+    routing = pool_stats.get("routing") or {}
+    if routing.get("configured"):
+        lines += ["# HELP db_replica_lag_seconds Measured read-replica lag (-1 = unreachable).",
+                  "# TYPE db_replica_lag_seconds gauge",
+                  f"db_replica_lag_seconds {routing['lag_seconds'] if routing['lag_seconds'] is not None else -1}"]
+    return lines
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Move legacy sessions (full question_order JSON list) onto question-set snapshots.
+Each session keeps exactly the order it already has. Safe to re-run.
+Run: python backend/migrate_question_orders.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database import SessionLocal, engine
+from backend import models
+from backend.migrations import upgrade_schema
+from backend.question_order import migrate_legacy_sessions
+
+# Make sure the snapshot columns exist
+upgrade_schema(engine)
+
+
+def main():
+    db = SessionLocal()
+    try:
+        print("--- Migrating legacy question orders ---")
+        migrated = migrate_legacy_sessions(db)
+        print(f"Migrated sessions: {migrated}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
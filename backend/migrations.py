@@ -0,0 +1,38 @@
+"""
+Lightweight, additive schema upgrades.
+create_all() only creates missing tables, so columns and indexes added to
+existing models are applied here on startup. Only additive changes are
+supported: new nullable columns and new indexes.
+"""
+from sqlalchemy import inspect, text
+
+# Handle imports for both local development and deployment
+try:
+    from .database import Base
+except ImportError:
+    from database import Base
+
+
+def upgrade_schema(engine) -> None:
+    """Create missing tables, then add missing columns and indexes to existing ones."""
+    Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} {column_type}"
+                ))
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_indexes = {i["name"] for i in inspect(conn).get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn, checkfirst=True)
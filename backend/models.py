@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, JSON, Index
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, DateTime, Float, Text, JSON, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -26,6 +26,7 @@ class Test(Base):
     duration_minutes = Column(Integer, default=360)
     is_active = Column(Boolean, default=False, index=True)  # Indexed for active test lookup
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # Soft-deleted: hidden now, rows purged by a PurgeJob
     
     questions = relationship("Question", back_populates="test", lazy="dynamic")
 
@@ -43,9 +44,33 @@ class Question(Base):
     ideal_status = Column(String, nullable=True)
     ideal_explanation = Column(Text, nullable=True)
     ideal_error = Column(Text, nullable=True)
+
+    # Upload that created the question (lets a partial upload be rolled back)
+    ingest_job_id = Column(Integer, ForeignKey("ingest_jobs.id"), nullable=True, index=True)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # Soft-deleted: out of new sessions, purged in the background
     
     test = relationship("Test", back_populates="questions")
 
+    __table_args__ = (
+        # Keyset pagination of a test's questions
+        Index('ix_question_test_id_id', 'test_id', 'id'),
+    )
+
+# 3.1 Question-Set Snapshot (versioned, shared by sessions started on the same bank)
+class QuestionSet(Base):
+    __tablename__ = "question_sets"
+    id = Column(Integer, primary_key=True, index=True)
+    test_id = Column(Integer, ForeignKey("tests.id"), index=True)  # Indexed FK
+    version = Column(Integer, default=1)
+    digest = Column(String(64))  # sha256 of question_ids, for reuse
+    question_ids = Column(JSON)
+    size = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('ux_question_set_test_digest', 'test_id', 'digest', unique=True),
+    )
+
 # 4. User Session
 class TestSession(Base):
     __tablename__ = "test_sessions"
@@ -53,14 +78,21 @@ class TestSession(Base):
     user_id = Column(Integer, ForeignKey("users.id"), index=True)  # Indexed FK
     test_id = Column(Integer, ForeignKey("tests.id"), index=True)  # Indexed FK
     
-    question_order = Column(JSON, default=[])
+    # Order = permutation(order_seed) over a shared question-set snapshot.
+    # question_order is only kept for legacy sessions not yet migrated.
+    question_order = Column(JSON, nullable=True)
+    question_set_id = Column(Integer, ForeignKey("question_sets.id"), nullable=True, index=True)
+    order_seed = Column(BigInteger, nullable=True)  # NULL = snapshot order as stored
     current_index = Column(Integer, default=0)
     is_completed = Column(Boolean, default=False, index=True)  # Indexed for completion filters
     start_time = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=True)  # start_time + test duration; enforced by the sweeper
     
     # Composite index for common query pattern
     __table_args__ = (
         Index('ix_session_user_test', 'user_id', 'test_id'),
+        Index('ix_session_test_id_id', 'test_id', 'id'),  # Keyset pagination of test results
+        Index('ix_session_open_expiry', 'is_completed', 'expires_at'),  # Expiry sweep
     )
 
 # 5. User Responses
@@ -82,3 +114,172 @@ class UserResponse(Base):
     __table_args__ = (
         Index('ix_response_session_question', 'session_id', 'question_id'),
     )
+
+# 6. Evaluation Jobs (durable queue for AI grading)
+class EvaluationJob(Base):
+    __tablename__ = "evaluation_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("test_sessions.id"), index=True)  # Set for single-session jobs
+    test_id = Column(Integer, ForeignKey("tests.id"), nullable=True, index=True)  # Set for test-wide batch jobs
+
+    status = Column(String, default="pending", index=True)  # pending / running / done / failed
+    attempts = Column(Integer, default=0)
+    total = Column(Integer, default=0)       # Responses to grade
+    completed = Column(Integer, default=0)   # Responses graded so far
+    error = Column(Text, nullable=True)
+    worker_id = Column(String, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Claim order: oldest pending job first
+        Index('ix_eval_job_status_id', 'status', 'id'),
+        # At most one open job per session (duplicate clicks reuse it)
+        Index('ux_eval_job_open_session', 'session_id', unique=True,
+              sqlite_where=text("status IN ('pending', 'running')"),
+              postgresql_where=text("status IN ('pending', 'running')")),
+        Index('ux_eval_job_open_test', 'test_id', unique=True,
+              sqlite_where=text("status IN ('pending', 'running')"),
+              postgresql_where=text("status IN ('pending', 'running')")),
+    )
+
+# 7. Evaluation Cache (content-addressed LLM grades)
+class EvaluationCacheEntry(Base):
+    __tablename__ = "evaluation_cache"
+    key = Column(String(64), primary_key=True)  # sha256 of ideal fields + normalized answer
+    score = Column(Integer)
+    feedback = Column(Text)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# 8. Question Upload Jobs (background ingest, resumable from the last committed chunk)
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    test_id = Column(Integer, ForeignKey("tests.id"), index=True)  # Indexed FK
+    filename = Column(String)
+    spool_path = Column(String, nullable=True)  # Spooled upload, removed once done / rolled back
+
+    status = Column(String, default="queued", index=True)  # queued / running / done / failed / rolled_back
+    rows_parsed = Column(Integer, default=0)    # Rows consumed from the file (resume point)
+    rows_inserted = Column(Integer, default=0)
+    rows_rejected = Column(Integer, default=0)
+    chunks = Column(JSON, nullable=True)        # Per-chunk rows and parse/insert timings
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+# 8.1 Rejected Upload Rows (per-row error report)
+class IngestRejectedRow(Base):
+    __tablename__ = "ingest_rejected_rows"
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("ingest_jobs.id"), index=True)  # Indexed FK
+    row = Column(Integer)  # Spreadsheet row number (header is row 1)
+    reason = Column(String)
+
+# 9. Per-Session Score Aggregates (updated incrementally as evaluations land)
+class SessionScore(Base):
+    __tablename__ = "session_scores"
+    session_id = Column(Integer, ForeignKey("test_sessions.id"), primary_key=True)
+    test_id = Column(Integer, ForeignKey("tests.id"), index=True)  # Indexed FK
+    graded_count = Column(Integer, default=0)        # Responses with an ai_score
+    total_score = Column(Integer, default=0)
+    avg_score = Column(Float, nullable=True)         # total_score / graded_count
+    status_match_count = Column(Integer, default=0)  # Graded responses whose status matched the ideal
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Leaderboard keyset: best average first, ties by session id
+        Index('ix_session_score_rank', 'test_id', avg_score.desc(), 'session_id'),
+    )
+
+# 9.1 Per-Question Score Aggregates (difficulty)
+class QuestionStat(Base):
+    __tablename__ = "question_stats"
+    question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True)
+    test_id = Column(Integer, ForeignKey("tests.id"), index=True)  # Indexed FK
+    graded_count = Column(Integer, default=0)
+    total_score = Column(Integer, default=0)
+    avg_score = Column(Float, nullable=True)
+    status_match_count = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Difficulty keyset: lowest average first, ties by question id
+        Index('ix_question_stat_difficulty', 'test_id', 'avg_score', 'question_id'),
+    )
+
+# 10. Revoked Access Tokens (logout; kept until the token would have expired anyway)
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    jti = Column(String(32), primary_key=True)  # Token id claim
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)  # Indexed FK
+    expires_at = Column(DateTime(timezone=True), index=True)  # Indexed for purging
+    revoked_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# 11. Resource Versions (ETag counters for read-mostly endpoints)
+class ResourceVersion(Base):
+    __tablename__ = "resource_versions"
+    key = Column(String, primary_key=True)  # e.g. "tests"
+    version = Column(BigInteger, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# 12. Evaluation Records (one row per graded response: model, tokens, latency, outcome)
+class EvaluationRecord(Base):
+    __tablename__ = "evaluation_records"
+    id = Column(Integer, primary_key=True, index=True)
+    response_id = Column(Integer, ForeignKey("user_responses.id"), index=True)  # Indexed FK
+    session_id = Column(Integer, ForeignKey("test_sessions.id"), index=True)  # Indexed FK
+    test_id = Column(Integer, ForeignKey("tests.id"))  # Covered by ix_eval_record_test_created
+    question_id = Column(Integer, ForeignKey("questions.id"), index=True)  # Indexed FK (question purge)
+    job_id = Column(Integer, ForeignKey("evaluation_jobs.id"), nullable=True, index=True)  # Null for inline runs
+
+    outcome = Column(String)                        # graded / pregraded / cached / error
+    error_type = Column(String, nullable=True)      # Exception class for errors (e.g. TransientEvaluationError)
+    error_message = Column(Text, nullable=True)
+    backend = Column(String)                        # openai / fake
+    model = Column(String, nullable=True)           # As reported by the API; null when no LLM call was made
+    attempts = Column(Integer, default=0)           # LLM requests made (retries included)
+    latency_ms = Column(Float, default=0)           # Time spent in LLM requests (backoff sleeps excluded)
+    batch_size = Column(Integer, default=1)         # Answers sharing the request (tokens are split between them)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cost_usd = Column(Float, default=0)             # At the prices in effect when graded
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # Global time windows
+
+    __table_args__ = (
+        # Per-test stats and time windows
+        Index('ix_eval_record_test_created', 'test_id', 'created_at'),
+    )
+
+# 13. Purge Jobs (background removal of a soft-deleted test's or question's rows, in bounded chunks)
+class PurgeJob(Base):
+    __tablename__ = "purge_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String)        # "test" or "question"
+    target_id = Column(Integer)  # Test or question id (no FK: the row is removed at the end)
+    test_id = Column(Integer, nullable=True)  # Owning test (for question purges: cache invalidation)
+
+    status = Column(String, default="pending", index=True)  # pending / running / done / failed
+    stage = Column(String, nullable=True)     # Table being purged
+    deleted = Column(JSON, nullable=True)     # Rows removed so far, per table
+    attempts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    worker_id = Column(String, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Claim order: oldest pending job first
+        Index('ix_purge_job_status_id', 'status', 'id'),
+    )
@@ -0,0 +1,118 @@
+"""
+Keyset (cursor) pagination and sparse field selection for admin list endpoints.
+Pages are ordered by an indexed integer key and continue with `key > last`,
+so every page costs the same no matter how deep it is. The cursor is opaque
+to clients and travels in the X-Next-Cursor response header, which keeps the
+response bodies plain JSON arrays.
+"""
+import base64
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "100"))          # Default rows per page
+ADMIN_MAX_PAGE_SIZE = int(os.getenv("ADMIN_MAX_PAGE_SIZE", "1000"))  # Upper bound for ?limit=
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PaginationError(ValueError):
+    """Bad cursor, limit or field list (reported to the client as 400)."""
+
+
+def encode_cursor(last_key) -> str:
+    raw = json.dumps({"after": last_key}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return json.loads(raw)["after"]
+    except (ValueError, KeyError, TypeError):
+        raise PaginationError("Invalid cursor")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    if not cursor:
+        return None
+    after = _decode(cursor)
+    if not isinstance(after, int):
+        raise PaginationError("Invalid cursor")
+    return after
+
+
+def decode_ranked_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    if not cursor:
+        return None
+    after = _decode(cursor)
+    if not (isinstance(after, list) and len(after) == 2 and isinstance(after[1], int)):
+        raise PaginationError("Invalid cursor")
+    return float(after[0]), after[1]
+
+
+def page_size(limit: Optional[int]) -> int:
+    if limit is None:
+        return ADMIN_PAGE_SIZE
+    if limit < 1:
+        raise PaginationError("limit must be at least 1")
+    return min(limit, ADMIN_MAX_PAGE_SIZE)
+
+
+def parse_fields(fields: Optional[str], available: Dict[str, object], default: List[str],
+                 required: Tuple[str, ...] = ("id",)) -> List[str]:
+    """Requested field names (comma separated), validated against `available`."""
+    if not fields:
+        return list(default)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise PaginationError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    # The key is always returned so clients can dedupe across pages
+    return [name for name in required if name not in names] + names
+
+
+def keyset_page(query, key_column, cursor: Optional[str], limit: Optional[int]) -> Tuple[list, Optional[str]]:
+    """
+    Rows of one page ordered by `key_column`, and the cursor of the next page
+    (None on the last page). Fetches one extra row to know whether more exist.
+    """
+    after = decode_cursor(cursor)
+    size = page_size(limit)
+    if after is not None:
+        query = query.filter(key_column > after)
+    rows = query.order_by(key_column).limit(size + 1).all()
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor(getattr(rows[-1], key_column.key))
+
+
+def ranked_page(query, score_column, key_column, cursor: Optional[str], limit: Optional[int],
+                descending: bool = True) -> Tuple[list, Optional[str]]:
+    """
+    Keyset page ordered by (score, key), ties broken by key ascending.
+    Rows with a NULL score are excluded. Backed by an index on (..., score, key).
+    """
+    after = decode_ranked_cursor(cursor)
+    size = page_size(limit)
+    query = query.filter(score_column.isnot(None))
+    if after is not None:
+        score, key = after
+        beyond = score_column < score if descending else score_column > score
+        query = query.filter(or_(beyond, and_(score_column == score, key_column > key)))
+    order = score_column.desc() if descending else score_column.asc()
+    rows = query.order_by(order, key_column).limit(size + 1).all()
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, score_column.key), getattr(last, key_column.key)])
+
+
+def prefix_pattern(prefix: str) -> str:
+    """LIKE pattern matching values that start with `prefix` (wildcards escaped with '\\')."""
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
@@ -1,12 +1,35 @@
 """
 Password hashing utilities using bcrypt.
+Login verification runs on a small dedicated process pool so bcrypt's CPU
+cost never occupies the request threadpool or the GIL of the API process.
+The pool admits a bounded number of in-flight verifications and rejects
+the rest immediately (PasswordPoolSaturated -> 503) instead of queueing.
+With PASSWORD_WORKERS=0 the check runs on the threadpool, never on the event loop.
+Hashes made with a different cost factor are transparently re-hashed at
+the configured BCRYPT_ROUNDS on successful login.
 """
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import anyio
 import bcrypt
 
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Cost factor for new and re-hashed passwords
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(2, os.cpu_count() or 1))))  # 0 = hash on the threadpool
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", str(max(1, PASSWORD_WORKERS) * 8)))
+
+
+class PasswordPoolSaturated(Exception):
+    """Too many verifications in flight; the caller should ask the client to retry."""
 
-def hash_password(password: str) -> str:
+
+def hash_password(password: str, rounds: int = None) -> str:
     """Hash a password using bcrypt."""
-    salt = bcrypt.gensalt(rounds=12)  # 12 rounds is secure and reasonably fast
+    salt = bcrypt.gensalt(rounds=rounds or BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
@@ -19,3 +42,105 @@ def verify_password(password: str, hashed: str) -> bool:
         return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
     except Exception:
         return False
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Cost factor stored in a bcrypt hash ('$2b$12$...'), or None if unparseable."""
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed: str, rounds: int = None) -> bool:
+    return hash_rounds(hashed) != (rounds or BCRYPT_ROUNDS)
+
+
+def check_and_upgrade(password: str, hashed: str, rounds: int = None) -> Tuple[bool, Optional[str]]:
+    """(valid, new_hash): new_hash is set when the password is valid but its cost factor is outdated."""
+    if not verify_password(password, hashed):
+        return False, None
+    if needs_rehash(hashed, rounds):
+        return True, hash_password(password, rounds)
+    return True, None
+
+
+class PasswordPool:
+    """Process pool for bcrypt with a hard cap on in-flight work."""
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, max_pending: int = PASSWORD_MAX_PENDING,
+                 rounds: int = BCRYPT_ROUNDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork the multi-threaded API process
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """Spin up the worker processes ahead of the first login."""
+        if self.workers > 0:
+            executor = self._get_executor()
+            for future in [executor.submit(hash_rounds, "") for _ in range(self.workers)]:
+                future.result()
+
+    def _acquire(self) -> None:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolSaturated("Too many logins in progress")
+
+    def submit(self, password: str, hashed: str) -> Future:
+        """Queue a check_and_upgrade call, or raise PasswordPoolSaturated right away."""
+        self._acquire()
+        try:
+            if self.workers > 0:
+                future = self._get_executor().submit(check_and_upgrade, password, hashed, self.rounds)
+            else:
+                future = Future()
+                future.set_result(check_and_upgrade(password, hashed, self.rounds))
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Awaitable check_and_upgrade; waits without holding a thread."""
+        if not hashed:
+            return False, None
+        if self.workers > 0:
+            return await asyncio.wrap_future(self.submit(password, hashed))
+        # No worker processes: bcrypt still must not run on the event loop
+        self._acquire()
+        try:
+            return await anyio.to_thread.run_sync(check_and_upgrade, password, hashed, self.rounds)
+        finally:
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "rounds": self.rounds,
+            "rejected": self.rejected,
+        }
+
+
+pool = PasswordPool()
@@ -0,0 +1,330 @@
+"""
+Soft delete with a chunked background purge.
+Deleting a test (or a question) only stamps deleted_at and queues a
+PurgeJob, so the admin request is one small transaction and the row
+disappears from every listing at once. A purger thread then removes the
+dependent rows table by table in bounded chunks: each chunk selects at
+most PURGE_CHUNK_ROWS primary keys through an indexed filter, deletes
+them by key and commits together with the job's progress, pausing
+briefly between chunks so candidate writes are never blocked for long.
+Every stage is an idempotent "delete whatever is left", so a job
+interrupted by a restart (or failed on a row written mid-purge) simply
+runs again from the first stage.
+"""
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+
+# Handle imports for both local development and deployment
+try:
+    from . import models, question_cache, resource_versions, score_stats
+    from .database import SessionLocal
+except ImportError:
+    import models, question_cache, resource_versions, score_stats
+    from database import SessionLocal
+
+PURGE_WORKER = os.getenv("PURGE_WORKER", "true").lower() in ("1", "true", "yes")  # Run the purger in this process
+PURGE_CHUNK_ROWS = int(os.getenv("PURGE_CHUNK_ROWS", "2000"))           # Rows deleted per transaction
+PURGE_CHUNK_PAUSE_MS = float(os.getenv("PURGE_CHUNK_PAUSE_MS", "50"))   # Pause between chunks (lets writers in)
+PURGE_POLL_INTERVAL = float(os.getenv("PURGE_POLL_INTERVAL", "2.0"))    # Seconds between polls when idle
+PURGE_STALE_SECONDS = int(os.getenv("PURGE_STALE_SECONDS", "300"))      # Running job with no heartbeat = interrupted
+PURGE_MAX_ATTEMPTS = int(os.getenv("PURGE_MAX_ATTEMPTS", "5"))
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+TEST, QUESTION = "test", "question"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands back naive datetimes
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+# ============== STAGES ============== #
+
+class Stage(NamedTuple):
+    name: str
+    key: object                               # Primary-key column of the table purged
+    where: Callable[[int], list]              # target id -> filter criteria (index-backed)
+    before: Optional[Callable] = None         # (db, target_id, keys) -> None, same transaction as the delete
+
+
+def _sessions_of(test_id: int):
+    return select(models.TestSession.id).where(models.TestSession.test_id == test_id)
+
+
+def _delete_where(db, model, *criteria) -> int:
+    return db.query(model).filter(*criteria).delete(synchronize_session=False)
+
+
+def _session_dependents(db, test_id: int, session_ids: List[int]) -> None:
+    # Answers or grades written after their stage ran (candidates still submitting)
+    _delete_where(db, models.EvaluationRecord, models.EvaluationRecord.session_id.in_(session_ids))
+    _delete_where(db, models.UserResponse, models.UserResponse.session_id.in_(session_ids))
+    _delete_where(db, models.EvaluationJob, models.EvaluationJob.session_id.in_(session_ids))
+    _delete_where(db, models.SessionScore, models.SessionScore.session_id.in_(session_ids))
+
+
+def _job_records(db, test_id: int, job_ids: List[int]) -> None:
+    _delete_where(db, models.EvaluationRecord, models.EvaluationRecord.job_id.in_(job_ids))
+
+
+def _question_stats(db, test_id: int, question_ids: List[int]) -> None:
+    _delete_where(db, models.QuestionStat, models.QuestionStat.question_id.in_(question_ids))
+
+
+def _unscore_responses(db, question_id: int, response_ids: List[int]) -> None:
+    """Take the graded responses out of their sessions' score aggregates."""
+    question = db.query(models.Question.test_id, models.Question.ideal_status).filter(
+        models.Question.id == question_id
+    ).first()
+    rows = db.query(
+        models.UserResponse.session_id,
+        models.UserResponse.status,
+        models.UserResponse.ai_score
+    ).filter(
+        models.UserResponse.id.in_(response_ids),
+        models.UserResponse.ai_score.isnot(None)
+    ).all()
+    if not question or not rows:
+        return
+    deltas = score_stats.ScoreDeltas()
+    for r in rows:
+        matched = score_stats.status_matches(r.status, question.ideal_status)
+        deltas.add(r.session_id, question_id, question.test_id, -r.ai_score, -1, -int(matched))
+    deltas.questions.clear()  # The question's own stats row is purged with it
+    deltas.apply(db)
+
+
+TEST_STAGES = (
+    Stage("evaluation_records", models.EvaluationRecord.id, lambda t: [models.EvaluationRecord.test_id == t]),
+    Stage("user_responses", models.UserResponse.id, lambda t: [models.UserResponse.session_id.in_(_sessions_of(t))]),
+    Stage("evaluation_jobs", models.EvaluationJob.id,
+          lambda t: [or_(models.EvaluationJob.test_id == t, models.EvaluationJob.session_id.in_(_sessions_of(t)))],
+          _job_records),
+    Stage("session_scores", models.SessionScore.session_id, lambda t: [models.SessionScore.test_id == t]),
+    Stage("question_stats", models.QuestionStat.question_id, lambda t: [models.QuestionStat.test_id == t]),
+    Stage("test_sessions", models.TestSession.id, lambda t: [models.TestSession.test_id == t], _session_dependents),
+    Stage("question_sets", models.QuestionSet.id, lambda t: [models.QuestionSet.test_id == t]),
+    Stage("questions", models.Question.id, lambda t: [models.Question.test_id == t], _question_stats),
+    Stage("ingest_rejected_rows", models.IngestRejectedRow.id,
+          lambda t: [models.IngestRejectedRow.job_id.in_(
+              select(models.IngestJob.id).where(models.IngestJob.test_id == t))]),
+    Stage("ingest_jobs", models.IngestJob.id, lambda t: [models.IngestJob.test_id == t]),
+)
+
+QUESTION_STAGES = (
+    Stage("evaluation_records", models.EvaluationRecord.id, lambda q: [models.EvaluationRecord.question_id == q]),
+    Stage("user_responses", models.UserResponse.id, lambda q: [models.UserResponse.question_id == q],
+          _unscore_responses),
+    Stage("question_stats", models.QuestionStat.question_id, lambda q: [models.QuestionStat.question_id == q]),
+)
+
+STAGES = {TEST: TEST_STAGES, QUESTION: QUESTION_STAGES}
+
+
+def _finish_test(db, test_id: int) -> None:
+    _delete_where(db, models.Test, models.Test.id == test_id)
+
+
+def _finish_question(db, question_id: int) -> None:
+    # Answers saved after their stage ran (a worker still serving the question from its cache)
+    _delete_where(db, models.EvaluationRecord, models.EvaluationRecord.question_id == question_id)
+    _delete_where(db, models.UserResponse, models.UserResponse.question_id == question_id)
+    _delete_where(db, models.Question, models.Question.id == question_id)
+
+
+FINISHERS = {TEST: _finish_test, QUESTION: _finish_question}
+
+
+def delete_chunk(db, stage: Stage, target_id: int, chunk_rows: int = PURGE_CHUNK_ROWS) -> int:
+    """Delete up to chunk_rows rows of one stage (caller commits). Returns the number removed."""
+    keys = [row[0] for row in db.query(stage.key).filter(*stage.where(target_id))
+            .order_by(stage.key).limit(chunk_rows)]
+    if not keys:
+        return 0
+    if stage.before:
+        stage.before(db, target_id, keys)
+    return _delete_where(db, stage.key.class_, stage.key.in_(keys))
+
+
+# ============== PRODUCER ============== #
+
+def delete_test(db, test: models.Test) -> models.PurgeJob:
+    """Hide a test right away and queue the purge of its rows (caller commits)."""
+    test.deleted_at = _now()
+    test.is_active = False
+    job = models.PurgeJob(kind=TEST, target_id=test.id, test_id=test.id, status=PENDING, attempts=0, deleted={})
+    db.add(job)
+    resource_versions.bump(db, resource_versions.TESTS)
+    return job
+
+
+def delete_question(db, question: models.Question) -> models.PurgeJob:
+    """
+    Take a question out of the test right away and queue the purge of its
+    answers (caller commits). Sessions already holding it in their snapshot
+    skip it from now on (see session_flow.live_position).
+    """
+    question.deleted_at = _now()
+    # Off the difficulty list at once; aggregates of the answering sessions are corrected per chunk
+    _delete_where(db, models.QuestionStat, models.QuestionStat.question_id == question.id)
+    job = models.PurgeJob(kind=QUESTION, target_id=question.id, test_id=question.test_id, status=PENDING,
+                          attempts=0, deleted={})
+    db.add(job)
+    resource_versions.bump(db, resource_versions.TESTS)
+    return job
+
+
+def job_to_dict(job: models.PurgeJob) -> dict:
+    started, finished = _aware(job.started_at), _aware(job.finished_at)
+    elapsed = ((finished or _now()) - started).total_seconds() if started else 0.0
+    deleted = job.deleted or {}
+    total = sum(deleted.values())
+    names = [stage.name for stage in STAGES.get(job.kind, ())]
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "target_id": job.target_id,
+        "status": job.status,
+        "stage": job.stage,
+        "stages_done": names.index(job.stage) if job.stage in names else (len(names) if job.status == DONE else 0),
+        "stages_total": len(names),
+        "deleted": deleted,
+        "rows_deleted": total,
+        "elapsed_seconds": round(elapsed, 1),
+        "rows_per_second": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# ============== CONSUMER ============== #
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:purge"
+
+
+def claim_next_job(db, worker_id: str) -> Optional[int]:
+    """Take the oldest pending job (or one whose worker stopped heartbeating). Returns its id."""
+    stale_before = _now() - timedelta(seconds=PURGE_STALE_SECONDS)
+    claimable = or_(
+        models.PurgeJob.status == PENDING,
+        and_(models.PurgeJob.status == RUNNING, models.PurgeJob.heartbeat_at < stale_before)
+    )
+    candidates = db.query(models.PurgeJob.id).filter(claimable).order_by(models.PurgeJob.id).limit(5).all()
+    for (job_id,) in candidates:
+        now = _now()
+        # Compare-and-swap on (status, heartbeat): one worker wins on either database
+        claimed = db.query(models.PurgeJob).filter(models.PurgeJob.id == job_id, claimable).update({
+            "status": RUNNING,
+            "worker_id": worker_id,
+            "attempts": models.PurgeJob.attempts + 1,
+            "started_at": now,
+            "heartbeat_at": now,
+            "error": None,
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return job_id
+    return None
+
+
+def run_job(job_id: int, stop_event: threading.Event = None, chunk_rows: int = PURGE_CHUNK_ROWS,
+            pause_ms: float = PURGE_CHUNK_PAUSE_MS, session_factory=SessionLocal) -> None:
+    """Purge a claimed job's rows stage by stage; progress commits with every chunk."""
+    stop_event = stop_event or threading.Event()
+    db = session_factory()
+    try:
+        job = db.query(models.PurgeJob).filter(models.PurgeJob.id == job_id).first()
+        deleted = dict(job.deleted or {})
+        try:
+            for stage in STAGES[job.kind]:
+                job.stage = stage.name
+                while True:
+                    if stop_event.is_set():
+                        # Shutting down: hand the job back, it restarts from the first stage
+                        job.status = PENDING
+                        job.worker_id = None
+                        db.commit()
+                        return
+                    removed = delete_chunk(db, stage, job.target_id, chunk_rows)
+                    if removed:
+                        deleted[stage.name] = deleted.get(stage.name, 0) + removed
+                        job.deleted = dict(deleted)
+                    job.heartbeat_at = _now()
+                    db.commit()
+                    if removed < chunk_rows:
+                        break
+                    if pause_ms:
+                        stop_event.wait(pause_ms / 1000)
+
+            FINISHERS[job.kind](db, job.target_id)
+            deleted[job.kind + "s"] = deleted.get(job.kind + "s", 0) + 1
+            job.deleted = dict(deleted)
+            job.status = DONE
+            job.stage = None
+            job.finished_at = _now()
+            resource_versions.bump(db, resource_versions.TESTS)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            job.status = PENDING if (job.attempts or 0) < PURGE_MAX_ATTEMPTS else FAILED
+            job.worker_id = None
+            job.error = str(e) or e.__class__.__name__
+            if job.status == FAILED:
+                job.finished_at = _now()
+            db.commit()
+            print(f"[PURGE] {job.kind} {job.target_id} failed in {job.stage}: {job.error}")
+            return
+
+        if job.kind == TEST:
+            question_cache.invalidate_test(job.target_id)
+        else:
+            question_cache.invalidate_question(job.target_id, job.test_id)
+        print(f"[PURGE] {job.kind} {job.target_id} purged: {sum(deleted.values())} rows")
+    finally:
+        db.close()
+
+
+def work(stop_event: threading.Event, worker_id: str = None, poll_interval: float = PURGE_POLL_INTERVAL,
+         once: bool = False) -> None:
+    """Claim and run purge jobs until stop_event is set (or the queue is empty, with once=True)."""
+    worker_id = worker_id or default_worker_id()
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            job_id = claim_next_job(db, worker_id)
+        except Exception as e:
+            db.rollback()
+            job_id = None
+            print(f"[PURGE] Claim failed: {e}")
+        finally:
+            db.close()
+
+        if job_id is not None:
+            run_job(job_id, stop_event)
+            continue
+        if once:
+            return
+        stop_event.wait(poll_interval)
+
+
+def start_purger() -> Tuple[threading.Thread, threading.Event]:
+    """Run the purger in a daemon thread of the API process."""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=work, kwargs={"stop_event": stop_event}, name="purger", daemon=True)
+    thread.start()
+    return thread, stop_event
@@ -0,0 +1,153 @@
+"""
+In-process LRU/TTL cache for the candidate hot path.
+Holds serialized QuestionOut payloads keyed by question id and a per-test
+index of question ids. Questions are effectively immutable while a test is
+live; the admin endpoints that change them call the invalidate_* helpers.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+# Handle imports for both local development and deployment
+try:
+    from . import models, schemas
+except ImportError:
+    import models, schemas
+
+QUESTION_CACHE_SIZE = int(os.getenv("QUESTION_CACHE_SIZE", "5000"))    # Max cached questions
+QUESTION_CACHE_TTL = float(os.getenv("QUESTION_CACHE_TTL", "300"))     # Seconds (bounds cross-worker staleness)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value, ttl: float = None) -> None:
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def add(self, key: Hashable, value, ttl: float = None) -> bool:
+        """Set `key` only if it holds no live entry; True if it was set."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                return False
+            self._set(key, value, ttl)
+            return True
+
+    def _set(self, key: Hashable, value, ttl: Optional[float]) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate) -> int:
+        """Drop every entry whose value matches predicate(value)."""
+        with self._lock:
+            keys = [k for k, (_, v) in self._data.items() if predicate(v)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+# question_id -> (test_id, QuestionOut payload)
+questions = TTLCache(QUESTION_CACHE_SIZE, QUESTION_CACHE_TTL)
+# test_id -> [question ids ordered by id]
+test_index = TTLCache(max(100, QUESTION_CACHE_SIZE // 50), QUESTION_CACHE_TTL)
+
+
+def get_question(db, question_id: int) -> Optional[dict]:
+    """QuestionOut payload for a question, from cache or a single-row query (None if deleted)."""
+    cached = questions.get(question_id)
+    if cached is not None:
+        return cached[1]
+
+    row = db.query(
+        models.Question.id,
+        models.Question.test_id,
+        models.Question.task_id,
+        models.Question.link,
+        models.Question.description
+    ).filter(models.Question.id == question_id, models.Question.deleted_at.is_(None)).first()
+    if not row:
+        return None
+
+    payload = schemas.QuestionOut.model_validate(row).model_dump()
+    questions.set(question_id, (row.test_id, payload))
+    return payload
+
+
+def get_test_question_ids(db, test_id: int) -> List[int]:
+    """Ids of every question in a test, from cache or one index-only query."""
+    cached = test_index.get(test_id)
+    if cached is not None:
+        return list(cached)
+
+    ids = [q.id for q in db.query(models.Question.id).filter(
+        models.Question.test_id == test_id,
+        models.Question.deleted_at.is_(None)  # Soft-deleted questions stay out of new snapshots
+    ).order_by(models.Question.id).all()]
+    test_index.set(test_id, tuple(ids))
+    return ids
+
+
+def invalidate_question(question_id: int, test_id: int = None) -> None:
+    questions.delete(question_id)
+    if test_id is not None:
+        test_index.delete(test_id)
+
+
+def invalidate_test(test_id: int) -> None:
+    """Drop a test's question index and every cached question belonging to it."""
+    test_index.delete(test_id)
+    questions.delete_where(lambda entry: entry[0] == test_id)
+
+
+def stats() -> dict:
+    return {"questions": questions.stats(), "test_index": test_index.stats()}
@@ -0,0 +1,156 @@
+"""
+Compact per-session question order.
+Instead of storing a shuffled id list on every TestSession, a session
+points at a shared, versioned QuestionSet snapshot and stores a random
+seed. The k-th question is computed in O(1) with a keyed Feistel
+permutation (cycle-walking keeps it a bijection on [0, n)).
+Legacy sessions that still carry question_order are read as before and
+can be migrated with migrate_legacy_sessions() without changing their order.
+"""
+import hashlib
+import json
+import secrets
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, null
+
+# Handle imports for both local development and deployment
+try:
+    from . import models, question_cache
+    from .question_cache import TTLCache
+except ImportError:
+    import models, question_cache
+    from question_cache import TTLCache
+
+FEISTEL_ROUNDS = 4
+
+# question_set_id -> tuple of question ids (snapshots never change)
+_set_cache = TTLCache(maxsize=512, ttl=3600)
+
+
+# ============== PERMUTATION ============== #
+
+def _round(seed: int, round_no: int, value: int, mask: int) -> int:
+    digest = hashlib.blake2b(f"{seed}:{round_no}:{value}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & mask
+
+
+def permuted_index(k: int, n: int, seed: int) -> int:
+    """Position of the k-th question under the permutation keyed by `seed` (0 <= k < n)."""
+    if n <= 1:
+        return 0
+    half_bits = max(1, ((n - 1).bit_length() + 1) // 2)
+    mask = (1 << half_bits) - 1
+    x = k
+    while True:
+        left, right = x >> half_bits, x & mask
+        for round_no in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ _round(seed, round_no, right, mask)
+        x = (left << half_bits) | right
+        # Domain is < 4n, so this walks ~4 steps at most on average
+        if x < n:
+            return x
+
+
+def new_seed() -> int:
+    return secrets.randbits(62)
+
+
+# ============== SNAPSHOTS ============== #
+
+def _digest(question_ids: Sequence[int]) -> str:
+    return hashlib.sha256(json.dumps(list(question_ids)).encode("utf-8")).hexdigest()
+
+
+def _get_or_create_set(db, test_id: int, question_ids: Sequence[int]) -> models.QuestionSet:
+    digest = _digest(question_ids)
+    existing = db.query(models.QuestionSet).filter(
+        models.QuestionSet.test_id == test_id,
+        models.QuestionSet.digest == digest
+    ).first()
+    if existing:
+        return existing
+
+    version = (db.query(func.max(models.QuestionSet.version)).filter(
+        models.QuestionSet.test_id == test_id
+    ).scalar() or 0) + 1
+    snapshot = models.QuestionSet(test_id=test_id, version=version, digest=digest,
+                                  question_ids=list(question_ids), size=len(question_ids))
+    try:
+        # Savepoint: a concurrent start_test may create the same snapshot
+        with db.begin_nested():
+            db.add(snapshot)
+    except IntegrityError:
+        return db.query(models.QuestionSet).filter(
+            models.QuestionSet.test_id == test_id,
+            models.QuestionSet.digest == digest
+        ).first()
+    return snapshot
+
+
+def snapshot_for_test(db, test_id: int) -> Optional[models.QuestionSet]:
+    """Current question-set snapshot of a test (created when the bank changed), or None if empty."""
+    question_ids = question_cache.get_test_question_ids(db, test_id)
+    if not question_ids:
+        return None
+    return _get_or_create_set(db, test_id, question_ids)
+
+
+def get_set_ids(db, question_set_id: int) -> Tuple[int, ...]:
+    ids = _set_cache.get(question_set_id)
+    if ids is None:
+        ids = tuple(db.query(models.QuestionSet.question_ids).filter(
+            models.QuestionSet.id == question_set_id
+        ).scalar() or ())
+        _set_cache.set(question_set_id, ids)
+    return ids
+
+
+# ============== SESSION LOOKUPS ============== #
+
+def total_questions(db, session) -> int:
+    """Number of questions in a session (works on ORM objects and column rows)."""
+    if session.question_set_id is not None:
+        return len(get_set_ids(db, session.question_set_id))
+    return len(session.question_order or [])
+
+
+def question_at(db, session, k: int) -> Optional[int]:
+    """Id of the k-th question of a session, or None past the end."""
+    if session.question_set_id is None:
+        # Legacy session with an explicit id list
+        order = session.question_order or []
+        return order[k] if 0 <= k < len(order) else None
+
+    ids = get_set_ids(db, session.question_set_id)
+    if not 0 <= k < len(ids):
+        return None
+    if session.order_seed is None:
+        return ids[k]
+    return ids[permuted_index(k, len(ids), session.order_seed)]
+
+
+def migrate_legacy_sessions(db, batch_size: int = 500) -> int:
+    """
+    Move sessions that still store question_order onto snapshots.
+    Each session's exact order becomes a snapshot read with no permutation
+    (order_seed NULL); identical orders share one snapshot.
+    """
+    migrated = 0
+    while True:
+        sessions = db.query(models.TestSession).filter(
+            models.TestSession.question_set_id.is_(None),
+            models.TestSession.question_order.isnot(None)
+        ).order_by(models.TestSession.id).limit(batch_size).all()
+        if not sessions:
+            return migrated
+
+        for session in sessions:
+            order = list(session.question_order or [])
+            if order:
+                session.question_set_id = _get_or_create_set(db, session.test_id, order).id
+                session.order_seed = None
+            session.question_order = null()  # SQL NULL, not JSON 'null'
+            migrated += 1
+        db.commit()
@@ -0,0 +1,93 @@
+"""
+Version counters, strong ETags and conditional GETs for read-mostly endpoints.
+Shared resources (e.g. the test list) have a counter in resource_versions
+that the mutating endpoints bump in the same transaction as their change.
+GET handlers read the counter first - from a short in-process cache, so a
+revalidation usually touches no table at all - and answer If-None-Match
+with an empty 304 before running their query (whose result is kept in
+shared_cache, tagged with the resource key). Per-session resources use
+the session row's own progress columns as their version instead.
+"""
+import os
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Handle imports for both local development and deployment
+try:
+    from . import models, shared_cache
+    from .question_cache import TTLCache
+except ImportError:
+    import models, shared_cache
+    from question_cache import TTLCache
+
+RESOURCE_VERSION_TTL = float(os.getenv("RESOURCE_VERSION_TTL", "2"))  # Seconds (bounds cross-worker staleness)
+
+# Resource keys
+TESTS = "tests"  # Test list, active test, question counts
+
+# Every response is per-user and must be revalidated before reuse
+CACHE_CONTROL = "private, no-cache"
+
+_versions = TTLCache(maxsize=256, ttl=RESOURCE_VERSION_TTL)
+
+
+def current(db, key: str) -> int:
+    """Version of `key` (0 if never bumped)."""
+    version = _versions.get(key)
+    if version is None:
+        version = db.query(models.ResourceVersion.version).filter(
+            models.ResourceVersion.key == key
+        ).scalar() or 0
+        _versions.set(key, version)
+    return version
+
+
+def bump(db, key: str) -> None:
+    """Increment `key`'s version (caller commits); this process sees it right after the commit,
+    and the shared cache drops every entry tagged `key`."""
+    table = models.ResourceVersion.__table__
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(table).values(key=key, version=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["key"], set_={"version": table.c.version + 1}
+    ))
+    event.listen(db, "after_commit", lambda session: _versions.delete(key), once=True)
+    shared_cache.cache.invalidate_on_commit(db, key)
+
+
+def etag(*parts) -> str:
+    """Strong ETag from version components."""
+    return '"' + "-".join(str(p) for p in parts) + '"'
+
+
+def is_current(request: Request, tag: str) -> bool:
+    """True when the client's If-None-Match already names `tag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison: ignore a W/ prefix
+    return any(candidate.strip().removeprefix("W/") == tag for candidate in header.split(","))
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": CACHE_CONTROL, "Vary": "Authorization"})
+
+
+def set_headers(response: Response, tag: str) -> None:
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    response.headers["Vary"] = "Authorization"
+
+
+def check(request: Request, response: Response, tag: str) -> Optional[Response]:
+    """304 response if the client is current; otherwise stamp `response` and return None."""
+    if is_current(request, tag):
+        return not_modified(tag)
+    set_headers(response, tag)
+    return None
@@ -32,6 +32,13 @@ class AnswerSubmit(BaseModel):
     explanation: str
     critical_error: str
 
+# Result of "submit and fetch next" (question is None once the test is completed)
+class SubmitNextOut(BaseModel):
+    message: str
+    next_index: int
+    is_completed: bool
+    question: Optional[QuestionOut] = None
+
 # Information about the current session
 class SessionInfo(BaseModel):
     session_id: int
@@ -0,0 +1,151 @@
+"""
+Incrementally maintained score aggregates per session and per question.
+The evaluation engine records each grade as a delta (score change, newly
+graded, status match) and applies the deltas with one upsert per touched
+row in the same transaction as the ai_score updates, so leaderboards and
+difficulty stats never need a scan over user_responses. Only grades whose
+guarded UPDATE (ai_score still as read) went through are recorded, so a
+session job and a test job grading the same answer count it once.
+rebuild_test() recomputes a test from scratch as a repair tool.
+"""
+from typing import Dict, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Handle imports for both local development and deployment
+try:
+    from . import models
+    from .ai_agent import normalize_status
+except ImportError:
+    import models
+    from ai_agent import normalize_status
+
+
+def status_matches(user_status, ideal_status) -> bool:
+    """Same verdict as the ideal answer (synonyms normalized; unknown values never match)."""
+    user = normalize_status(user_status)
+    return user is not None and user == normalize_status(ideal_status)
+
+
+class ScoreDeltas:
+    """Pending aggregate changes, keyed by session and by question."""
+
+    def __init__(self):
+        self.sessions: Dict[int, dict] = {}
+        self.questions: Dict[int, dict] = {}
+
+    def add(self, session_id: int, question_id: int, test_id: int,
+            score_delta: int, graded: int, matched: int) -> None:
+        for table, key in ((self.sessions, session_id), (self.questions, question_id)):
+            bucket = table.setdefault(key, {"test_id": test_id, "graded_count": 0,
+                                            "total_score": 0, "status_match_count": 0})
+            bucket["total_score"] += score_delta
+            bucket["graded_count"] += graded
+            bucket["status_match_count"] += matched
+
+    def record(self, response, question, new_score: Optional[int]) -> None:
+        """Account for `response` changing from its current ai_score to `new_score` (None: no grade, no change)."""
+        if new_score is None:
+            return
+        old_score = response.ai_score
+        newly_graded = old_score is None
+        matched = newly_graded and status_matches(response.status, question.ideal_status)
+        self.add(response.session_id, question.id, question.test_id,
+                 new_score - (old_score or 0), int(newly_graded), int(matched))
+
+    def __bool__(self) -> bool:
+        return bool(self.sessions or self.questions)
+
+    def apply(self, db) -> None:
+        """Upsert the pending deltas (caller commits) and reset."""
+        _upsert(db, models.SessionScore, "session_id", self.sessions)
+        _upsert(db, models.QuestionStat, "question_id", self.questions)
+        self.sessions, self.questions = {}, {}
+
+
+def _upsert(db, model, key_name: str, deltas: Dict[int, dict]) -> None:
+    if not deltas:
+        return
+    table = model.__table__
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(table)
+    graded = table.c.graded_count + stmt.excluded.graded_count
+    total = table.c.total_score + stmt.excluded.total_score
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key_name],
+        set_={
+            "graded_count": graded,
+            "total_score": total,
+            "status_match_count": table.c.status_match_count + stmt.excluded.status_match_count,
+            "avg_score": case((graded > 0, total * 1.0 / graded), else_=None),
+            "updated_at": func.now(),
+        }
+    )
+    # Sorted keys: concurrent workers lock rows in the same order
+    db.execute(stmt, [
+        {
+            key_name: key,
+            **delta,
+            "avg_score": delta["total_score"] / delta["graded_count"] if delta["graded_count"] else None,
+        }
+        for key, delta in sorted(deltas.items())
+    ])
+
+
+def rebuild_test(db, test_id: int) -> dict:
+    """Recompute every aggregate of a test from user_responses (caller commits)."""
+    db.query(models.QuestionStat).filter(models.QuestionStat.test_id == test_id).delete(synchronize_session=False)
+    db.query(models.SessionScore).filter(models.SessionScore.test_id == test_id).delete(synchronize_session=False)
+
+    deltas = ScoreDeltas()
+    rows = db.query(
+        models.UserResponse.session_id,
+        models.UserResponse.status,
+        models.UserResponse.ai_score,
+        models.Question.id,
+        models.Question.ideal_status
+    ).join(
+        models.Question, models.UserResponse.question_id == models.Question.id
+    ).filter(
+        models.Question.test_id == test_id,
+        models.UserResponse.ai_score.isnot(None)
+    ).yield_per(1000)
+    for row in rows:
+        deltas.add(row.session_id, row.id, test_id, row.ai_score, 1,
+                   int(status_matches(row.status, row.ideal_status)))
+
+    counts = {"sessions": len(deltas.sessions), "questions": len(deltas.questions)}
+    deltas.apply(db)
+    return counts
+
+
+def _rate(matched: int, graded: int) -> Optional[float]:
+    return round(matched / graded, 4) if graded else None
+
+
+def session_score_to_dict(row) -> dict:
+    return {
+        "session_id": row.session_id,
+        "user_id": row.user_id,
+        "username": row.username,
+        "is_completed": row.is_completed,
+        "answered": row.current_index,
+        "graded": row.graded_count,
+        "total_score": row.total_score,
+        "avg_score": round(row.avg_score, 2) if row.avg_score is not None else None,
+        "status_match_rate": _rate(row.status_match_count, row.graded_count),
+    }
+
+
+def question_stat_to_dict(row) -> dict:
+    return {
+        "question_id": row.question_id,
+        "task_id": row.task_id,
+        "link": row.link,
+        "graded": row.graded_count,
+        "total_score": row.total_score,
+        "avg_score": round(row.avg_score, 2) if row.avg_score is not None else None,
+        "status_match_rate": _rate(row.status_match_count, row.graded_count),
+    }
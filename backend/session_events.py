@@ -0,0 +1,231 @@
+"""
+Server-pushed session timer/progress events and server-side expiry.
+Every session carries an expires_at deadline (start + test duration). A
+sweeper thread closes all overdue sessions with one set-based UPDATE per
+pass, and each candidate holds one Server-Sent Events stream that receives
+the deadline once plus a snapshot whenever progress changes, instead of
+polling /session/{id}/info. Subscribers live in this process only; the
+stream also closes itself at the deadline, so a sweep or submit handled by
+another worker process never leaves a client waiting.
+"""
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from sqlalchemy import update
+
+# Handle imports for both local development and deployment
+try:
+    from . import models
+    from .database import SessionLocal
+except ImportError:
+    import models
+    from database import SessionLocal
+
+SESSION_SWEEP_SECONDS = float(os.getenv("SESSION_SWEEP_SECONDS", "30"))            # Seconds between expiry sweeps
+SESSION_EXPIRY_GRACE_SECONDS = int(os.getenv("SESSION_EXPIRY_GRACE_SECONDS", "30"))  # Late submits still accepted
+SESSION_EVENTS_HEARTBEAT = float(os.getenv("SESSION_EVENTS_HEARTBEAT", "20"))      # Keep-alive comment interval
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands back naive datetimes (stored as UTC)
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def iso_utc(value: Optional[datetime]) -> Optional[str]:
+    return _aware(value).isoformat() if value else None
+
+
+def deadline_for(start_time: datetime, duration_minutes: Optional[int]) -> datetime:
+    return _aware(start_time) + timedelta(minutes=duration_minutes or 360)
+
+
+def session_window(duration_minutes: Optional[int]) -> Tuple[datetime, datetime]:
+    """(start_time, expires_at) for a session starting now."""
+    start_time = _now()
+    return start_time, deadline_for(start_time, duration_minutes)
+
+
+def is_expired(expires_at: Optional[datetime], now: datetime = None) -> bool:
+    """Past the deadline plus the grace period (NULL = legacy session not yet backfilled)."""
+    if expires_at is None:
+        return False
+    return _aware(expires_at) + timedelta(seconds=SESSION_EXPIRY_GRACE_SECONDS) <= (now or _now())
+
+
+def session_event(session_id: int, start_time, expires_at, current_index: int,
+                  total_questions: Optional[int], is_completed: bool) -> dict:
+    return {
+        "session_id": session_id,
+        "start_time": iso_utc(start_time),
+        "deadline": iso_utc(expires_at),
+        "server_time": _now().isoformat(),
+        "current_index": current_index,
+        "total_questions": total_questions,
+        "is_completed": is_completed,
+    }
+
+
+# ============== PUSH CHANNEL ============== #
+
+class SessionEventHub:
+    """Per-session subscriber queues; publish() is safe to call from worker threads."""
+
+    def __init__(self, queue_size: int = 8):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def subscribe(self, session_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(session_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, session_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(session_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                self._subscribers.pop(session_id, None)
+
+    def _deliver(self, session_id: int, event: dict) -> None:
+        for queue in list(self._subscribers.get(session_id, ())):
+            if queue.full():
+                # Every event is a full snapshot, so the oldest one can go
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def publish(self, session_id: int, event: dict) -> None:
+        if self._loop is None or session_id not in self._subscribers:
+            return
+        self._loop.call_soon_threadsafe(self._deliver, session_id, event)
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+
+hub = SessionEventHub()
+
+
+def _sse(event: dict) -> str:
+    return f"event: session\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream(snapshot: dict, heartbeat: float = SESSION_EVENTS_HEARTBEAT) -> AsyncIterator[str]:
+    """SSE stream for one session: the snapshot, then pushed updates until the session completes."""
+    session_id = snapshot["session_id"]
+    queue = hub.subscribe(session_id)
+    try:
+        yield _sse(snapshot)
+        if snapshot["is_completed"]:
+            return
+        closes_at = None
+        if snapshot["deadline"]:
+            closes_at = datetime.fromisoformat(snapshot["deadline"]) + timedelta(seconds=SESSION_EXPIRY_GRACE_SECONDS)
+        last = snapshot
+        while True:
+            timeout = heartbeat
+            if closes_at is not None:
+                timeout = max(0.0, min(timeout, (closes_at - _now()).total_seconds()))
+            try:
+                last = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if closes_at is not None and _now() >= closes_at:
+                    # Deadline passed: the sweeper (in whichever process) closes the row
+                    yield _sse({**last, "server_time": _now().isoformat(), "is_completed": True})
+                    return
+                yield ": ping\n\n"
+                continue
+            yield _sse(last)
+            if last["is_completed"]:
+                return
+    finally:
+        hub.unsubscribe(session_id, queue)
+
+
+# ============== EXPIRY SWEEPER ============== #
+
+def backfill_deadlines(db) -> int:
+    """Set expires_at on open sessions created before deadlines were stored (caller commits)."""
+    rows = db.query(
+        models.TestSession.id,
+        models.TestSession.start_time,
+        models.Test.duration_minutes
+    ).join(
+        models.Test, models.TestSession.test_id == models.Test.id
+    ).filter(
+        models.TestSession.expires_at.is_(None),
+        models.TestSession.is_completed == False
+    ).all()
+    if rows:
+        db.bulk_update_mappings(models.TestSession, [
+            {"id": r.id, "expires_at": deadline_for(r.start_time or _now(), r.duration_minutes)} for r in rows
+        ])
+    return len(rows)
+
+
+def sweep_expired(db) -> list:
+    """Mark every overdue open session completed in one UPDATE (caller commits and publishes)."""
+    cutoff = _now() - timedelta(seconds=SESSION_EXPIRY_GRACE_SECONDS)
+    result = db.execute(
+        update(models.TestSession)
+        .where(models.TestSession.is_completed == False, models.TestSession.expires_at <= cutoff)
+        .values(is_completed=True)
+        .returning(models.TestSession.id, models.TestSession.current_index, models.TestSession.start_time,
+                   models.TestSession.expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    return result.all()
+
+
+def publish_expired(rows) -> None:
+    for row in rows:
+        # Clients only need to learn the session is over (total not re-read)
+        hub.publish(row.id, session_event(row.id, row.start_time, row.expires_at, row.current_index,
+                                          None, True))
+
+
+def sweep(stop_event: threading.Event, interval: float = SESSION_SWEEP_SECONDS) -> None:
+    """Sweeper loop: backfill legacy deadlines once, then close overdue sessions every `interval` seconds."""
+    backfilled = False
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            if not backfilled:
+                count = backfill_deadlines(db)
+                db.commit()
+                backfilled = True
+                if count:
+                    print(f"[SESSIONS] Backfilled deadlines for {count} open sessions")
+            expired = sweep_expired(db)
+            db.commit()
+            publish_expired(expired)
+            if expired:
+                print(f"[SESSIONS] Closed {len(expired)} expired sessions")
+        except Exception as e:
+            db.rollback()
+            print(f"[SESSIONS] Expiry sweep failed: {e}")
+        finally:
+            db.close()
+        stop_event.wait(interval)
+
+
+def start_sweeper() -> Tuple[threading.Thread, threading.Event]:
+    """Run the expiry sweeper in a daemon thread of the API process."""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=sweep, kwargs={"stop_event": stop_event},
+                              name="session-sweeper", daemon=True)
+    thread.start()
+    return thread, stop_event
@@ -0,0 +1,234 @@
+"""
+Candidate hot-path logic shared by the sync routes in main.py and the
+async routes in async_routes.py (which run it through AsyncSession.run_sync).
+Everything here takes a sync Session and raises HTTPException like a route.
+"""
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+# Handle imports for both local development and deployment
+try:
+    from . import models, schemas, auth, question_order, question_cache, session_events, resource_versions
+    from . import shared_cache, sqlite_writer
+except ImportError:
+    import models, schemas, auth, question_order, question_cache, session_events, resource_versions
+    import shared_cache, sqlite_writer
+
+
+# Columns of the session row behind /session/{id}/info (also its version)
+INFO_COLUMNS = (
+    models.TestSession.id,
+    models.TestSession.user_id,
+    models.TestSession.test_id,
+    models.TestSession.start_time,
+    models.TestSession.expires_at,
+    models.TestSession.is_completed,
+)
+
+# Columns needed to serve /session/{id}/question
+QUESTION_COLUMNS = (
+    models.TestSession.id,
+    models.TestSession.user_id,
+    models.TestSession.is_completed,
+    models.TestSession.current_index,
+    models.TestSession.question_set_id,
+    models.TestSession.order_seed,
+    models.TestSession.question_order,
+    models.TestSession.expires_at,
+)
+
+
+def info_tag(session) -> str:
+    return resource_versions.etag("info", session.id, int(session.is_completed),
+                                  session_events.iso_utc(session.expires_at) or "none")
+
+
+# Shared-cache tags of the per-test metadata (dropped by every test-mutating commit)
+TEST_META_TAGS = (resource_versions.TESTS,)
+
+# Columns behind test_meta()
+TEST_META_COLUMNS = (models.Test.duration_minutes, models.Test.deleted_at)
+
+
+def test_meta_key(test_id: int) -> str:
+    return f"test:{test_id}:meta"
+
+
+def test_meta_from_row(row) -> Optional[dict]:
+    if row is None:
+        return None
+    return {"duration_minutes": row.duration_minutes, "deleted": row.deleted_at is not None}
+
+
+def load_test_meta(db: Session, test_id: int) -> Optional[dict]:
+    """test_meta straight from the database (for decisions a stale cache must not make)."""
+    return test_meta_from_row(db.query(*TEST_META_COLUMNS).filter(models.Test.id == test_id).first())
+
+
+def test_meta(db: Session, test_id: int) -> Optional[dict]:
+    """
+    Duration and deleted flag of a test (None if there is no such row), via the shared cache.
+    With the memory backend other workers' entries can lag a delete by up to CACHE_TTL.
+    """
+    return shared_cache.cache.get_or_set(test_meta_key(test_id), lambda: load_test_meta(db, test_id),
+                                         tags=TEST_META_TAGS)
+
+
+def session_info(session, duration_minutes) -> dict:
+    return {
+        "session_id": session.id,
+        "start_time": session_events.iso_utc(session.start_time),
+        "deadline": session_events.iso_utc(session.expires_at),
+        "duration_minutes": duration_minutes or 360,
+        "is_completed": session.is_completed
+    }
+
+
+def _commit(db: Session) -> None:
+    """
+    Commit a write that must stick even if the request then fails. Inside a
+    group-commit batch the writer owns the commit: flush and keep the job's writes.
+    """
+    if sqlite_writer.in_batch(db):
+        db.flush()
+        sqlite_writer.keep_writes(db)
+    else:
+        db.commit()
+
+
+def _close_session(db: Session, session_id: int) -> None:
+    db.query(models.TestSession).filter(models.TestSession.id == session_id).update({"is_completed": True})
+    _commit(db)
+
+
+def ensure_open(db: Session, session) -> None:
+    """Reject completed sessions; close and reject ones past their deadline."""
+    if session.is_completed:
+        raise HTTPException(status_code=400, detail="Test is already completed")
+    if session_events.is_expired(session.expires_at):
+        # Close it now rather than waiting for the next sweep
+        _close_session(db, session.id)
+        raise HTTPException(status_code=400, detail="Time is up")
+
+
+def question_tag(session) -> str:
+    """Same position in the same snapshot = same question."""
+    return resource_versions.etag("q", session.id, session.current_index, session.question_set_id or "legacy")
+
+
+def live_position(db: Session, session, k: int) -> Tuple[int, Optional[dict]]:
+    """
+    First position at or after k whose question still exists, with its
+    payload (None past the end). Snapshots keep the ids of questions deleted
+    after the session started; those positions are skipped.
+    """
+    total = question_order.total_questions(db, session)
+    while k < total:
+        # Serialized question from the in-process cache (one query on miss)
+        question = question_cache.get_question(db, question_order.question_at(db, session, k))
+        if question is not None:
+            return k, question
+        k += 1
+    return total, None
+
+
+def skip_deleted(db: Session, session):
+    """The session row, moved past questions deleted since it started (so its ETag changes too)."""
+    k, _ = live_position(db, session, session.current_index)
+    if k == session.current_index:
+        return session
+    db.query(models.TestSession).filter(
+        models.TestSession.id == session.id,
+        models.TestSession.current_index == session.current_index  # A concurrent submit wins
+    ).update({"current_index": k}, synchronize_session=False)
+    _commit(db)
+    return db.query(*QUESTION_COLUMNS).filter(models.TestSession.id == session.id).first()
+
+
+def current_question(db: Session, session) -> dict:
+    _, question = live_position(db, session, session.current_index)
+    if question is None:
+        # Mark as completed
+        _close_session(db, session.id)
+        raise HTTPException(status_code=200, detail="Test Completed")
+    return question
+
+
+def record_answer(db: Session, session_id: int, answer: schemas.AnswerSubmit,
+                  user: auth.TokenClaims) -> models.TestSession:
+    """Validate and save an answer and advance the session (caller commits)."""
+    # Get session
+    session = db.query(models.TestSession).filter(models.TestSession.id == session_id).first()
+
+    if not session or session.is_completed:
+        raise HTTPException(status_code=400, detail="Invalid session")
+    auth.ensure_owner(user, session.user_id)
+    if session_events.is_expired(session.expires_at):
+        session.is_completed = True
+        _commit(db)
+        raise HTTPException(status_code=400, detail="Time is up")
+
+    index, expected = live_position(db, session, session.current_index)
+
+    if expected is None or answer.question_id != expected["id"]:
+        raise HTTPException(status_code=400, detail="Sync Error. You are answering the wrong question.")
+
+    # Save answer
+    new_response = models.UserResponse(
+        session_id=session.id,
+        question_id=answer.question_id,
+        status=answer.status,
+        explanation=answer.explanation,
+        critical_error=answer.critical_error
+    )
+    db.add(new_response)
+
+    # Move forward (past any deleted questions skipped above)
+    session.current_index = index + 1
+
+    if session.current_index >= question_order.total_questions(db, session):
+        session.is_completed = True
+
+    return session
+
+
+def next_question(db: Session, session: models.TestSession):
+    """Question to show after an answer (None once the session is complete)."""
+    if session.is_completed:
+        return None
+    session.current_index, question = live_position(db, session, session.current_index)
+    if question is None:
+        # Only deleted questions were left
+        session.is_completed = True
+    return question
+
+
+def submit(db: Session, session_id: int, answer: schemas.AnswerSubmit, user: auth.TokenClaims,
+           fetch_next: bool = False) -> dict:
+    """Record an answer (and resolve the next question) as a plain result; caller commits.
+
+    Returns no ORM objects, so it can run on the SQLite writer thread and
+    hand its result back to the request after the batch commit.
+    """
+    session = record_answer(db, session_id, answer, user)
+
+    # Next question resolved before commit, so answer + advance + fetch share one transaction
+    question = next_question(db, session) if fetch_next else None
+
+    return {
+        "session_id": session.id,
+        "next_index": session.current_index,
+        "is_completed": session.is_completed,
+        "question": question,
+        "event": session_events.session_event(
+            session.id, session.start_time, session.expires_at, session.current_index,
+            question_order.total_questions(db, session), session.is_completed
+        ),
+    }
+
+
+def publish_progress(result: dict) -> None:
+    """Push the new position to the candidate's event stream (after commit)."""
+    session_events.hub.publish(result["session_id"], result["event"])
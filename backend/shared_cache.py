@@ -0,0 +1,399 @@
+"""
+Cache for admin and test metadata (test list, active test, per-test
+metadata) shared by every request handler, with a pluggable backend:
+CACHE_BACKEND=memory keeps entries in this process (LRU + TTL), while
+CACHE_BACKEND=redis shares them between all workers through any server
+speaking the Redis protocol (small built-in client, no extra dependency).
+
+Entries are invalidated by tag: every entry remembers the token each of
+its tags had when it was computed, and invalidate() gives the tag a new
+token, so one write drops every entry under it without listing them.
+resource_versions.bump() invalidates the tag of the resource it bumps
+once the transaction commits, which covers every test-mutating endpoint.
+
+get_or_set() is single-flight: when a key is missing (e.g. right after
+the active test changes), one caller computes it while the others wait
+for its result - per process with a lock, and across workers with a
+short lease key on the shared backend. Backend failures never fail a
+request; the value is computed directly instead.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from sqlalchemy import event
+
+# Handle imports for both local development and deployment
+try:
+    from .question_cache import TTLCache
+except ImportError:
+    from question_cache import TTLCache
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()                 # memory | redis
+CACHE_URL = os.getenv("CACHE_URL", "redis://127.0.0.1:6379/0")              # Used by the redis backend
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "autonex:")                        # Namespace for shared keys
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", "2000"))                           # Max entries (memory backend)
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))                             # Seconds (upper bound on staleness)
+CACHE_LOCK_SECONDS = float(os.getenv("CACHE_LOCK_SECONDS", "5"))            # Single-flight lease / max wait
+CACHE_TIMEOUT = float(os.getenv("CACHE_TIMEOUT", "0.5"))                    # Socket timeout (redis backend)
+
+MISSING = object()
+
+_POLL_INTERVAL = 0.02   # Seconds between checks while another worker computes
+_LOG_INTERVAL = 30      # Seconds between repeated backend error logs
+_LOCK_STRIPES = 64
+
+
+class CacheError(Exception):
+    """Error reply from the cache server."""
+
+
+def _token() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+# --- Backends ---
+class MemoryBackend:
+    """Entries in this process only; other workers see changes when their entries expire."""
+    name = "memory"
+    shared = False
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.entries = TTLCache(maxsize, ttl)
+        self.tags = {}  # Tag -> token (a handful of tags, never evicted)
+        self._lock = threading.Lock()
+
+    def fetch(self, key: str, tags: Tuple[str, ...]):
+        """(entry or MISSING, current token of each tag)."""
+        with self._lock:
+            tokens = tuple(self.tags.get(tag) for tag in tags)
+        return self.entries.get(key, MISSING), tokens
+
+    def tag_tokens(self, tags: Tuple[str, ...]) -> Tuple[str, ...]:
+        with self._lock:
+            return tuple(self.tags.setdefault(tag, _token()) for tag in tags)
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                self.tags[tag] = _token()
+
+    def set(self, key: str, entry, ttl: float) -> None:
+        self.entries.set(key, entry, ttl)
+
+    def add(self, key: str, entry, ttl: float) -> bool:
+        return self.entries.add(key, entry, ttl)
+
+    def delete(self, key: str) -> None:
+        self.entries.delete(key)
+
+    def stats(self) -> dict:
+        stats = self.entries.stats()
+        return {"size": stats["size"], "maxsize": stats["maxsize"], "evictions": stats["evictions"]}
+
+
+class _Connection:
+    """One RESP connection (requests are sent as arrays of bulk strings)."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.sock.sendall(b"".join(parts))
+        return self.read()
+
+    def read(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Cache server closed the connection")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise CacheError(rest.decode("utf-8"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Cache server closed the connection")
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self.read() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply from cache server: {line[:50]!r}")
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend:
+    """Entries shared by all workers on a Redis-protocol server (values stored as JSON)."""
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str = CACHE_URL, prefix: str = CACHE_PREFIX, timeout: float = CACHE_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._idle: List[_Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> _Connection:
+        conn = _Connection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                if self.username:
+                    conn.command("AUTH", self.username, self.password)
+                else:
+                    conn.command("AUTH", self.password)
+            if self.db:
+                conn.command("SELECT", self.db)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def call(self, *args):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            reply = conn.command(*args)
+        except CacheError:
+            self._release(conn)  # An error reply leaves the connection usable
+            raise
+        except BaseException:
+            conn.close()
+            raise
+        self._release(conn)
+        return reply
+
+    def _release(self, conn: _Connection) -> None:
+        with self._lock:
+            self._idle.append(conn)
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def fetch(self, key: str, tags: Tuple[str, ...]):
+        # Entry and tag tokens in one round trip
+        replies = self.call("MGET", self.prefix + key, *(self._tag_key(t) for t in tags))
+        raw, tokens = replies[0], tuple(t.decode("utf-8") if t is not None else None for t in replies[1:])
+        return (MISSING if raw is None else json.loads(raw)), tokens
+
+    def tag_tokens(self, tags: Tuple[str, ...]) -> Tuple[str, ...]:
+        if not tags:
+            return ()
+        replies = self.call("MGET", *(self._tag_key(t) for t in tags))
+        if any(reply is None for reply in replies):
+            # First use of a tag: create it unless another worker just did, then re-read
+            for tag, reply in zip(tags, replies):
+                if reply is None:
+                    self.call("SET", self._tag_key(tag), _token(), "NX")
+            replies = self.call("MGET", *(self._tag_key(t) for t in tags))
+        return tuple(reply.decode("utf-8") for reply in replies)
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            self.call("SET", self._tag_key(tag), _token())
+
+    def set(self, key: str, entry, ttl: float) -> None:
+        self.call("SET", self.prefix + key, json.dumps(entry, separators=(",", ":")), "PX", max(1, int(ttl * 1000)))
+
+    def add(self, key: str, entry, ttl: float) -> bool:
+        return self.call("SET", self.prefix + key, json.dumps(entry), "PX", max(1, int(ttl * 1000)), "NX") is not None
+
+    def delete(self, key: str) -> None:
+        self.call("DEL", self.prefix + key)
+
+    def stats(self) -> dict:
+        return {"url": f"redis://{self.host}:{self.port}/{self.db}", "idle_connections": len(self._idle)}
+
+
+def make_backend(name: str = CACHE_BACKEND):
+    if name == "redis":
+        return RedisBackend()
+    if name != "memory":
+        print(f"[CACHE] Unknown CACHE_BACKEND '{name}', using memory")
+    return MemoryBackend()
+
+
+# --- Cache ---
+class SharedCache:
+    """Tagged get/set/get_or_set over a backend; entries are (tag tokens, value)."""
+
+    def __init__(self, backend, ttl: float = CACHE_TTL, lock_seconds: float = CACHE_LOCK_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self._last_error_log = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.computes = 0
+        self.waits = 0
+        self.errors = 0
+
+    def _failed(self, action: str, error: Exception) -> None:
+        self.errors += 1
+        now = time.monotonic()
+        if now - self._last_error_log >= _LOG_INTERVAL:
+            self._last_error_log = now
+            print(f"[CACHE] {self.backend.name} {action} failed ({type(error).__name__}: {error}); serving uncached")
+
+    def _lookup(self, key: str, tags: Tuple[str, ...]):
+        entry, tokens = self.backend.fetch(key, tags)
+        if entry is MISSING or tuple(entry[0]) != tokens:
+            return MISSING
+        return entry[1]
+
+    def get(self, key: str, tags: Tuple[str, ...] = ()):
+        """Cached value, or MISSING (also when it was computed under an older tag token)."""
+        try:
+            value = self._lookup(key, tags)
+        except (OSError, CacheError, ValueError) as e:
+            self._failed("get", e)
+            return MISSING
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def tokens(self, tags: Tuple[str, ...] = ()) -> Optional[Tuple[str, ...]]:
+        """Current tag tokens; read them before computing a value to set() afterwards."""
+        try:
+            return self.backend.tag_tokens(tags)
+        except (OSError, CacheError, ValueError) as e:
+            self._failed("tag read", e)
+            return None
+
+    def set(self, key: str, value, tags: Tuple[str, ...] = (), ttl: float = None,
+            tokens: Tuple[str, ...] = None) -> None:
+        """Store `value`; pass the tokens read before computing it, so a racing invalidation wins."""
+        if tokens is None:
+            tokens = self.tokens(tags)
+            if tokens is None:
+                return
+        try:
+            self.backend.set(key, [list(tokens), value], self.ttl if ttl is None else ttl)
+        except (OSError, CacheError, ValueError, TypeError) as e:
+            self._failed("set", e)
+
+    def get_or_set(self, key: str, compute: Callable, tags: Tuple[str, ...] = (), ttl: float = None):
+        """Cached value of `key`, computed by one caller at a time; None results are not stored.
+        Treat the value as read-only: the memory backend hands out the stored object itself."""
+        value = self.get(key, tags)
+        if value is not MISSING:
+            return value
+        with self._locks[hash(key) % _LOCK_STRIPES]:
+            # Another thread may have filled it while this one waited for the lock
+            try:
+                value = self._lookup(key, tags)
+            except (OSError, CacheError, ValueError) as e:
+                self._failed("get", e)
+                self.computes += 1
+                return compute()
+            if value is not MISSING:
+                self.waits += 1
+                return value
+            tokens = self.tokens(tags)
+            if tokens is None:
+                self.computes += 1
+                return compute()
+            if self.backend.shared:
+                value = self._wait_for_leader(key, tags)
+                if value is not MISSING:
+                    return value
+            self.computes += 1
+            try:
+                value = compute()
+                if value is not None:
+                    self.set(key, value, tags, ttl, tokens)
+            finally:
+                if self.backend.shared:
+                    self._release_lease(key)
+            return value
+
+    def _wait_for_leader(self, key: str, tags: Tuple[str, ...]):
+        """Take the cross-worker lease, or wait for its holder's value (MISSING: compute here)."""
+        lease = f"lock:{key}"
+        try:
+            if self.backend.add(lease, 1, self.lock_seconds):
+                return MISSING
+            deadline = time.monotonic() + self.lock_seconds
+            while time.monotonic() < deadline:
+                time.sleep(_POLL_INTERVAL)
+                value = self._lookup(key, tags)
+                if value is not MISSING:
+                    self.waits += 1
+                    return value
+                if self.backend.add(lease, 1, self.lock_seconds):
+                    return MISSING  # The holder gave up (or had nothing to store)
+        except (OSError, CacheError, ValueError) as e:
+            self._failed("lease", e)
+        return MISSING
+
+    def _release_lease(self, key: str) -> None:
+        try:
+            self.backend.delete(f"lock:{key}")
+        except (OSError, CacheError) as e:
+            self._failed("lease release", e)
+
+    def delete(self, key: str) -> None:
+        try:
+            self.backend.delete(key)
+        except (OSError, CacheError) as e:
+            self._failed("delete", e)
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop every entry stored under any of `tags`."""
+        try:
+            self.backend.invalidate(tags)
+        except (OSError, CacheError) as e:
+            self._failed("invalidate", e)
+
+    def invalidate_on_commit(self, db, *tags: str) -> None:
+        """invalidate(*tags) once `db` commits (readers must not refill from the old rows)."""
+        event.listen(db, "after_commit", lambda session: self.invalidate(*tags), once=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "computes": self.computes,
+            "waits": self.waits,
+            "errors": self.errors,
+            **self.backend.stats(),
+        }
+
+
+cache = SharedCache(make_backend())
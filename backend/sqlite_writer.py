@@ -0,0 +1,235 @@
+"""
+Single-writer queue with group commit for SQLite (SQLITE_WRITER=true).
+SQLite allows one writer at a time, so concurrent answer submits from the
+threadpool only queue up on the database lock (and fail with "database is
+locked" once busy_timeout runs out). Instead, the write jobs are handed to
+one thread that owns a dedicated connection: it drains whatever is queued,
+runs each job in its own SAVEPOINT (a failed job rolls back alone) and
+commits the whole batch once, so N submits cost one fsync instead of N.
+Jobs never commit themselves: code shared with the non-batched path checks
+in_batch() and flushes instead.
+Reads stay on the normal engine, which WAL lets run alongside the writer.
+Each API process has its own writer; busy_timeout covers the rare overlap
+with other processes and with the admin/sweeper writes.
+"""
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+# Handle imports for both local development and deployment
+try:
+    from . import metrics
+    from .database import DATABASE_URL, IS_SQLITE, SQLITE_TUNED, SessionLocal, apply_sqlite_pragmas
+except ImportError:
+    import metrics
+    from database import DATABASE_URL, IS_SQLITE, SQLITE_TUNED, SessionLocal, apply_sqlite_pragmas
+
+SQLITE_WRITER = os.getenv("SQLITE_WRITER", "true").lower() in ("1", "true", "yes")
+SQLITE_GROUP_COMMIT_MAX = int(os.getenv("SQLITE_GROUP_COMMIT_MAX", "64"))             # Jobs per commit
+SQLITE_GROUP_COMMIT_WAIT_MS = float(os.getenv("SQLITE_GROUP_COMMIT_WAIT_MS", "0"))    # Extra wait to fill a batch
+
+# Only meaningful on SQLite; Postgres handles concurrent writers itself
+ENABLED = IS_SQLITE and SQLITE_WRITER
+
+# Session.info flags
+_IN_BATCH = "sqlite_writer.in_batch"
+_KEEP_WRITES = "sqlite_writer.keep_writes"
+
+
+def in_batch(db) -> bool:
+    """Whether `db` is the writer's batch session (the writer commits; jobs only flush)."""
+    return bool(db.info.get(_IN_BATCH))
+
+
+def keep_writes(db) -> None:
+    """Keep the current job's flushed writes even if it goes on to raise (e.g. closing an expired session)."""
+    db.info[_KEEP_WRITES] = True
+
+
+class _Job(NamedTuple):
+    fn: Callable
+    args: tuple
+    future: Future
+    context: contextvars.Context  # The caller's, so per-request metrics see the job's queries
+
+
+def create_writer_engine(url: str = DATABASE_URL):
+    """One connection that takes the write lock up front (BEGIN IMMEDIATE)."""
+    writer_engine = create_engine(url, connect_args={"check_same_thread": False},
+                                  poolclass=StaticPool, echo=False)
+
+    @event.listens_for(writer_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        if SQLITE_TUNED:
+            apply_sqlite_pragmas(dbapi_connection)
+        # Let SQLAlchemy emit BEGIN itself so SAVEPOINTs nest inside the batch transaction
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    metrics.instrument_engine(writer_engine, "sqlite_writer")
+    return writer_engine
+
+
+class GroupCommitWriter:
+    """Runs fn(db, *args) write jobs on one thread, one commit per batch."""
+
+    def __init__(self, writer_engine, max_batch: int = SQLITE_GROUP_COMMIT_MAX,
+                 wait_ms: float = SQLITE_GROUP_COMMIT_WAIT_MS):
+        self.engine = writer_engine
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000
+        self._queue: "queue.Queue[Optional[_Job]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="sqlite-writer", daemon=True)
+        self.batches = 0
+        self.jobs = 0
+        self.largest_batch = 0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Queue a job; the future resolves once its batch is committed."""
+        future = Future()
+        self._queue.put(_Job(fn, args, future, contextvars.copy_context()))
+        return future
+
+    def run(self, fn: Callable, *args):
+        """Blocking submit (for threadpool routes)."""
+        return self.submit(fn, *args).result()
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self.engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "jobs": self.jobs,
+            "largest_batch": self.largest_batch,
+            "avg_batch": round(self.jobs / self.batches, 2) if self.batches else 0,
+        }
+
+    def _next_batch(self) -> Optional[List[_Job]]:
+        job = self._queue.get()
+        if job is None:
+            return None
+        batch = [job]
+        deadline = time.monotonic() + self.wait
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)  # Finish this batch, then stop
+                break
+            batch.append(job)
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._commit(batch)
+
+    @staticmethod
+    def _apply(db, job: _Job):
+        """One job in its own SAVEPOINT (flushed there, so its SQL counts for the caller)."""
+        db.info.pop(_KEEP_WRITES, None)
+        savepoint = db.begin_nested()
+        try:
+            result = job.fn(db, *job.args)
+        except BaseException:
+            if savepoint.is_active:
+                if db.info.pop(_KEEP_WRITES, False):
+                    savepoint.commit()
+                else:
+                    savepoint.rollback()
+            raise
+        if savepoint.is_active:
+            savepoint.commit()
+        return result
+
+    def _commit(self, batch: List[_Job]) -> None:
+        done = []
+        db = SessionLocal(bind=self.engine)
+        db.info[_IN_BATCH] = True
+        try:
+            for job in batch:
+                try:
+                    result = job.context.run(self._apply, db, job)
+                except BaseException as e:
+                    job.future.set_exception(e)
+                    continue
+                done.append((job, result))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            for job in batch:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            print(f"[SQLITE WRITER] Batch of {len(batch)} failed: {e}")
+            return
+        finally:
+            db.close()
+
+        self.batches += 1
+        self.jobs += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for job, result in done:
+            job.future.set_result(result)
+
+
+_writer: Optional[GroupCommitWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> GroupCommitWriter:
+    """The process-wide writer, started on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                writer = GroupCommitWriter(create_writer_engine())
+                writer.start()
+                _writer = writer
+    return _writer
+
+
+def execute_write(db, fn: Callable, *args):
+    """Run fn(db, *args) and commit: via the writer queue, or on `db` when the writer is off."""
+    if ENABLED:
+        return get_writer().run(fn, *args)
+    result = fn(db, *args)
+    db.commit()
+    return result
+
+
+async def execute_write_async(db, fn: Callable, *args):
+    """execute_write for AsyncSession routes (awaits the writer without holding a thread)."""
+    if ENABLED:
+        return await asyncio.wrap_future(get_writer().submit(fn, *args))
+    result = await db.run_sync(fn, *args)
+    await db.commit()
+    return result
+
+
+def shutdown() -> None:
+    global _writer
+    if _writer is not None:
+        _writer.shutdown()
+        _writer = None
@@ -0,0 +1,105 @@
+"""
+Shared fixtures. The app reads its settings at import time, so the
+environment is pointed at a throwaway SQLite database (and the fake
+grader) before any backend module is imported.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix="autonex-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_DB_DIR}/test.db",
+    "AUTH_SECRET": "test-secret",
+    "PASSWORD_WORKERS": "0",
+    "BCRYPT_ROUNDS": "4",
+    "EVAL_BACKEND": "fake",
+    "FAKE_EVAL_LATENCY": "0",
+    "EVAL_WORKER_MODE": "external",
+    "PURGE_WORKER": "false",
+    "CACHE_BACKEND": "memory",
+    "INGEST_SPOOL_DIR": f"{_DB_DIR}/uploads",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend import main, models, database, password_utils, question_cache, question_order  # noqa: E402
+from backend import resource_versions, shared_cache  # noqa: E402
+
+ADMIN = ("admin@example.com", "admin-pw")
+CANDIDATE = ("candidate@example.com", "candidate-pw")
+
+
+def _clear_caches() -> None:
+    question_cache.questions.clear()
+    question_cache.test_index.clear()
+    question_order._set_cache.clear()
+    resource_versions._versions.clear()
+    shared_cache.cache = shared_cache.SharedCache(shared_cache.MemoryBackend())
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def db():
+    """A session on the test database; every table is emptied afterwards."""
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(models.Base.metadata.sorted_tables):
+            session.execute(table.delete())
+        session.commit()
+        session.close()
+        _clear_caches()
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def _login(client, db, credentials, is_admin: bool) -> dict:
+    username, password = credentials
+    user = models.User(username=username, password_hash=password_utils.hash_password(password, 4), is_admin=is_admin)
+    db.add(user)
+    db.commit()
+    token = client.post("/login", json={"username": username, "password": password}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}", "user_id": str(user.id)}
+
+
+@pytest.fixture
+def admin(client, db) -> dict:
+    """Auth headers of a logged-in admin."""
+    headers = _login(client, db, ADMIN, True)
+    headers.pop("user_id")
+    return headers
+
+
+@pytest.fixture
+def candidate(client, db):
+    """(auth headers, user id) of a logged-in candidate."""
+    headers = _login(client, db, CANDIDATE, False)
+    return headers, int(headers.pop("user_id"))
+
+
+def make_test(db, n_questions: int, title: str = "Test", duration_minutes: int = 60):
+    """A test with n questions; returns (test id, question ids)."""
+    test = models.Test(title=title, duration_minutes=duration_minutes)
+    db.add(test)
+    db.flush()
+    questions = [
+        models.Question(test_id=test.id, task_id=str(i), link=f"https://example.com/{i}", description=f"Task {i}",
+                        ideal_status="Pass", ideal_explanation=f"Ideal explanation {i}", ideal_error="None")
+        for i in range(n_questions)
+    ]
+    db.add_all(questions)
+    db.commit()
+    return test.id, [q.id for q in questions]
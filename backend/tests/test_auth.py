@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+import time
+
+import anyio
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from backend import async_database, auth, database
+
+from .conftest import make_test
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _import_auth(**env):
+    environment = {k: v for k, v in os.environ.items() if k not in ("AUTH_SECRET", "AUTH_DEV_MODE")}
+    environment.update(env)
+    return subprocess.run([sys.executable, "-c", "import backend.auth"], cwd=ROOT, env=environment,
+                          capture_output=True, text=True)
+
+
+def test_missing_secret_fails_at_startup():
+    result = _import_auth()
+    assert result.returncode != 0
+    assert "AUTH_SECRET is not set" in result.stderr
+
+
+def test_dev_mode_allows_a_random_secret():
+    result = _import_auth(AUTH_DEV_MODE="true")
+    assert result.returncode == 0, result.stderr
+
+
+def _claims(jti: str) -> auth.TokenClaims:
+    return auth.TokenClaims(1, "someone", False, int(time.time()) + 3600, jti)
+
+
+def test_reload_keeps_revocations_not_yet_visible_in_the_db(db):
+    revocations = auth.RevocationList(refresh=0)
+    revocations.revoke(db, _claims("pending"))  # Not committed yet
+
+    revocations._reload()
+    assert revocations.is_revoked("pending")
+
+    db.commit()
+    other = auth.RevocationList(refresh=0)
+    assert other.is_revoked("pending")
+    assert not other.is_revoked("someone-else")
+
+
+def test_local_revocations_are_dropped_once_expired(db):
+    revocations = auth.RevocationList(session_factory=database.SessionLocal, refresh=0)
+    expired = _claims("old")._replace(expires_at=int(time.time()) - 1)
+    revocations.revoke(db, expired)
+    db.rollback()
+
+    revocations._reload()
+    assert not revocations.is_revoked("old")
+
+
+def test_async_dependency_reloads_revocations_on_the_async_session(db, monkeypatch):
+    token = auth.issue_token(1, "someone", False)
+    revocations = auth.RevocationList(refresh=0)
+    revocations.revoke(db, auth.decode_token(token))
+    db.commit()
+    revocations._local.clear()  # Only the database knows about it now
+    revocations._jtis = frozenset()
+    monkeypatch.setattr(auth, "revocations", revocations)
+    monkeypatch.setattr(revocations, "_reload", lambda: pytest.fail("sync reload on the async path"))
+
+    async def authenticate():
+        async for session in async_database.get_async_db():
+            credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+            return await auth.get_current_user_async(credentials, session)
+
+    try:
+        with pytest.raises(HTTPException) as error:
+            anyio.run(authenticate)
+        assert error.value.detail == "Token revoked"
+    finally:
+        anyio.run(async_database.dispose)
+
+
+def test_query_string_token_only_works_on_download_routes(client, admin, db):
+    token = admin["Authorization"].split()[1]
+    assert client.get("/admin/tests", headers=admin).status_code == 200
+    # URLs end up in access logs and browser history: API routes want the header
+    assert client.get(f"/admin/tests?access_token={token}").status_code == 401
+    assert client.get(f"/admin/cache/stats?access_token={token}").status_code == 401
+
+    test_id, _ = make_test(db, 1)
+    assert client.get(f"/admin/test/{test_id}/export?format=csv&access_token={token}").status_code == 200
+    assert client.get(f"/admin/test/{test_id}/export?format=csv").status_code == 401
@@ -0,0 +1,37 @@
+import threading
+
+import anyio
+
+from backend import database
+
+
+def test_pool_capacity_comes_from_the_configured_sizes():
+    pooled = database._create_engine("postgresql+psycopg2://user:pw@localhost/db", 3, 4, "tests")
+    try:
+        assert database.pool_capacity(pooled) == 7
+        assert database.pool_capacity(database.engine) is None  # SQLite: unbounded
+    finally:
+        database._pool_capacities.pop(pooled, None)
+        pooled.dispose()
+
+
+class _RecordingSession:
+    def __init__(self, **kwargs):
+        self.closed_on = None
+
+    def close(self):
+        self.closed_on = threading.current_thread()
+
+
+def test_get_db_closes_the_session_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(database, "SessionLocal", _RecordingSession)
+
+    async def use(dependency):
+        generator = dependency()
+        session = await generator.__anext__()
+        await generator.aclose()
+        return session, threading.current_thread()
+
+    for dependency in (database.get_db, database.get_read_db):
+        session, loop_thread = anyio.run(use, dependency)
+        assert session.closed_on is not None and session.closed_on is not loop_thread
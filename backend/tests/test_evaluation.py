@@ -0,0 +1,252 @@
+import json
+
+import pytest
+
+from backend import eval_cache, models
+from backend.ai_agent import Completion, EvaluationError, FakeBackend, parse_batch_evaluation, pregrade_answer
+from backend.evaluation import (CACHED, ERROR, GRADED, PREGRADED, AnswerSnapshot, EvaluationEngine, QuestionSnapshot,
+                                evaluate_batch_with_retry)
+
+from .conftest import make_test
+
+
+class FlakyBackend(FakeBackend):
+    """Fake grader that can be switched into a hard outage."""
+
+    def __init__(self):
+        super().__init__(latency=0, failure_rate=0)
+        self.down = False
+
+    def complete(self, prompt, max_tokens, json_mode=False):
+        if self.down:
+            raise EvaluationError("AI Evaluation unavailable")
+        return super().complete(prompt, max_tokens, json_mode)
+
+
+def _answered_test(db, n_sessions: int = 3, n_questions: int = 2) -> int:
+    test_id, question_ids = make_test(db, n_questions)
+    for s in range(n_sessions):
+        session = models.TestSession(test_id=test_id)
+        db.add(session)
+        db.flush()
+        db.add_all([
+            models.UserResponse(session_id=session.id, question_id=q, status="Pass",
+                                explanation=f"Answer {s}-{q}", critical_error="None")
+            for q in question_ids
+        ])
+    db.commit()
+    return test_id
+
+
+def _engine(backend) -> EvaluationEngine:
+    return EvaluationEngine(backend=backend, use_cache=False, max_retries=0, base_delay=0)
+
+
+def test_failed_grades_stay_pending_and_are_retried(db):
+    test_id = _answered_test(db)
+    backend = FlakyBackend()
+    backend.down = True
+
+    summary = _engine(backend).evaluate_test(test_id)
+    assert summary[ERROR] == 6
+    db.expire_all()
+    responses = db.query(models.UserResponse).all()
+    assert all(r.ai_score is None for r in responses)
+    assert all(r.ai_feedback for r in responses)
+    # Errors are not graded zeros in the aggregates
+    assert sum(s.graded_count for s in db.query(models.SessionScore)) == 0
+    assert db.query(models.EvaluationRecord).filter(models.EvaluationRecord.outcome == ERROR).count() == 6
+
+    backend.down = False
+    summary = _engine(backend).evaluate_test(test_id)
+    assert summary["evaluated"] == 6 and summary[ERROR] == 0
+    db.expire_all()
+    assert all(r.ai_score is not None for r in db.query(models.UserResponse))
+    assert sum(s.graded_count for s in db.query(models.SessionScore)) == 6
+
+
+def test_error_does_not_overwrite_an_existing_grade(db):
+    test_id = _answered_test(db, n_sessions=1, n_questions=1)
+    backend = FlakyBackend()
+    _engine(backend).evaluate_test(test_id)
+    db.expire_all()
+    graded = db.query(models.UserResponse).one()
+    score, feedback = graded.ai_score, graded.ai_feedback
+
+    backend.down = True
+    _engine(backend).evaluate_session(graded.session_id)
+    db.expire_all()
+    regraded = db.query(models.UserResponse).one()
+    assert (regraded.ai_score, regraded.ai_feedback) == (score, feedback)
+    assert db.query(models.SessionScore).one().graded_count == 1
+
+
+def test_unexpected_batch_failure_is_an_error_not_a_fallback():
+    question = QuestionSnapshot(1, "Pass", "ideal", "None")
+    answers = [AnswerSnapshot(i, "Pass", f"answer {i}", "None") for i in range(3)]
+
+    def broken(question, answers):
+        raise RuntimeError("client bug")
+
+    results = evaluate_batch_with_retry(broken, question, answers, max_retries=0, base_delay=0)
+    assert [r.outcome for r in results] == [ERROR] * 3
+    assert all(r.error_type == "RuntimeError" for r in results)
+
+
+class RacingBackend(FakeBackend):
+    """Lets another evaluation run grade everything while this run's first request is in flight."""
+
+    def __init__(self, test_id: int):
+        super().__init__(latency=0, failure_rate=0)
+        self.test_id = test_id
+        self.raced = False
+
+    def complete(self, prompt, max_tokens, json_mode=False):
+        if not self.raced:
+            self.raced = True
+            _engine(FakeBackend(latency=0, failure_rate=0)).evaluate_test(self.test_id)
+        return super().complete(prompt, max_tokens, json_mode)
+
+
+def test_overlapping_runs_count_each_grade_once(db):
+    test_id = _answered_test(db, n_sessions=2, n_questions=1)
+    _engine(RacingBackend(test_id)).evaluate_test(test_id)
+
+    db.expire_all()
+    assert all(r.ai_score is not None for r in db.query(models.UserResponse))
+    assert sum(s.graded_count for s in db.query(models.SessionScore)) == 2
+    assert db.query(models.QuestionStat).one().graded_count == 2
+
+
+# ============== BATCH REPLY PARSING ============== #
+
+def test_parse_batch_reply_in_json():
+    reply = json.dumps({"results": [{"answer": 2, "score": 40, "feedback": "Half right"},
+                                    {"answer": 1, "score": "85", "feedback": " Good "}]})
+    assert parse_batch_evaluation(reply, 2) == [(85, "Good"), (40, "Half right")]
+
+
+def test_parse_batch_reply_in_fences_and_prose():
+    reply = 'Here you go:\n```json\n[{"score": 70}, {"score": 250, "feedback": "Perfect"}]\n```'
+    # Positions stand in for missing numbers; scores are clamped to 0-100
+    assert parse_batch_evaluation(reply, 2) == [(70, "Evaluated"), (100, "Perfect")]
+
+
+def test_parse_partial_batch_reply_leaves_gaps():
+    reply = json.dumps({"results": [
+        {"answer": 1, "score": 90, "feedback": "ok"},
+        {"answer": 3, "score": "n/a", "feedback": "no score"},  # Unusable score
+        {"answer": 9, "score": 50, "feedback": "out of range"},  # No such answer
+        "not an object",
+    ]})
+    assert parse_batch_evaluation(reply, 3) == [(90, "ok"), None, None]
+
+
+def test_parse_batch_reply_in_text_format():
+    reply = ("ANSWER 2\nSCORE: 60\nFEEDBACK: Missed the error\n\n"
+             "Answer 1\nSCORE: 95\nFEEDBACK: Spot on\n"
+             "ANSWER 3\nNo idea")
+    assert parse_batch_evaluation(reply, 3) == [(95, "Spot on"), (60, "Missed the error"), None]
+
+
+@pytest.mark.parametrize("reply", ["", "I cannot grade these answers.", "{not json", '{"results": "none"}', None])
+def test_parse_garbled_batch_reply(reply):
+    assert parse_batch_evaluation(reply, 2) == [None, None]
+
+
+class PartialBackend(FakeBackend):
+    """Batch replies drop the last answer; single-answer replies are normal."""
+
+    def complete(self, prompt, max_tokens, json_mode=False):
+        completion = super().complete(prompt, max_tokens, json_mode)
+        if not json_mode:
+            return completion
+        data = json.loads(completion.text)
+        data["results"] = data["results"][:-1]
+        return Completion(json.dumps(data), completion.model, completion.prompt_tokens, completion.completion_tokens)
+
+
+def test_answers_missing_from_a_batch_reply_are_graded_singly(db):
+    test_id = _answered_test(db, n_sessions=3, n_questions=1)
+    engine = EvaluationEngine(backend=PartialBackend(latency=0, failure_rate=0), use_cache=False,
+                              max_retries=0, base_delay=0, batch_size=3)
+
+    summary = engine.evaluate_test(test_id)
+    assert summary["evaluated"] == 3 and summary[ERROR] == 0
+    db.expire_all()
+    assert all(r.ai_score is not None for r in db.query(models.UserResponse))
+    records = db.query(models.EvaluationRecord).order_by(models.EvaluationRecord.response_id).all()
+    assert [r.outcome for r in records] == [GRADED] * 3
+    assert sorted(r.batch_size for r in records) == [1, 3, 3]
+
+
+# ============== PRE-GRADING AND CACHE ============== #
+
+@pytest.mark.parametrize("ideal, given, expected", [
+    ("Pass", "Failed", 0),            # Recognised statuses that disagree
+    ("Success", "  ", 0),             # No status submitted
+    (None, "Pass", 0),                # No ideal answer yet
+    ("Pass", "passed", None),         # Synonyms agree: the LLM grades the explanation
+    ("Pass", "Partially ok", None),   # Unrecognised wording is left to the LLM
+])
+def test_pregrade_decides_only_rule_cases(ideal, given, expected):
+    result = pregrade_answer(AnswerSnapshot(1, given, "why", "None"), QuestionSnapshot(1, ideal, "ideal", "None"))
+    assert (result[0] if result else None) == expected
+
+
+def test_cache_key_ignores_whitespace_and_case_only():
+    question = QuestionSnapshot(1, "Pass", "ideal", "None")
+    key = eval_cache.cache_key(AnswerSnapshot(1, "Pass", "The  link works", "None"), question, "fake")
+    assert key == eval_cache.cache_key(AnswerSnapshot(2, "pass ", "the link WORKS", "none"), question, "fake")
+    assert key != eval_cache.cache_key(AnswerSnapshot(1, "Pass", "The link is broken", "None"), question, "fake")
+    assert key != eval_cache.cache_key(AnswerSnapshot(1, "Pass", "The  link works", "None"), question, "openai")
+
+
+class CountingBackend(FakeBackend):
+    def __init__(self):
+        super().__init__(latency=0, failure_rate=0)
+        self.requests = 0
+
+    def complete(self, prompt, max_tokens, json_mode=False):
+        self.requests += 1
+        return super().complete(prompt, max_tokens, json_mode)
+
+
+def test_identical_answers_are_graded_once_and_then_cached(db):
+    test_id, question_ids = make_test(db, 1)
+    sessions = []
+    for explanation, status in (("Same answer", "Pass"), ("same  ANSWER", "pass"), ("Other", "Fail")):
+        session = models.TestSession(test_id=test_id)
+        db.add(session)
+        db.flush()
+        db.add(models.UserResponse(session_id=session.id, question_id=question_ids[0], status=status,
+                                   explanation=explanation, critical_error="None"))
+        sessions.append(session.id)
+    db.commit()
+
+    backend = CountingBackend()
+    engine = EvaluationEngine(backend=backend, use_cache=True, max_retries=0, base_delay=0)
+    summary = engine.evaluate_test(test_id)
+    assert (summary[GRADED], summary[PREGRADED], backend.requests) == (2, 1, 1)
+
+    # A new session with the same answer is served from the cache
+    session = models.TestSession(test_id=test_id)
+    db.add(session)
+    db.flush()
+    db.add(models.UserResponse(session_id=session.id, question_id=question_ids[0], status="Pass",
+                               explanation="Same answer", critical_error="None"))
+    db.commit()
+    summary = engine.evaluate_session(session.id)
+    assert (summary[CACHED], backend.requests) == (1, 1)
+
+    db.expire_all()
+    scores = {r.session_id: r.ai_score for r in db.query(models.UserResponse)}
+    assert scores[sessions[0]] == scores[sessions[1]] == scores[session.id]
+
+
+def test_errors_are_not_cached(db):
+    test_id = _answered_test(db, n_sessions=1, n_questions=1)
+    backend = FlakyBackend()
+    backend.down = True
+    EvaluationEngine(backend=backend, use_cache=True, max_retries=0, base_delay=0).evaluate_test(test_id)
+    assert db.query(models.EvaluationCacheEntry).count() == 0
@@ -0,0 +1,85 @@
+import io
+
+import pytest
+
+from backend import database, ingest, models, question_order
+
+from .conftest import make_test
+
+
+def _csv(n_rows: int, blank_rows=()) -> bytes:
+    lines = ["task_id,link,ideal_status"]
+    lines += [f"t{i},{'' if i in blank_rows else f'https://example.com/{i}'},Pass" for i in range(n_rows)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _queued_job(db, test_id: int, data: bytes) -> models.IngestJob:
+    return ingest.create_job(db, test_id, io.BytesIO(data), "questions.csv")
+
+
+def _run(job_id: int) -> None:
+    ingest.run_job(job_id, "Instructions", session_factory=database.SessionLocal, chunk_rows=3)
+
+
+def test_interrupted_upload_resumes_after_rows_parsed(db, monkeypatch):
+    test_id, _ = make_test(db, 0)
+    job = _queued_job(db, test_id, _csv(10, blank_rows={4, 8}))
+
+    # The third chunk's insert dies: the first two chunks stay committed
+    real_insert, calls = ingest.insert_records, []
+
+    def crash_on_third_chunk(session, records, *args, **kwargs):
+        calls.append(len(records))
+        if len(calls) == 3:
+            raise RuntimeError("worker killed")
+        return real_insert(session, records, *args, **kwargs)
+
+    monkeypatch.setattr(ingest, "insert_records", crash_on_third_chunk)
+    _run(job.id)
+    db.expire_all()
+    assert (job.status, job.rows_parsed, job.rows_inserted, job.rows_rejected) == ("failed", 6, 5, 1)
+    assert [c["chunk"] for c in job.chunks] == [1, 2]
+
+    monkeypatch.setattr(ingest, "insert_records", real_insert)
+    ingest.mark_resumable(db, job)
+    _run(job.id)
+    db.expire_all()
+
+    assert (job.status, job.rows_parsed, job.rows_inserted, job.rows_rejected) == ("done", 10, 8, 2)
+    task_ids = [q.task_id for q in db.query(models.Question).filter(models.Question.test_id == test_id)]
+    assert sorted(task_ids) == sorted(f"t{i}" for i in range(10) if i not in (4, 8))
+    # Spreadsheet rows (header is row 1) of the blank links, each reported once
+    rejected = db.query(models.IngestRejectedRow.row).filter(models.IngestRejectedRow.job_id == job.id)
+    assert sorted(row for (row,) in rejected) == [6, 10]
+
+    report = ingest.job_to_dict(job)
+    assert [c["first_row"] for c in report["chunks"]] == [2, 5, 8, 11]
+    assert sum(c["rows"] for c in report["chunks"]) == 10
+    assert all(c["parse_ms"] >= 0 and c["insert_ms"] >= 0 for c in report["chunks"])
+
+
+def test_rollback_is_refused_once_a_session_snapshot_holds_the_questions(db):
+    test_id, _ = make_test(db, 0)
+    job = _queued_job(db, test_id, _csv(4))
+    _run(job.id)
+
+    # A candidate started the test but has not answered anything yet
+    snapshot = question_order.snapshot_for_test(db, test_id)
+    db.add(models.TestSession(test_id=test_id, question_set_id=snapshot.id))
+    db.commit()
+
+    db.expire_all()
+    with pytest.raises(ingest.IngestError):
+        ingest.rollback_job(db, job)
+    assert db.query(models.Question).filter(models.Question.ingest_job_id == job.id).count() == 4
+
+
+def test_rollback_removes_an_unused_upload(db):
+    test_id, _ = make_test(db, 2)
+    job = _queued_job(db, test_id, _csv(4))
+    _run(job.id)
+
+    db.expire_all()
+    assert ingest.rollback_job(db, job) == 4
+    assert job.status == "rolled_back"
+    assert db.query(models.Question).filter(models.Question.test_id == test_id).count() == 2
@@ -0,0 +1,70 @@
+import pytest
+
+from backend import models, pagination
+
+from .conftest import make_test
+
+
+def _walk(fetch, limit: int):
+    """Rows of every page, following cursors until the last page."""
+    pages, cursor = [], None
+    while True:
+        rows, cursor = fetch(cursor, limit)
+        pages.append(rows)
+        if cursor is None:
+            return pages
+
+
+def test_keyset_page_walks_every_row_once(db):
+    _, question_ids = make_test(db, 7)
+    query = db.query(models.Question.id)
+
+    pages = _walk(lambda cursor, limit: pagination.keyset_page(query, models.Question.id, cursor, limit), 3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [row.id for page in pages for row in page] == sorted(question_ids)
+
+
+def test_keyset_page_exact_multiple_has_no_empty_last_page(db):
+    _, question_ids = make_test(db, 6)
+    query = db.query(models.Question.id)
+
+    pages = _walk(lambda cursor, limit: pagination.keyset_page(query, models.Question.id, cursor, limit), 3)
+    assert [len(page) for page in pages] == [3, 3]
+
+    rows, cursor = pagination.keyset_page(query, models.Question.id, pagination.encode_cursor(max(question_ids)), 3)
+    assert rows == [] and cursor is None
+
+
+def test_ranked_page_breaks_score_ties_by_key(db):
+    test_id, _ = make_test(db, 0)
+    scores = {1: 7.0, 2: 9.0, 3: 7.0, 4: 7.0, 5: None, 6: 9.0, 7: 3.0}
+    db.add_all([models.SessionScore(session_id=s, test_id=test_id, avg_score=score) for s, score in scores.items()])
+    db.commit()
+    query = db.query(models.SessionScore.session_id, models.SessionScore.avg_score)
+
+    def fetch(cursor, limit):
+        return pagination.ranked_page(query, models.SessionScore.avg_score, models.SessionScore.session_id,
+                                      cursor, limit)
+
+    # A page boundary falls inside the run of tied 7.0 scores; NULL scores are left out
+    pages = _walk(fetch, 2)
+    assert [[row.session_id for row in page] for page in pages] == [[2, 6], [1, 3], [4, 7]]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", pagination.encode_cursor("7"), pagination.encode_cursor(None)])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(pagination.PaginationError):
+        pagination.decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("after", [7, [1.0], [1.0, "2"]])
+def test_bad_ranked_cursors_are_rejected(after):
+    with pytest.raises(pagination.PaginationError):
+        pagination.decode_ranked_cursor(pagination.encode_cursor(after))
+
+
+def test_limit_is_bounded():
+    assert pagination.page_size(None) == pagination.ADMIN_PAGE_SIZE
+    assert pagination.page_size(10 ** 6) == pagination.ADMIN_MAX_PAGE_SIZE
+    with pytest.raises(pagination.PaginationError):
+        pagination.page_size(0)
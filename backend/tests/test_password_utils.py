@@ -0,0 +1,99 @@
+import time
+from concurrent.futures import Future
+
+import anyio
+import pytest
+
+from backend import models, password_utils
+
+
+def test_outdated_cost_factor_is_rehashed_on_success():
+    old = password_utils.hash_password("secret", 4)
+    valid, new_hash = password_utils.check_and_upgrade("secret", old, rounds=5)
+    assert valid and password_utils.hash_rounds(new_hash) == 5
+    assert password_utils.verify_password("secret", new_hash)
+
+    assert password_utils.check_and_upgrade("secret", new_hash, rounds=5) == (True, None)
+    assert password_utils.check_and_upgrade("wrong", old, rounds=5) == (False, None)
+    assert password_utils.check_and_upgrade("secret", "not-a-hash", rounds=5) == (False, None)
+
+
+def test_pool_rejects_beyond_max_pending_and_frees_slots(monkeypatch):
+    pool = password_utils.PasswordPool(workers=1, max_pending=2, rounds=4)
+    pending = [Future(), Future()]
+
+    class Executor:
+        def submit(self, *args):
+            return pending.pop(0)
+
+    monkeypatch.setattr(pool, "_get_executor", lambda: Executor())
+    first, second = pool.submit("a", "h"), pool.submit("b", "h")
+    with pytest.raises(password_utils.PasswordPoolSaturated):
+        pool.submit("c", "h")
+    assert pool.stats()["rejected"] == 1
+
+    first.set_result((True, None))  # A finished verification gives its slot back
+    pending.append(Future())
+    pool.submit("c", "h")
+    second.set_result((False, None))
+
+
+def test_verify_runs_in_worker_processes():
+    pool = password_utils.PasswordPool(workers=1, max_pending=4, rounds=4)
+    hashed = password_utils.hash_password("secret", 4)
+    try:
+        pool.start()
+        assert anyio.run(pool.verify, "secret", hashed) == (True, None)
+        assert anyio.run(pool.verify, "wrong", hashed) == (False, None)
+        assert anyio.run(pool.verify, "secret", "") == (False, None)
+    finally:
+        pool.shutdown()
+
+
+def test_saturated_pool_is_a_503_on_login(client, db, monkeypatch):
+    db.add(models.User(username="someone", password_hash=password_utils.hash_password("secret", 4)))
+    db.commit()
+    pool = password_utils.PasswordPool(workers=0, max_pending=1, rounds=4)
+    monkeypatch.setattr(password_utils, "pool", pool)
+    assert pool._slots.acquire(blocking=False)  # Another login holds the only slot
+
+    response = client.post("/login", json={"username": "someone", "password": "secret"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    pool._slots.release()
+    assert client.post("/login", json={"username": "someone", "password": "secret"}).status_code == 200
+
+
+def test_in_process_verify_keeps_the_event_loop_responsive(monkeypatch):
+    pool = password_utils.PasswordPool(workers=0, max_pending=1, rounds=4)
+    hashed = password_utils.hash_password("secret", 4)
+
+    slot_free_during_check = []
+
+    def slow_check(password, hashed, rounds):
+        slot_free_during_check.append(pool._slots.acquire(blocking=False))
+        time.sleep(0.3)  # A cost-12 bcrypt check
+        return True, None
+
+    monkeypatch.setattr(password_utils, "check_and_upgrade", slow_check)
+
+    async def login_while_ticking():
+        ticks = 0
+        done = anyio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not done.is_set():
+                ticks += 1
+                await anyio.sleep(0.01)
+
+        async with anyio.create_task_group() as tasks:
+            tasks.start_soon(ticker)
+            assert await pool.verify("secret", hashed) == (True, None)
+            done.set()
+        return ticks
+
+    assert anyio.run(login_while_ticking) >= 10
+    assert slot_free_during_check == [False]  # The slot is held for the whole check
+    assert pool._slots.acquire(blocking=False)  # Released afterwards
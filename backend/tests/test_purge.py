@@ -0,0 +1,109 @@
+import threading
+
+from backend import models, purge
+
+from .conftest import make_test
+
+
+def _answer(question_id: int) -> dict:
+    return {"question_id": question_id, "status": "Pass", "explanation": "Looks right", "critical_error": "None"}
+
+
+def _start(client, headers, user_id: int, test_id: int) -> int:
+    response = client.post(f"/start-test/{test_id}/{user_id}", headers=headers)
+    assert response.status_code == 200
+    return response.json()["session_id"]
+
+
+def test_question_deleted_mid_session_is_skipped(client, db, admin, candidate):
+    headers, user_id = candidate
+    test_id, question_ids = make_test(db, 4)
+    session_id = _start(client, headers, user_id, test_id)
+
+    first = client.get(f"/session/{session_id}/question", headers=headers).json()
+    second = client.post(f"/session/{session_id}/submit-next", json=_answer(first["id"]), headers=headers).json()["question"]
+
+    # The admin deletes the question the candidate is looking at
+    assert client.delete(f"/admin/question/{second['id']}", headers=admin).status_code == 200
+    purge.work(threading.Event(), once=True)
+
+    current = client.get(f"/session/{session_id}/question", headers=headers)
+    assert current.status_code == 200
+    assert current.json()["id"] not in (first["id"], second["id"])
+    # Answering the deleted question is a sync error, not a stuck session
+    stale = client.post(f"/session/{session_id}/submit", json=_answer(second["id"]), headers=headers)
+    assert stale.status_code == 400
+
+    seen = {first["id"], current.json()["id"]}
+    result = client.post(f"/session/{session_id}/submit-next", json=_answer(current.json()["id"]), headers=headers).json()
+    while not result["is_completed"]:
+        assert result["question"] is not None
+        seen.add(result["question"]["id"])
+        result = client.post(f"/session/{session_id}/submit-next", json=_answer(result["question"]["id"]),
+                             headers=headers).json()
+    assert seen == set(question_ids) - {second["id"]}
+
+
+def test_trailing_deleted_questions_complete_the_session(client, db, admin, candidate):
+    headers, user_id = candidate
+    test_id, question_ids = make_test(db, 3)
+    session_id = _start(client, headers, user_id, test_id)
+
+    first = client.get(f"/session/{session_id}/question", headers=headers).json()
+    for question_id in question_ids:
+        if question_id != first["id"]:
+            assert client.delete(f"/admin/question/{question_id}", headers=admin).status_code == 200
+
+    result = client.post(f"/session/{session_id}/submit-next", json=_answer(first["id"]), headers=headers).json()
+    assert result["is_completed"] is True
+    assert result["question"] is None
+
+
+def test_test_purge_with_open_session(client, db, admin, candidate):
+    headers, user_id = candidate
+    test_id, _ = make_test(db, 3, title="Deleted")
+    other_id, other_questions = make_test(db, 2, title="Kept")
+    session_id = _start(client, headers, user_id, test_id)
+    other_session = _start(client, headers, user_id, other_id)
+    question = client.get(f"/session/{session_id}/question", headers=headers).json()
+    client.post(f"/session/{session_id}/submit", json=_answer(question["id"]), headers=headers)
+
+    job = client.delete(f"/admin/test/{test_id}", headers=admin).json()
+    assert client.post(f"/start-test/{test_id}/{user_id}", headers=headers).status_code == 404
+
+    purge.run_job(purge.claim_next_job(db, "test-worker"), chunk_rows=1, pause_ms=0)
+    status = client.get(f"/admin/purge/{job['job_id']}", headers=admin).json()
+    assert status["status"] == purge.DONE
+    assert status["deleted"]["test_sessions"] == 1
+    assert status["deleted"]["questions"] == 3
+
+    db.expire_all()
+    assert db.query(models.Test).filter(models.Test.id == test_id).count() == 0
+    assert db.query(models.TestSession).filter(models.TestSession.test_id == test_id).count() == 0
+    assert db.query(models.UserResponse).filter(models.UserResponse.session_id == session_id).count() == 0
+    # The other test and its session are untouched
+    assert db.query(models.Question).filter(models.Question.test_id == other_id).count() == len(other_questions)
+    assert client.get(f"/session/{other_session}/question", headers=headers).status_code == 200
+
+
+def test_question_purge_removes_answers_saved_after_their_stage(db):
+    test_id, question_ids = make_test(db, 2)
+    session = models.TestSession(user_id=None, test_id=test_id)
+    db.add(session)
+    db.commit()
+    question = db.get(models.Question, question_ids[0])
+    purge.delete_question(db, question)
+    db.commit()
+
+    for stage in purge.QUESTION_STAGES:
+        while purge.delete_chunk(db, stage, question.id):
+            pass
+    # An answer from a worker still serving the question from its cache
+    db.add(models.UserResponse(session_id=session.id, question_id=question.id, status="Pass",
+                               explanation="late", critical_error="None"))
+    db.flush()
+    purge.FINISHERS[purge.QUESTION](db, question.id)
+    db.commit()
+
+    assert db.query(models.Question).filter(models.Question.id == question.id).count() == 0
+    assert db.query(models.UserResponse).filter(models.UserResponse.question_id == question.id).count() == 0
@@ -0,0 +1,44 @@
+import pytest
+
+from backend import models, question_order
+
+from .conftest import make_test
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 4, 5, 7, 8, 16, 17, 100, 257])
+def test_permuted_index_is_a_bijection(n):
+    for seed in (0, 1, 12345, question_order.new_seed()):
+        assert sorted(question_order.permuted_index(k, n, seed) for k in range(n)) == list(range(n))
+
+
+def test_permuted_index_is_stable_per_seed_and_differs_between_seeds():
+    n = 50
+    first = [question_order.permuted_index(k, n, 7) for k in range(n)]
+    assert first == [question_order.permuted_index(k, n, 7) for k in range(n)]
+    assert first != [question_order.permuted_index(k, n, 8) for k in range(n)]
+
+
+def test_sessions_share_a_snapshot_but_not_an_order(db):
+    test_id, question_ids = make_test(db, 20)
+    snapshot = question_order.snapshot_for_test(db, test_id)
+    assert question_order.snapshot_for_test(db, test_id).id == snapshot.id  # Same bank, same snapshot
+
+    orders = []
+    for seed in (1, 2):
+        session = models.TestSession(test_id=test_id, question_set_id=snapshot.id, order_seed=seed)
+        orders.append([question_order.question_at(db, session, k) for k in range(len(question_ids))])
+        assert question_order.question_at(db, session, len(question_ids)) is None
+    assert sorted(orders[0]) == sorted(orders[1]) == sorted(question_ids)
+    assert orders[0] != orders[1]
+
+
+def test_migrated_legacy_session_keeps_its_exact_order(db):
+    test_id, question_ids = make_test(db, 5)
+    order = list(reversed(question_ids))
+    db.add(models.TestSession(test_id=test_id, question_order=order, current_index=2))
+    db.commit()
+
+    assert question_order.migrate_legacy_sessions(db) == 1
+    session = db.query(models.TestSession).one()
+    assert session.question_order is None and session.order_seed is None
+    assert [question_order.question_at(db, session, k) for k in range(5)] == order
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+
+from backend import models, session_flow, shared_cache
+
+from .conftest import make_test
+
+
+def test_start_ignores_a_stale_cached_deleted_flag(client, db, candidate):
+    headers, user_id = candidate
+    test_id, _ = make_test(db, 2)
+    assert session_flow.test_meta(db, test_id)["deleted"] is False
+
+    # Deleted by another worker: this process's memory cache never heard of it
+    db.query(models.Test).filter(models.Test.id == test_id).update({"deleted_at": datetime.now(timezone.utc)})
+    db.commit()
+    assert session_flow.test_meta(db, test_id)["deleted"] is False
+
+    assert client.post(f"/start-test/{test_id}/{user_id}", headers=headers).status_code == 404
+    assert db.query(models.TestSession).count() == 0
+
+
+def test_tagged_entries_drop_on_commit(db):
+    test_id, _ = make_test(db, 1, duration_minutes=30)
+    assert session_flow.test_meta(db, test_id)["duration_minutes"] == 30
+
+    db.query(models.Test).filter(models.Test.id == test_id).update({"duration_minutes": 45})
+    shared_cache.cache.invalidate_on_commit(db, *session_flow.TEST_META_TAGS)
+    assert session_flow.test_meta(db, test_id)["duration_minutes"] == 30  # Not committed yet
+    db.commit()
+    assert session_flow.test_meta(db, test_id)["duration_minutes"] == 45
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from backend import auth, models, question_order, schemas, session_flow, sqlite_writer
+
+from .conftest import make_test
+
+ADMIN = auth.TokenClaims(0, "admin", True, 0, "test")
+
+
+def _session(db, test_id: int, expires_at: datetime) -> int:
+    snapshot = question_order.snapshot_for_test(db, test_id)
+    session = models.TestSession(test_id=test_id, question_set_id=snapshot.id, expires_at=expires_at)
+    db.add(session)
+    db.commit()
+    return session.id
+
+
+def _answer(question_id: int) -> schemas.AnswerSubmit:
+    return schemas.AnswerSubmit(question_id=question_id, status="Pass", explanation="ok", critical_error="None")
+
+
+@pytest.fixture
+def writer():
+    writer = sqlite_writer.GroupCommitWriter(sqlite_writer.create_writer_engine())
+    commits = []
+    event.listen(writer.engine, "commit", lambda conn: commits.append(conn))
+    yield writer, commits
+    writer.engine.dispose()
+
+
+def test_expired_session_closes_inside_the_batch_commit(db, writer):
+    writer, commits = writer
+    test_id, question_ids = make_test(db, 2)
+    now = datetime.now(timezone.utc)
+    expired = _session(db, test_id, now - timedelta(hours=1))
+    live = _session(db, test_id, now + timedelta(hours=1))
+    first_live = session_flow.current_question(db, db.get(models.TestSession, live))["id"]
+
+    timed_out = writer.submit(session_flow.submit, expired, _answer(question_ids[0]), ADMIN)
+    answered = writer.submit(session_flow.submit, live, _answer(first_live), ADMIN, True)
+    writer._commit(writer._next_batch())
+
+    with pytest.raises(HTTPException) as error:
+        timed_out.result()
+    assert error.value.detail == "Time is up"
+    assert answered.result()["next_index"] == 1
+    assert len(commits) == 1  # The writer's batch commit only
+
+    db.expire_all()
+    assert db.get(models.TestSession, expired).is_completed is True
+    assert db.query(models.UserResponse).filter(models.UserResponse.session_id == live).count() == 1
+    assert db.query(models.UserResponse).filter(models.UserResponse.session_id == expired).count() == 0
+
+
+def test_failed_job_rolls_back_alone(db, writer):
+    writer, _ = writer
+    test_id, question_ids = make_test(db, 2)
+    live = _session(db, test_id, datetime.now(timezone.utc) + timedelta(hours=1))
+    first = session_flow.current_question(db, db.get(models.TestSession, live))["id"]
+    wrong = next(q for q in question_ids if q != first)
+
+    out_of_sync = writer.submit(session_flow.submit, live, _answer(wrong), ADMIN)
+    answered = writer.submit(session_flow.submit, live, _answer(first), ADMIN)
+    writer._commit(writer._next_batch())
+
+    with pytest.raises(HTTPException):
+        out_of_sync.result()
+    assert answered.result()["next_index"] == 1
+    db.expire_all()
+    assert [r.question_id for r in db.query(models.UserResponse)] == [first]
@@ -12,10 +12,6 @@ const api = axios.create({
     }
 });
 
-// Simple in-memory cache for GET requests
-const cache = new Map();
-const CACHE_TTL = 30000; // 30 seconds
-
 // Add Token to every request automatically
 api.interceptors.request.use(
     (config) => {
@@ -31,19 +27,11 @@ api.interceptors.request.use(
     }
 );
 
-// Response interceptor with caching for GET requests
+// Response interceptor. GET caching is left to the browser: read-mostly
+// endpoints send ETag + "no-cache", so repeats are revalidated and come
+// back as 304 (served from the HTTP cache) while unchanged.
 api.interceptors.response.use(
-    (response) => {
-        // Cache successful GET responses
-        if (response.config.method === 'get' && response.config.cache !== false) {
-            const cacheKey = response.config.url;
-            cache.set(cacheKey, {
-                data: response.data,
-                timestamp: Date.now()
-            });
-        }
-        return response;
-    },
+    (response) => response,
     (error) => {
         // Network error (no response)
         if (!error.response) {
@@ -57,30 +45,16 @@ api.interceptors.response.use(
             error.isTimeout = true;
         }
 
-        // Auth error - logout if 401
-        if (error.response?.status === 401) {
+        // Auth error - token expired or revoked: drop it and go back to login
+        if (error.response?.status === 401 && !error.config?.url?.endsWith('/login')) {
             console.error('Unauthorized - token may be invalid');
+            localStorage.removeItem('token');
+            localStorage.removeItem('user');
+            window.location.href = window.location.pathname.startsWith('/admin') ? '/admin-login' : '/';
         }
 
         return Promise.reject(error);
     }
 );
 
-// Helper to get cached data
-api.getCached = async (url, config = {}) => {
-    const cacheKey = url;
-    const cached = cache.get(cacheKey);
-
-    if (cached && Date.now() - cached.timestamp < CACHE_TTL) {
-        return { data: cached.data, fromCache: true };
-    }
-
-    return api.get(url, config);
-};
-
-// Clear cache (call after mutations)
-api.clearCache = () => {
-    cache.clear();
-};
-
 export default api;
@@ -4,7 +4,7 @@ import api from '../api';
 import {
     Plus, Upload, FileText, Users, Link, X, BarChart, LogOut, Trash2,
     Power, Eye, CheckCircle, Clock, HelpCircle, ChevronDown, ChevronUp,
-    FileSpreadsheet, AlertTriangle, Activity, Layers, Award
+    FileSpreadsheet, AlertTriangle, Activity, Layers, Award, Download
 } from 'lucide-react';
 import { useDispatch } from 'react-redux';
 import { logout } from '../store';
@@ -20,10 +20,13 @@ const AdminDashboard = () => {
     const [selectedTest, setSelectedTest] = useState(null);
     const [questions, setQuestions] = useState([]);
     const [results, setResults] = useState([]);
+    const [questionsCursor, setQuestionsCursor] = useState(null);
+    const [resultsCursor, setResultsCursor] = useState(null);
     const [newTest, setNewTest] = useState({ title: '', duration: 360 });
     const [newTaskId, setNewTaskId] = useState('');
     const [newQuestionUrl, setNewQuestionUrl] = useState('');
     const [uploading, setUploading] = useState(false);
+    const [uploadProgress, setUploadProgress] = useState(null);
     const [addingQuestion, setAddingQuestion] = useState(false);
     const [actionLoading, setActionLoading] = useState(null);
 
@@ -97,11 +100,27 @@ const AdminDashboard = () => {
         }
     };
 
+    // Lists are keyset-paginated; the next page cursor comes back in X-Next-Cursor
+    const fetchQuestionsPage = async (testId, cursor = null) => {
+        const res = await api.get(`/admin/test/${testId}/questions`, {
+            params: { fields: 'id,task_id,link', ...(cursor && { cursor }) }
+        });
+        setQuestions(prev => cursor ? [...prev, ...res.data] : res.data);
+        setQuestionsCursor(res.headers['x-next-cursor'] || null);
+    };
+
+    const fetchResultsPage = async (testId, cursor = null) => {
+        const res = await api.get(`/admin/test/${testId}/results`, {
+            params: { fields: 'id,username,is_completed,current_index,score', ...(cursor && { cursor }) }
+        });
+        setResults(prev => cursor ? [...prev, ...res.data] : res.data);
+        setResultsCursor(res.headers['x-next-cursor'] || null);
+    };
+
     const handleViewQuestions = async (test) => {
         setSelectedTest(test);
         try {
-            const res = await api.get(`/admin/test/${test.id}/questions`);
-            setQuestions(res.data);
+            await fetchQuestionsPage(test.id);
             setShowQuestionsModal(true);
         } catch (err) {
             alert("Failed to load questions");
@@ -111,14 +130,34 @@ const AdminDashboard = () => {
     const handleViewResults = async (test) => {
         setSelectedTest(test);
         try {
-            const res = await api.get(`/admin/test/${test.id}/results`);
-            setResults(res.data);
+            await fetchResultsPage(test.id);
             setShowResultsModal(true);
         } catch (err) {
             alert("Failed to load results");
         }
     };
 
+    const handleLoadMore = async (fetchPage, cursor) => {
+        try {
+            await fetchPage(selectedTest.id, cursor);
+        } catch (err) {
+            alert("Failed to load more");
+        }
+    };
+
+    const handleEvaluateTest = async () => {
+        if (!selectedTest) return;
+        setActionLoading('evaluate');
+        try {
+            const res = await api.post(`/admin/test/${selectedTest.id}/evaluate`);
+            alert(`${res.data.message} (job #${res.data.job_id})`);
+        } catch (err) {
+            alert("Failed to start evaluation");
+        } finally {
+            setActionLoading(null);
+        }
+    };
+
     const handleDeleteQuestion = async (questionId) => {
         try {
             await api.delete(`/admin/question/${questionId}`);
@@ -133,19 +172,45 @@ const AdminDashboard = () => {
         if (!file || !selectedTest) return;
 
         setUploading(true);
+        setUploadProgress(null);
         const formData = new FormData();
         formData.append('file', file);
 
+        const finish = () => {
+            setUploading(false);
+            setUploadProgress(null);
+        };
+
         try {
-            await api.post(`/admin/test/${selectedTest.id}/upload`, formData, {
+            const { data: job } = await api.post(`/admin/test/${selectedTest.id}/upload`, formData, {
                 headers: { 'Content-Type': 'multipart/form-data' }
             });
-            setShowUploadModal(false);
-            fetchTests();
+
+            // Rows are ingested in the background; poll the upload job
+            const interval = setInterval(async () => {
+                try {
+                    const { data: status } = await api.get(`/admin/ingest/${job.job_id}`);
+                    setUploadProgress(status);
+                    if (status.status === 'done' || status.status === 'failed') {
+                        clearInterval(interval);
+                        finish();
+                        fetchTests();
+                        if (status.status === 'failed') {
+                            alert(`Upload failed after ${status.rows_inserted} rows: ${status.error}`);
+                        } else if (status.rows_rejected > 0) {
+                            alert(`Uploaded ${status.rows_inserted} questions, ${status.rows_rejected} rows rejected`);
+                            window.open(`${api.defaults.baseURL}/admin/ingest/${job.job_id}/errors?access_token=${localStorage.getItem('token')}`, '_blank');
+                        }
+                        if (status.status === 'done') setShowUploadModal(false);
+                    }
+                } catch (err) {
+                    clearInterval(interval);
+                    finish();
+                }
+            }, 1000);
         } catch (err) {
             alert(err.response?.data?.detail || "Upload failed");
-        } finally {
-            setUploading(false);
+            finish();
         }
     };
 
@@ -159,8 +224,7 @@ const AdminDashboard = () => {
             });
             setNewTaskId('');
             setNewQuestionUrl('');
-            const res = await api.get(`/admin/test/${selectedTest.id}/questions`);
-            setQuestions(res.data);
+            await fetchQuestionsPage(selectedTest.id);
             fetchTests();
         } catch (err) {
             alert("Failed to add question");
@@ -170,6 +234,8 @@ const AdminDashboard = () => {
     };
 
     const handleLogout = () => {
+        // Revoke the token server-side; local logout doesn't wait for it
+        api.post('/logout', null, { headers: { Authorization: `Bearer ${localStorage.getItem('token')}` } }).catch(() => {});
         dispatch(logout());
         navigate('/');
     };
@@ -474,19 +540,23 @@ const AdminDashboard = () => {
                                 {uploading ? (
                                     <div>
                                         <div className="w-8 h-8 border-2 border-emerald-500 border-t-transparent rounded-full animate-spin mx-auto mb-3"></div>
-                                        <p className="text-gray-600">Uploading...</p>
+                                        <p className="text-gray-600">
+                                            {uploadProgress
+                                                ? `Processing... ${uploadProgress.rows_inserted} added, ${uploadProgress.rows_rejected} rejected`
+                                                : 'Uploading...'}
+                                        </p>
                                     </div>
                                 ) : (
                                     <div>
                                         <Upload className="w-10 h-10 text-gray-400 mx-auto mb-3" />
-                                        <p className="text-gray-700 font-medium">Click to select Excel file</p>
-                                        <p className="text-sm text-gray-400 mt-1">.xlsx or .xls files</p>
+                                        <p className="text-gray-700 font-medium">Click to select a question file</p>
+                                        <p className="text-sm text-gray-400 mt-1">.xlsx, .csv or .parquet files</p>
                                     </div>
                                 )}
                             </div>
                             <input
                                 type="file"
-                                accept=".xlsx,.xls"
+                                accept=".xlsx,.csv,.parquet"
                                 onChange={handleFileUpload}
                                 className="hidden"
                                 disabled={uploading}
@@ -562,6 +632,14 @@ const AdminDashboard = () => {
                                             </button>
                                         </div>
                                     ))}
+                                    {questionsCursor && (
+                                        <button
+                                            onClick={() => handleLoadMore(fetchQuestionsPage, questionsCursor)}
+                                            className="w-full py-2 text-sm text-emerald-600 hover:text-emerald-700 hover:bg-emerald-50 rounded-lg transition"
+                                        >
+                                            Load more
+                                        </button>
+                                    )}
                                 </div>
                             )}
                         </div>
@@ -578,9 +656,24 @@ const AdminDashboard = () => {
                                 <h3 className="text-xl font-bold text-gray-800">Results - {selectedTest.title}</h3>
                                 <p className="text-sm text-gray-500 mt-1">Users who took this test</p>
                             </div>
-                            <button onClick={() => setShowResultsModal(false)} className="text-gray-400 hover:text-gray-600">
-                                <X className="w-5 h-5" />
-                            </button>
+                            <div className="flex items-center gap-3">
+                                <a
+                                    href={`${api.defaults.baseURL}/admin/test/${selectedTest.id}/export?format=csv&access_token=${localStorage.getItem('token')}`}
+                                    className="flex items-center gap-1.5 px-3 py-1.5 bg-emerald-50 hover:bg-emerald-100 text-emerald-700 text-sm rounded-lg transition"
+                                >
+                                    <Download className="w-4 h-4" /> Export CSV
+                                </a>
+                                <button
+                                    onClick={handleEvaluateTest}
+                                    disabled={actionLoading === 'evaluate' || results.length === 0}
+                                    className="flex items-center gap-1.5 px-3 py-1.5 bg-teal-500 hover:bg-teal-600 disabled:opacity-50 text-white text-sm rounded-lg transition"
+                                >
+                                    <Award className="w-4 h-4" /> Evaluate All
+                                </button>
+                                <button onClick={() => setShowResultsModal(false)} className="text-gray-400 hover:text-gray-600">
+                                    <X className="w-5 h-5" />
+                                </button>
+                            </div>
                         </div>
                         <div className="overflow-y-auto flex-1">
                             {results.length === 0 ? (
@@ -598,7 +691,10 @@ const AdminDashboard = () => {
                                                 </div>
                                                 <div>
                                                     <p className="text-gray-800 font-medium">{r.username}</p>
-                                                    <p className="text-xs text-gray-500">Progress: {r.current_index} questions</p>
+                                                    <p className="text-xs text-gray-500">
+                                                        Progress: {r.current_index} questions
+                                                        {r.score != null && ` · Avg score: ${r.score.toFixed(1)}`}
+                                                    </p>
                                                 </div>
                                             </div>
                                             <div className="flex items-center gap-3">
@@ -620,6 +716,14 @@ const AdminDashboard = () => {
                                             </div>
                                         </div>
                                     ))}
+                                    {resultsCursor && (
+                                        <button
+                                            onClick={() => handleLoadMore(fetchResultsPage, resultsCursor)}
+                                            className="w-full py-2 text-sm text-emerald-600 hover:text-emerald-700 hover:bg-emerald-50 rounded-lg transition"
+                                        >
+                                            Load more
+                                        </button>
+                                    )}
                                 </div>
                             )}
                         </div>
@@ -27,10 +27,8 @@ const AdminLogin = () => {
             });
             const userData = res.data;
 
-            // Check if user is admin
-            const userCheck = await api.get(`/admin/check/${userData.user_id}`);
-
-            if (!userCheck.data.is_admin) {
+            // Admin flag comes with the login response (also signed into the token)
+            if (!userData.is_admin) {
                 setError('Access Denied: You are not an administrator');
                 setLoading(false);
                 return;
@@ -8,25 +8,45 @@ import { logout } from '../store';
 const AdminUsers = () => {
     const [users, setUsers] = useState([]);
     const [tests, setTests] = useState([]);
+    const [summary, setSummary] = useState({ total: 0, completed: 0, in_progress: 0 });
+    const [nextCursor, setNextCursor] = useState(null);
     const [selectedTestId, setSelectedTestId] = useState('all');
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [dropdownOpen, setDropdownOpen] = useState(false);
     const navigate = useNavigate();
     const dispatch = useDispatch();
 
     useEffect(() => {
-        fetchData();
+        api.get('/admin/tests')
+            .then(res => setTests(res.data))
+            .catch(err => console.error("Failed to fetch tests", err));
     }, []);
 
+    useEffect(() => {
+        fetchData();
+    }, [selectedTestId]);
+
+    // Filtering happens server-side; only the columns shown below are requested
+    const fetchUsersPage = (cursor = null) => api.get('/admin/users', {
+        params: {
+            fields: 'id,username,status,session_id,test_title',
+            ...(selectedTestId !== 'all' && { test_id: selectedTestId }),
+            ...(cursor && { cursor })
+        }
+    });
+
     const fetchData = async () => {
         try {
             setLoading(true);
-            const [usersRes, testsRes] = await Promise.all([
-                api.get('/admin/users'),
-                api.get('/admin/tests')
+            const testFilter = selectedTestId !== 'all' ? { test_id: selectedTestId } : {};
+            const [usersRes, summaryRes] = await Promise.all([
+                fetchUsersPage(),
+                api.get('/admin/users/summary', { params: testFilter })
             ]);
             setUsers(usersRes.data);
-            setTests(testsRes.data);
+            setNextCursor(usersRes.headers['x-next-cursor'] || null);
+            setSummary(summaryRes.data);
         } catch (err) {
             console.error("Failed to fetch data", err);
         } finally {
@@ -34,18 +54,28 @@ const AdminUsers = () => {
         }
     };
 
+    const handleLoadMore = async () => {
+        try {
+            setLoadingMore(true);
+            const res = await fetchUsersPage(nextCursor);
+            setUsers(prev => [...prev, ...res.data]);
+            setNextCursor(res.headers['x-next-cursor'] || null);
+        } catch (err) {
+            console.error("Failed to load more users", err);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleLogout = () => {
+        // Revoke the token server-side; local logout doesn't wait for it
+        api.post('/logout', null, { headers: { Authorization: `Bearer ${localStorage.getItem('token')}` } }).catch(() => {});
         dispatch(logout());
         navigate('/admin-login');
     };
 
-    // Filter users based on selected test
-    const filteredUsers = selectedTestId === 'all'
-        ? users
-        : users.filter(u => u.test_id === parseInt(selectedTestId));
-
-    const completedCount = filteredUsers.filter(u => u.status === 'Completed').length;
-    const inProgressCount = filteredUsers.filter(u => u.status === 'In Progress').length;
+    const completedCount = summary.completed;
+    const inProgressCount = summary.in_progress;
 
     const selectedTest = tests.find(t => t.id === parseInt(selectedTestId));
 
@@ -92,7 +122,7 @@ const AdminUsers = () => {
                                 <Users className="w-6 h-6 text-emerald-600" />
                             </div>
                             <div>
-                                <p className="text-3xl font-bold text-gray-800">{filteredUsers.length}</p>
+                                <p className="text-3xl font-bold text-gray-800">{summary.total}</p>
                                 <p className="text-sm text-emerald-600 font-medium">
                                     {selectedTestId === 'all' ? 'Total Users' : 'Users in Batch'}
                                 </p>
@@ -205,7 +235,7 @@ const AdminUsers = () => {
                             <div className="w-8 h-8 border-2 border-emerald-500 border-t-transparent rounded-full animate-spin mx-auto"></div>
                             <p className="text-gray-500 mt-4">Loading users...</p>
                         </div>
-                    ) : filteredUsers.length === 0 ? (
+                    ) : users.length === 0 ? (
                         <div className="text-center py-16 text-gray-400">
                             <Users className="w-16 h-16 mx-auto mb-4 opacity-50" />
                             <p className="text-lg">
@@ -236,8 +266,8 @@ const AdminUsers = () => {
                                     </tr>
                                 </thead>
                                 <tbody className="divide-y divide-gray-100">
-                                    {filteredUsers.map((u, idx) => (
-                                        <tr key={u.id} className="hover:bg-emerald-50/50 transition">
+                                    {users.map((u, idx) => (
+                                        <tr key={`${u.id}-${u.session_id}`} className="hover:bg-emerald-50/50 transition">
                                             <td className="p-4 text-gray-400">{idx + 1}</td>
                                             <td className="p-4">
                                                 <div className="flex items-center gap-3">
@@ -285,6 +315,17 @@ const AdminUsers = () => {
                                     ))}
                                 </tbody>
                             </table>
+                            {nextCursor && (
+                                <div className="p-4 border-t border-gray-100 text-center">
+                                    <button
+                                        onClick={handleLoadMore}
+                                        disabled={loadingMore}
+                                        className="px-4 py-2 text-sm font-medium text-emerald-600 hover:text-emerald-700 hover:bg-emerald-50 disabled:opacity-50 rounded-lg transition"
+                                    >
+                                        {loadingMore ? 'Loading...' : 'Load more'}
+                                    </button>
+                                </div>
+                            )}
                         </div>
                     )}
                 </div>
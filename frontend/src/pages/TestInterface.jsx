@@ -63,6 +63,8 @@ const TestInterface = () => {
     // Use ref for timer interval to prevent memory leaks
     const timerIntervalRef = useRef(null);
     const endTimeRef = useRef(null);
+    // Set when submit-next already returned the next question (skip the refetch)
+    const prefetchedRef = useRef(false);
 
     // Handle going home
     const handleGoHome = () => {
@@ -96,7 +98,40 @@ const TestInterface = () => {
         }
     }, [sessionId, statusState]);
 
-    // Initialize timer with server time
+    // Count down locally to a deadline (ms, client clock)
+    const startCountdown = useCallback((endTime) => {
+        endTimeRef.current = endTime;
+
+        // Clear any existing interval
+        if (timerIntervalRef.current) {
+            clearInterval(timerIntervalRef.current);
+        }
+
+        // Update timer immediately
+        const now = Date.now();
+        const distance = endTimeRef.current - now;
+        if (distance > 0) {
+            setTimeLeft(Math.floor(distance / 1000));
+        }
+
+        // Set up interval
+        timerIntervalRef.current = setInterval(() => {
+            const currentTime = Date.now();
+            const remaining = endTimeRef.current - currentTime;
+
+            if (remaining <= 0) {
+                clearInterval(timerIntervalRef.current);
+                timerIntervalRef.current = null;
+                setTimeLeft(0);
+                setStatusState('time_up');
+                dispatch(completeTest());
+            } else {
+                setTimeLeft(Math.floor(remaining / 1000));
+            }
+        }, 1000);
+    }, [dispatch]);
+
+    // Initialize timer with server time (fallback when the event stream is unavailable)
     const initializeTimer = useCallback(async () => {
         if (!sessionId) return;
 
@@ -110,36 +145,9 @@ const TestInterface = () => {
             }
 
             const startTime = new Date(res.data.start_time).getTime();
-            const durationMs = res.data.duration_minutes * 60 * 1000;
-            endTimeRef.current = startTime + durationMs;
-
-            // Clear any existing interval
-            if (timerIntervalRef.current) {
-                clearInterval(timerIntervalRef.current);
-            }
-
-            // Update timer immediately
-            const now = Date.now();
-            const distance = endTimeRef.current - now;
-            if (distance > 0) {
-                setTimeLeft(Math.floor(distance / 1000));
-            }
-
-            // Set up interval
-            timerIntervalRef.current = setInterval(() => {
-                const currentTime = Date.now();
-                const remaining = endTimeRef.current - currentTime;
-
-                if (remaining <= 0) {
-                    clearInterval(timerIntervalRef.current);
-                    timerIntervalRef.current = null;
-                    setTimeLeft(0);
-                    setStatusState('time_up');
-                    dispatch(completeTest());
-                } else {
-                    setTimeLeft(Math.floor(remaining / 1000));
-                }
-            }, 1000);
+            startCountdown(res.data.deadline
+                ? new Date(res.data.deadline).getTime()
+                : startTime + res.data.duration_minutes * 60 * 1000);
 
             setTimerError(false);
         } catch (err) {
@@ -152,14 +160,49 @@ const TestInterface = () => {
                 setTimeout(() => initializeTimer(), 5000);
             }
         }
-    }, [sessionId, dispatch]);
+    }, [sessionId, dispatch, startCountdown]);
 
-    // Initialize timer on mount
+    // Deadline and progress pushed by the server over one event stream (no polling)
     useEffect(() => {
-        if (sessionId && !statusState) {
-            initializeTimer();
-        }
-    }, [sessionId, statusState, initializeTimer]);
+        if (!sessionId || statusState) return;
+
+        const token = localStorage.getItem('token');
+        const source = new EventSource(`${api.defaults.baseURL}/session/${sessionId}/events?access_token=${token}`);
+
+        source.addEventListener('session', (e) => {
+            const data = JSON.parse(e.data);
+            // Correct for the difference between server and client clocks
+            const skew = new Date(data.server_time).getTime() - Date.now();
+            const deadline = data.deadline ? new Date(data.deadline).getTime() - skew : null;
+
+            if (data.is_completed) {
+                source.close();
+                if (timerIntervalRef.current) {
+                    clearInterval(timerIntervalRef.current);
+                    timerIntervalRef.current = null;
+                }
+                setStatusState(deadline && Date.now() >= deadline ? 'time_up' : 'completed');
+                dispatch(completeTest());
+                return;
+            }
+
+            if (deadline) {
+                startCountdown(deadline);
+            }
+            setTimerError(false);
+        });
+
+        source.onerror = () => {
+            // EventSource reconnects by itself unless the server refused the stream
+            if (source.readyState === EventSource.CLOSED) {
+                initializeTimer();
+            } else {
+                setTimerError(true);
+            }
+        };
+
+        return () => source.close();
+    }, [sessionId, statusState, dispatch, startCountdown, initializeTimer]);
 
     // Fetch question with retry logic
     const fetchQuestion = useCallback(async (retryAttempt = 0) => {
@@ -177,6 +220,13 @@ const TestInterface = () => {
             const errorDetail = err.response?.data?.detail || '';
             const errorStatus = err.response?.status;
 
+            // Time ran out (enforced server-side)
+            if (errorDetail === "Time is up") {
+                setStatusState('time_up');
+                dispatch(completeTest());
+                return;
+            }
+
             // Test completed
             if (errorDetail === "Test Completed" || errorDetail === "Test is already completed") {
                 setStatusState('completed');
@@ -212,6 +262,10 @@ const TestInterface = () => {
 
     // Fetch question on index change
     useEffect(() => {
+        if (prefetchedRef.current) {
+            prefetchedRef.current = false;
+            return;
+        }
         if (sessionId && !statusState) {
             fetchQuestion(0);
         }
@@ -238,16 +292,25 @@ const TestInterface = () => {
         setNetworkError(false);
 
         try {
-            await api.post(`/session/${sessionId}/submit`, {
+            // Saves the answer and returns the next question in one round trip
+            const res = await api.post(`/session/${sessionId}/submit-next`, {
                 question_id: question.id,
                 status: formData.status,
                 explanation: formData.explanation.trim(),
                 critical_error: formData.criticalError.trim() || "None"
             });
 
-            // Update Redux and persist index
-            const newIndex = currentIndex + 1;
-            dispatch(updateIndex(newIndex));
+            if (res.data.is_completed) {
+                setStatusState('completed');
+                dispatch(completeTest());
+                return;
+            }
+
+            // Show the next question and update Redux / persisted index
+            prefetchedRef.current = true;
+            setQuestion(res.data.question);
+            setFormData({ status: '', explanation: '', criticalError: '' });
+            dispatch(updateIndex(res.data.next_index));
 
         } catch (err) {
             console.error("Submit error:", err);
@@ -256,6 +319,9 @@ const TestInterface = () => {
             if (errorDetail === "Sync Error. You are answering the wrong question.") {
                 fetchQuestion(0);
                 alert("⚠️ Question sync issue detected. Refreshing...");
+            } else if (errorDetail === "Time is up") {
+                setStatusState('time_up');
+                dispatch(completeTest());
             } else if (errorDetail === "Test is already completed" || errorDetail === "Invalid session") {
                 setStatusState('completed');
                 dispatch(completeTest());
@@ -27,18 +27,25 @@ const UserReport = () => {
     const handleEvaluate = async () => {
         setEvaluating(true);
         try {
-            await api.post(`/admin/evaluate/${sessionId}`);
-
-            // Auto-refresh periodically to see grades appearing
-            const interval = setInterval(() => {
-                fetchReport();
+            const { data: job } = await api.post(`/admin/evaluate/${sessionId}`);
+
+            // Poll the job and refresh grades until the worker finishes
+            const interval = setInterval(async () => {
+                try {
+                    const { data: status } = await api.get(`/admin/evaluate/${job.job_id}`);
+                    fetchReport();
+                    if (status.status === 'done' || status.status === 'failed') {
+                        clearInterval(interval);
+                        setEvaluating(false);
+                        if (status.status === 'failed') {
+                            alert(`Evaluation failed: ${status.error}`);
+                        }
+                    }
+                } catch (err) {
+                    clearInterval(interval);
+                    setEvaluating(false);
+                }
             }, 3000);
-
-            // Stop refreshing after 30 seconds
-            setTimeout(() => {
-                clearInterval(interval);
-                setEvaluating(false);
-            }, 30000);
         } catch (err) {
             alert("Error starting evaluation");
             setEvaluating(false);